@@ -0,0 +1,166 @@
+import streamlit as st
+import plotly.express as px
+from backtest import HORIZONS, accuracy_table, run_backtest
+from model_store import load_feature_pipeline, model_version
+from inference import PRIORITY_BATCH, get_inference_service
+from instrumentation import instrumented, span
+from memo import data_version, memo_cache
+
+# Backtest runs kept per process (each holds one row per scored forecast)
+MAX_STORED_RUNS = 4
+
+METRIC_FORMATS = {
+    "n": st.column_config.NumberColumn("Forecasts", format="%d"),
+    "MAE": st.column_config.NumberColumn(format="%.2f"),
+    "MAPE": st.column_config.NumberColumn(format="%.1f%%"),
+    "WAPE": st.column_config.NumberColumn(format="%.1f%%"),
+    "Bias": st.column_config.NumberColumn(format="%+.2f"),
+}
+
+def _backtest_store():
+    """Process-wide store of finished backtests keyed by (model version, data version, horizons, start)"""
+    return memo_cache("accuracy.backtests", max_entries=MAX_STORED_RUNS)
+
+def get_backtest(key):
+    """Finished backtest results for (model version, data version, horizons, start year), or None"""
+    return _backtest_store().get(key)
+
+def store_backtest(key, results):
+    """Keep a finished backtest, dropping the least recently used beyond MAX_STORED_RUNS"""
+    _backtest_store().put(key, results)
+
+@instrumented("page.accuracy")
+def show_accuracy_page(df, index=None):
+    """
+    Display the forecast accuracy page with backtest results per county, commodity and horizon
+
+    Parameters:
+    df (pandas.DataFrame): The dataset to backtest against
+    index (dict): Precomputed location index from utils.build_location_index (unused)
+    """
+    # Apply custom header with gradient background
+    st.markdown("""
+    <div style="background: linear-gradient(to right, #00b09b, #96c93d); padding: 2px; border-radius: 10px; margin-bottom: 5px;">
+        <h1 style="color: white; text-align: center;">🎯 Forecast Accuracy</h1>
+    </div>
+    """, unsafe_allow_html=True)
+
+    st.markdown("""
+    <div style="background-color: white; padding: 2px; border-radius: 10px; box-shadow: 0 4px 12px rgba(0,0,0,0.1); margin-bottom: 5px;">
+        <p style="color: #333; text-align: center; font-size: 18px;">How well the model would have predicted each month of the historical data, using only the history available at the time.</p>
+    </div>
+    """, unsafe_allow_html=True)
+
+    col1, content_col, col2 = st.columns([0.05, 0.9, 0.05])
+
+    with content_col:
+        try:
+            with span("model.load"):
+                pipeline = load_feature_pipeline()
+                version = model_version()
+        except FileNotFoundError:
+            st.error("Model files not found. Please ensure 'best_gb_model.pkl' and 'encoder.pkl' are available.")
+            return
+
+        # Backtest settings
+        set_col1, set_col2 = st.columns(2)
+        with set_col1:
+            horizons = st.multiselect("Forecast horizons (months ahead)", options=[1, 2, 3, 4, 5, 6],
+                                      default=list(HORIZONS))
+        with set_col2:
+            years = sorted(df["year"].dropna().unique().astype(int))
+            start_year = st.selectbox("Score periods from", options=years, index=max(0, len(years) - 2))
+
+        if not horizons:
+            st.warning("Please select at least one forecast horizon.")
+            return
+
+        key = (version, data_version(df), tuple(sorted(horizons)), int(start_year))
+        results = get_backtest(key)
+
+        if results is None:
+            st.info("The backtest predicts every series and month in the selected window. "
+                    "Results are kept for everyone using this server.")
+            if not st.button("Run backtest", use_container_width=True):
+                return
+            service = get_inference_service()
+            progress = st.progress(0.0, text="Backtesting...")
+            with span("accuracy.backtest"):
+                results = run_backtest(
+                    df, pipeline,
+                    lambda X: service.submit("predict", X, priority=PRIORITY_BATCH),
+                    horizons=key[1], start=f"{start_year}-01-01",
+                    progress=lambda done: progress.progress(done, text=f"Backtesting... {done:.0%}"),
+                )
+            progress.empty()
+            store_backtest(key, results)
+
+        if results.empty:
+            st.warning("No periods with enough history in the selected window.")
+            return
+
+        # Overall metrics
+        with span("accuracy.metrics"):
+            overall = accuracy_table(results.assign(all="all"), ["all"]).iloc[0]
+            by_horizon = accuracy_table(results, ["horizon"])
+            by_county = accuracy_table(results, ["county_name", "horizon"])
+            by_commodity = accuracy_table(results, ["dataelement_name", "horizon"])
+
+        m1, m2, m3, m4 = st.columns(4)
+        m1.metric("Forecasts scored", f"{int(overall['n']):,}")
+        m2.metric("MAE (units)", f"{overall['MAE']:,.1f}")
+        m3.metric("WAPE", f"{overall['WAPE']:.1f}%")
+        m4.metric("Bias (units)", f"{overall['Bias']:+,.1f}")
+
+        tab1, tab2, tab3 = st.tabs(["By County", "By Commodity", "By Horizon"])
+
+        with tab1:
+            show_accuracy_breakdown(by_county, "county_name", "County", horizons)
+        with tab2:
+            show_accuracy_breakdown(by_commodity, "dataelement_name", "Commodity", horizons)
+        with tab3:
+            st.dataframe(by_horizon, column_config=METRIC_FORMATS, use_container_width=True, hide_index=True)
+
+        st.download_button(
+            "Download forecast errors (CSV)",
+            results.to_csv(index=False).encode("utf-8"),
+            file_name="backtest_results.csv",
+            mime="text/csv",
+        )
+
+        st.markdown("""
+        <div style="background-color: #f5f5f5; padding: 2px; border-radius: 8px; margin: 5px 0;">
+            <h4 style="color: #2c3e50; margin-top: 0;">How to Read the Metrics:</h4>
+            <ul>
+                <li><strong>MAE</strong>: average absolute error in units</li>
+                <li><strong>MAPE</strong>: average percentage error over months with non-zero demand</li>
+                <li><strong>WAPE</strong>: total absolute error as a share of total demand</li>
+                <li><strong>Bias</strong>: average of prediction minus actual; positive means over-forecasting</li>
+            </ul>
+        </div>
+        """, unsafe_allow_html=True)
+
+def show_accuracy_breakdown(table, column, label, horizons):
+    """Bar chart and table of accuracy for one grouping at a chosen horizon"""
+    horizon = st.selectbox("Horizon", options=sorted(horizons), key=f"accuracy_horizon_{column}")
+    data = table[table["horizon"] == horizon].sort_values("WAPE", ascending=False)
+
+    fig = px.bar(
+        data, x=column, y="WAPE",
+        hover_data={"MAE": ":,.2f", "Bias": ":+,.2f", "n": True},
+        labels={column: label, "WAPE": "WAPE (%)"},
+        title=f"WAPE by {label} ({horizon} month{'s' if horizon > 1 else ''} ahead)",
+    )
+    fig.update_layout(
+        plot_bgcolor="rgba(255,255,255,0.9)",
+        paper_bgcolor="rgba(255,255,255,0)",
+        font=dict(color="#2c3e50"),
+        xaxis=dict(showgrid=False, tickangle=-45),
+        yaxis=dict(showgrid=True, gridcolor="#eee"),
+        margin=dict(l=20, r=20, t=60, b=20),
+    )
+    fig.update_traces(marker_color="#4CAF50")
+    st.plotly_chart(fig, use_container_width=True)
+
+    st.dataframe(data.drop(columns="horizon").rename(columns={column: label}),
+                 column_config=METRIC_FORMATS, use_container_width=True, hide_index=True)
@@ -0,0 +1,189 @@
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+from streamlit_folium import st_folium
+from anomalies import KINDS, MIN_HISTORY, WINDOW, scan_anomalies
+from data_store import load_series_panel
+from map import aggregate_county_values, county_choropleth, load_kenya_geojson
+from instrumentation import instrumented, span
+from memo import memo_cache
+
+# Scanned months kept per process, per set of thresholds
+MAX_SCANNED_PERIODS = 120
+
+KIND_LABELS = {
+    "spike": "📈 Spike",
+    "drop": "📉 Drop",
+    "zero_run": "🚫 Zero run (possible stock-out)",
+    "missing": "❔ Missing report",
+}
+
+def _alert_store():
+    """Process-wide store of scanned months keyed by (period, thresholds)"""
+    return memo_cache("alerts.scans", max_entries=MAX_SCANNED_PERIODS)
+
+def scan_periods(panel, periods, thresholds):
+    """
+    Alerts for the given months, scanning only the months not scanned before
+
+    Parameters:
+    panel (SeriesPanel): The data
+    periods (list): Months to return alerts for
+    thresholds (dict): Keyword arguments for anomalies.scan_anomalies
+
+    Returns:
+    pandas.DataFrame: Alerts for all the months, most severe first
+    """
+    store = _alert_store()
+    settings = tuple(sorted(thresholds.items()))
+    found = {p: store.get((p, settings)) for p in periods}
+    new = [p for p, alerts in found.items() if alerts is None]
+    if new:
+        with span("alerts.scan"):
+            scanned = scan_anomalies(panel, new, **thresholds)
+        by_period = dict(tuple(scanned.groupby("period", sort=False)))
+        for p in new:
+            found[p] = store.put((p, settings), by_period.get(p, scanned.iloc[:0]))
+    alerts = pd.concat(found.values(), ignore_index=True)
+    return alerts.sort_values("severity", ascending=False, kind="stable").reset_index(drop=True)
+
+@instrumented("page.alerts")
+def show_alerts_page(df, index=None):
+    """
+    Display the alerts page: spikes, drops, zero runs and missing reports across every series
+
+    Parameters:
+    df (pandas.DataFrame): The dataset to scan
+    index (dict): Precomputed location index from utils.build_location_index (unused)
+    """
+    # Apply custom header with gradient background
+    st.markdown("""
+    <div style="background: linear-gradient(to right, #f12711, #f5af19); padding: 2px; border-radius: 10px; margin-bottom: 5px;">
+        <h1 style="color: white; text-align: center;">🚨 Alerts</h1>
+    </div>
+    """, unsafe_allow_html=True)
+
+    st.markdown("""
+    <div style="background-color: white; padding: 2px; border-radius: 10px; box-shadow: 0 4px 12px rgba(0,0,0,0.1); margin-bottom: 5px;">
+        <p style="color: #333; text-align: center; font-size: 18px;">Unusual months across every facility and commodity, compared with each series' own recent history.</p>
+    </div>
+    """, unsafe_allow_html=True)
+
+    col1, content_col, col2 = st.columns([0.05, 0.9, 0.05])
+
+    with content_col:
+        with span("alerts.panel"):
+            panel = load_series_panel(df)
+        if not len(panel):
+            st.warning("No data to scan.")
+            return
+
+        # Scan settings
+        set_col1, set_col2, set_col3 = st.columns(3)
+        with set_col1:
+            months = st.slider("Months to scan", min_value=1, max_value=min(24, len(panel.periods)), value=1,
+                               help="The latest months of the data")
+        with set_col2:
+            sensitivity = st.select_slider("Spike/drop threshold (robust z-score)",
+                                           options=[2.5, 3.0, 3.5, 4.0, 5.0, 6.0], value=3.5)
+        with set_col3:
+            zero_run = st.number_input("Zero months for a stock-out alert", min_value=2, max_value=12, value=3)
+
+        thresholds = {"window": WINDOW, "min_history": MIN_HISTORY, "mad_threshold": float(sensitivity),
+                      "zero_run": int(zero_run)}
+        periods = list(panel.periods[-months:])
+        alerts = scan_periods(panel, periods, thresholds)
+
+        # Filters
+        filter_col1, filter_col2, filter_col3 = st.columns(3)
+        with filter_col1:
+            kinds = st.multiselect("Alert type", options=KINDS, default=KINDS, format_func=KIND_LABELS.get)
+        with filter_col2:
+            counties = st.multiselect("County", options=sorted(alerts["county_name"].unique()),
+                                      placeholder="All counties")
+        with filter_col3:
+            commodities = st.multiselect("Commodity", options=sorted(alerts["dataelement_name"].unique()),
+                                         placeholder="All commodities")
+
+        shown = alerts[alerts["kind"].isin(kinds)]
+        if counties:
+            shown = shown[shown["county_name"].isin(counties)]
+        if commodities:
+            shown = shown[shown["dataelement_name"].isin(commodities)]
+
+        m1, m2, m3, m4 = st.columns(4)
+        m1.metric("Series scanned", f"{len(panel):,}")
+        m2.metric("Alerts", f"{len(shown):,}")
+        m3.metric("Possible stock-outs", f"{(shown['kind'] == 'zero_run').sum():,}")
+        m4.metric("Facilities affected", f"{shown['facility_name'].nunique():,}")
+
+        if shown.empty:
+            st.success("No alerts for the selected months and filters.")
+            return
+
+        tab1, tab2 = st.tabs(["Ranked Alerts", "By County"])
+
+        with tab1:
+            table = shown.assign(kind=shown["kind"].map(KIND_LABELS))
+            st.dataframe(
+                table.drop(columns="severity"),
+                column_config={
+                    "county_name": "County",
+                    "sub_county_name": "Sub-County",
+                    "ward_name": "Ward",
+                    "facility_name": "Facility",
+                    "dataelement_name": "Commodity",
+                    "period": st.column_config.DateColumn("Month", format="MMM YYYY"),
+                    "kind": "Alert",
+                    "value": st.column_config.NumberColumn("Reported", format="%.0f"),
+                    "expected": st.column_config.NumberColumn("Typical (median)", format="%.0f"),
+                    "score": st.column_config.NumberColumn("Score", format="%.1f",
+                                                           help="Robust z-score, or the number of months in the run"),
+                },
+                use_container_width=True,
+                hide_index=True,
+            )
+            st.download_button(
+                "Download alerts (CSV)",
+                shown.to_csv(index=False).encode("utf-8"),
+                file_name="alerts.csv",
+                mime="text/csv",
+            )
+
+        with tab2:
+            counts = aggregate_county_values(shown.assign(value=1))
+            map_col, chart_col = st.columns([0.6, 0.4])
+            with map_col:
+                try:
+                    m = county_choropleth(load_kenya_geojson(), dict(zip(counts["county"], counts["value"])),
+                                          "Alerts")
+                    with span("map.render"):
+                        st_folium(m, width=600, height=550, key="alerts_map")
+                except FileNotFoundError:
+                    st.error("❌ Error: Kenya GeoJSON file not found.")
+            with chart_col:
+                by_kind = shown.groupby(["county_name", "kind"], observed=True).size().reset_index(name="alerts")
+                fig = px.bar(
+                    by_kind, y="county_name", x="alerts", color="kind", orientation="h",
+                    labels={"county_name": "County", "alerts": "Alerts", "kind": "Alert"},
+                    category_orders={"county_name": list(counts.sort_values("value", ascending=False)["county_name"])},
+                )
+                fig.update_layout(
+                    plot_bgcolor="rgba(255,255,255,0.9)",
+                    paper_bgcolor="rgba(255,255,255,0)",
+                    font=dict(color="#2c3e50"),
+                    height=max(400, 18 * len(counts)),
+                    margin=dict(l=20, r=20, t=20, b=20),
+                )
+                st.plotly_chart(fig, use_container_width=True)
+
+        st.markdown("""
+        <div style="background-color: #f5f5f5; padding: 2px; border-radius: 8px; margin: 5px 0;">
+            <h4 style="color: #2c3e50; margin-top: 0;">How Alerts Are Raised:</h4>
+            <ul>
+                <li><strong>Spike / Drop</strong>: the month is far from the median of the previous 12 months, measured in median absolute deviations, and the rolling z-score agrees</li>
+                <li><strong>Zero run</strong>: the facility reported zero for several months in a row, which often means a stock-out</li>
+                <li><strong>Missing report</strong>: no report for the month although the series reported in the previous 12 months</li>
+            </ul>
+        </div>
+        """, unsafe_allow_html=True)
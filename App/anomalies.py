@@ -0,0 +1,157 @@
+"""
+Anomaly scan across every facility x commodity series
+
+The data is the dense series x month matrix of panel.SeriesPanel, with NaN
+where a series did not report. Each scanned month is compared with the trailing
+window of months before it, for all series at once:
+
+- spike / drop: robust z-score against the window median and MAD, and
+  only if the classic rolling z-score agrees
+- zero_run: consecutive zero months up to the scanned month (possible stock-out)
+- missing: no report in the scanned month from a series that reported
+  within the trailing window (a reporting gap or a facility going silent)
+
+Only the requested months are scanned, so each new month costs one window
+per series. scan_anomalies(panel, periods=[latest]) is the incremental scan.
+"""
+import warnings
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from utils import SERIES_COLUMNS
+
+WINDOW = 12
+MIN_HISTORY = 6
+Z_THRESHOLD = 3.0
+MAD_THRESHOLD = 3.5
+ZERO_RUN = 3
+# Series scanned per block; bounds the (series x months x window) temporaries
+BLOCK_SERIES = 4096
+
+KINDS = ["spike", "drop", "zero_run", "missing"]
+
+
+def _scan_block(values, columns, window, min_history, z_threshold, mad_threshold, zero_run):
+    """Scores for one block of series at the given month columns"""
+    n, _ = values.shape
+    padded = np.concatenate([np.full((n, window), np.nan), values], axis=1)
+    # windows[:, t] holds months t - window .. t - 1
+    windows = sliding_window_view(padded, window, axis=1)[:, columns]
+    current = values[:, columns]
+
+    # Series without history give all-NaN windows; their "Mean of empty slice" warnings are expected
+    with np.errstate(invalid="ignore", divide="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        history = np.sum(~np.isnan(windows), axis=2)
+        mean = np.nanmean(windows, axis=2)
+        std = np.nanstd(windows, axis=2)
+        median = np.nanmedian(windows, axis=2)
+        mad = np.nanmedian(np.abs(windows - median[..., None]), axis=2)
+        z = (current - mean) / std
+        # 1.4826 * MAD estimates the standard deviation for normal data
+        robust_z = (current - median) / (1.4826 * mad)
+
+    enough = history >= min_history
+    flat_history = enough & (mad == 0)
+    # A flat history (e.g. always the same value) makes any change infinitely unusual; use the std instead
+    robust_z = np.where(flat_history, z, robust_z)
+    spike = enough & (robust_z > mad_threshold) & (z > z_threshold)
+    drop = enough & (robust_z < -mad_threshold) & (z < -z_threshold) & (current > 0)
+
+    # Length of the run of zeros ending at each month
+    zeros = values == 0
+    counts = np.cumsum(zeros, axis=1)
+    resets = np.maximum.accumulate(np.where(zeros, 0, counts), axis=1)
+    run = (counts - resets)[:, columns]
+    zero_alert = run >= zero_run
+    # Only alert once per run, when it reaches the threshold or at the latest scanned month
+    zero_alert &= (run == zero_run) | (np.arange(len(columns)) == len(columns) - 1)[None, :]
+
+    reported = ~np.isnan(values)
+    ever_before = np.maximum.accumulate(reported, axis=1)[:, columns]
+    missing = ~reported[:, columns] & ever_before & (history > 0)
+
+    return {
+        "current": current, "median": median, "mean": mean, "robust_z": robust_z,
+        "spike": spike, "drop": drop, "zero_run": zero_alert, "run": run, "missing": missing,
+        "missing_run": _missing_run(reported)[:, columns],
+    }
+
+
+def _missing_run(reported):
+    """Months since the last report (0 where the month itself was reported)"""
+    missing = ~reported
+    counts = np.cumsum(missing, axis=1)
+    return counts - np.maximum.accumulate(np.where(missing, 0, counts), axis=1)
+
+
+def scan_anomalies(panel, periods=None, window=WINDOW, min_history=MIN_HISTORY, z_threshold=Z_THRESHOLD,
+                   mad_threshold=MAD_THRESHOLD, zero_run=ZERO_RUN):
+    """
+    Scan months of the panel for anomalies
+
+    Parameters:
+    panel (panel.SeriesPanel): The data
+    periods (list): Months to scan (Timestamps); defaults to the latest month
+    window (int): Trailing months each month is compared with
+    min_history (int): Reported months needed in the window for spike/drop alerts
+    z_threshold (float): Rolling z-score needed for spike/drop
+    mad_threshold (float): Robust (median/MAD) z-score needed for spike/drop
+    zero_run (int): Consecutive zero months that raise a zero_run alert
+
+    Returns:
+    pandas.DataFrame: One row per alert with the series columns, period, kind, value, expected
+        (window median), score and severity, most severe first
+    """
+    if periods is None:
+        periods = panel.periods[-1:]
+    columns = panel.periods.get_indexer(pd.DatetimeIndex(periods))
+    columns = np.sort(columns[columns >= 0])
+    if len(columns) == 0:
+        return _empty_alerts(panel)
+
+    frames = []
+    for start in range(0, len(panel), BLOCK_SERIES):
+        # Scored in float64; the panel stores float32 and may be memory-mapped
+        block = panel.values[start:start + BLOCK_SERIES].astype(np.float64)
+        scores = _scan_block(block, columns, window, min_history, z_threshold, mad_threshold, zero_run)
+        for kind in KINDS:
+            rows, cols = np.nonzero(scores[kind])
+            if not len(rows):
+                continue
+            if kind in ("spike", "drop"):
+                score = np.abs(scores["robust_z"][rows, cols])
+                severity = score
+            elif kind == "zero_run":
+                score = scores["run"][rows, cols].astype(np.float64)
+                # Zeros matter more where demand is usually high
+                severity = score * np.log1p(np.nan_to_num(scores["median"][rows, cols]))
+            else:
+                score = scores["missing_run"][rows, cols].astype(np.float64)
+                severity = score * np.log1p(np.nan_to_num(scores["median"][rows, cols]))
+            frames.append(pd.DataFrame({
+                "series": rows + start,
+                "period": panel.periods[columns[cols]],
+                "kind": kind,
+                "value": scores["current"][rows, cols],
+                "expected": scores["median"][rows, cols],
+                "score": score,
+                "severity": severity,
+            }))
+
+    if not frames:
+        return _empty_alerts(panel)
+    alerts = pd.concat(frames, ignore_index=True)
+    located = panel.series.iloc[alerts.pop("series").to_numpy()].reset_index(drop=True)
+    alerts = pd.concat([located, alerts], axis=1)
+    return alerts.sort_values("severity", ascending=False, kind="stable").reset_index(drop=True)
+
+
+def _empty_alerts(panel):
+    columns = {c: panel.series[c].iloc[:0] for c in SERIES_COLUMNS}
+    columns.update(period=pd.Series(dtype="datetime64[ns]"), kind=pd.Series(dtype=object),
+                   value=pd.Series(dtype=float), expected=pd.Series(dtype=float),
+                   score=pd.Series(dtype=float), severity=pd.Series(dtype=float))
+    return pd.DataFrame(columns)
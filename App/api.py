@@ -0,0 +1,212 @@
+"""
+Headless HTTP prediction API
+
+Serves the same model, feature building and series lag index as the
+Streamlit app for downstream systems. Requests are handled
+asynchronously; predictions go through the shared micro-batcher and the
+inference process pool, so concurrent single-row requests are scored
+together.
+
+Usage:
+    uvicorn api:app --app-dir App --host 0.0.0.0 --port 8000
+
+Endpoints:
+    POST /predict                          one input row -> prediction
+    POST /predict/batch                    {"rows": [...]} -> predictions
+    GET  /forecast/{facility}/{commodity}  next-period forecast from history
+    POST /explain                          one input row -> SHAP contributions
+"""
+import asyncio
+import contextlib
+
+import numpy as np
+import pandas as pd
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from batching import PredictionBatcher
+from data_store import prepare_shared_dataset, read_arrow_dataset
+from inference import PRIORITY_EXPLAIN, PRIORITY_INTERACTIVE, InferenceService
+from features import FeaturePipeline
+from model_store import ensure_model_files, load_model_artifacts
+from utils import SERIES_COLUMNS, build_series_lag_index
+
+LAG_COLUMNS = ["lag_1", "lag_3", "rolling_mean_3"]
+
+# Populated on startup
+state = {}
+
+
+class BadRequest(Exception):
+    """A request that cannot be served; status is the HTTP status to answer with"""
+
+    def __init__(self, message, status=422):
+        super().__init__(message)
+        self.status = status
+
+
+def _startup():
+    model_path, _ = ensure_model_files()
+    model, encoder = load_model_artifacts()
+    df = read_arrow_dataset(prepare_shared_dataset())
+    service = InferenceService(model_path)
+    state.update(
+        pipeline=FeaturePipeline(encoder, getattr(model, "feature_names_in_", None)),
+        service=service,
+        batcher=PredictionBatcher(lambda X: service.submit("predict", X, priority=PRIORITY_INTERACTIVE)),
+        lags=build_series_lag_index(df),
+    )
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    _startup()
+    try:
+        yield
+    finally:
+        state["service"].shutdown()
+
+
+def _lookup_series(facility, commodity, filters=None):
+    lags = state["lags"]
+    try:
+        matches = lags.loc[[(facility, commodity)]]
+    except KeyError:
+        return None
+    for column, value in (filters or {}).items():
+        if value:
+            matches = matches[matches[column] == value]
+    if len(matches) != 1:
+        return None if matches.empty else matches
+    return matches.iloc[0]
+
+
+def _complete_record(record):
+    """Fill missing lag values from the series history"""
+    if not isinstance(record, dict):
+        raise BadRequest("Each input row must be a JSON object", status=400)
+    missing = [c for c in SERIES_COLUMNS + ["month", "year"] if c not in record]
+    if missing:
+        raise BadRequest(f"Missing fields: {', '.join(missing)}")
+    if all(c in record for c in LAG_COLUMNS):
+        return record
+    series = _lookup_series(record["facility_name"], record["dataelement_name"],
+                            {c: record[c] for c in SERIES_COLUMNS[:3]})
+    # Without the history the lags cannot be filled; a forecast from zeros would look valid
+    if series is None:
+        raise BadRequest(f"No history for {record['facility_name']} / {record['dataelement_name']}; "
+                         f"send {', '.join(LAG_COLUMNS)} with the row", status=404)
+    if isinstance(series, pd.DataFrame):
+        raise BadRequest("Facility name is ambiguous; add county_name, sub_county_name or ward_name", status=409)
+    completed = dict(record)
+    for column in LAG_COLUMNS:
+        if column not in completed:
+            completed[column] = float(series[column])
+    return completed
+
+
+async def _json_body(request):
+    try:
+        return await request.json()
+    except ValueError:
+        raise BadRequest("The request body is not valid JSON", status=400)
+
+
+def _features(records):
+    try:
+        completed = pd.DataFrame.from_records([_complete_record(r) for r in records])
+        return state["pipeline"].frame(completed)
+    except ValueError as exc:
+        # Categories the encoder was not trained on
+        raise BadRequest(str(exc))
+
+
+async def _predict(features):
+    return await asyncio.wrap_future(state["batcher"].submit(features))
+
+
+def _error(exc, status=422):
+    return JSONResponse({"error": str(exc)}, status_code=status)
+
+
+async def predict(request):
+    try:
+        features = _features([await _json_body(request)])
+    except BadRequest as exc:
+        return _error(exc, exc.status)
+    prediction = (await _predict(features))[0]
+    return JSONResponse({"prediction": float(prediction)})
+
+
+async def predict_batch(request):
+    try:
+        body = await _json_body(request)
+        rows = body.get("rows") if isinstance(body, dict) else None
+        if not isinstance(rows, list) or not rows:
+            raise BadRequest('The body must be {"rows": [...]} with at least one row', status=400)
+        features = _features(rows)
+    except BadRequest as exc:
+        return _error(exc, exc.status)
+    predictions = await _predict(features)
+    return JSONResponse({"predictions": [float(p) for p in predictions]})
+
+
+async def forecast(request):
+    facility = request.path_params["facility"]
+    commodity = request.path_params["commodity"]
+    series = _lookup_series(facility, commodity, {c: request.query_params.get(c) for c in SERIES_COLUMNS[:3]})
+    if series is None:
+        return _error(f"No history for {facility} / {commodity}", status=404)
+    if isinstance(series, pd.DataFrame):
+        return _error("Facility name is ambiguous; add county_name, sub_county_name or ward_name", status=409)
+
+    # Default to the month after the last reported period
+    next_period = series["last_period"] + pd.DateOffset(months=1)
+    try:
+        year = int(request.query_params.get("year", next_period.year))
+        month = int(request.query_params.get("month", next_period.month))
+    except ValueError as exc:
+        return _error(exc)
+
+    record = {c: series[c] for c in SERIES_COLUMNS + LAG_COLUMNS}
+    record.update(year=year, month=month)
+    try:
+        features = _features([record])
+    except BadRequest as exc:
+        return _error(exc, exc.status)
+    prediction = (await _predict(features))[0]
+    return JSONResponse({
+        **{c: record[c] for c in SERIES_COLUMNS},
+        "year": year,
+        "month": month,
+        **{c: float(record[c]) for c in LAG_COLUMNS},
+        "prediction": float(prediction),
+    })
+
+
+async def explain(request):
+    try:
+        features = _features([await _json_body(request)])
+    except BadRequest as exc:
+        return _error(exc, exc.status)
+    future = state["service"].submit("explain", features, priority=PRIORITY_EXPLAIN)
+    explanation = await asyncio.wrap_future(future)
+    contributions = np.asarray(explanation.values)[0]
+    base_value = float(np.ravel(explanation.base_values)[0])
+    return JSONResponse({
+        "base_value": base_value,
+        "prediction": base_value + float(contributions.sum()),
+        "contributions": {name: float(v) for name, v in zip(state["pipeline"].feature_names, contributions)},
+    })
+
+
+app = Starlette(
+    routes=[
+        Route("/predict", predict, methods=["POST"]),
+        Route("/predict/batch", predict_batch, methods=["POST"]),
+        Route("/forecast/{facility}/{commodity}", forecast, methods=["GET"]),
+        Route("/explain", explain, methods=["POST"]),
+    ],
+    lifespan=lifespan,
+)
@@ -0,0 +1,276 @@
+"""
+Fetching the data and model artifacts
+
+Each artifact (the historical data CSV, the model and the encoder) is
+described by a URL and a local path. fetch_artifact:
+
+- streams the response to a temporary file in 1 MB chunks, hashing it on
+  the way, and renames it into place only when it is complete (and
+  matches the expected SHA-256, if one is given)
+- retries connection errors, timeouts, truncated bodies and 5xx/429
+  responses with exponential backoff and jitter; other HTTP errors fail at once
+- records the size and SHA-256 of every good download next to the file
+  (<path>.meta.json), and falls back to that last good copy when the
+  download fails, e.g. offline
+
+fetch_async runs fetches on a small thread pool, so the data, model and
+encoder download at the same time. Callers asking for a path that is
+already being fetched share the same download.
+
+Every URL can be overridden with an environment variable (see
+data_store and model_store), e.g. to fetch from a mirror or a local
+test server.
+"""
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+CHUNK_BYTES = 1 << 20
+RETRIES = 4
+BACKOFF_SECONDS = 0.5
+# (connect, read) timeouts; the read timeout applies between chunks, not to the whole body
+TIMEOUT = (10, 60)
+# Statuses worth retrying; others (403, 404, ...) will not change on a retry
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+MAX_WORKERS = 4
+
+logger = logging.getLogger("fp.artifacts")
+
+_executor = None
+_in_flight = {}
+_lock = threading.Lock()
+
+
+class FetchError(Exception):
+    """An artifact could not be downloaded"""
+
+
+class _RetryableError(Exception):
+    pass
+
+
+def artifact(name, url, path, sha256=None):
+    """
+    Describe a downloadable artifact
+
+    Parameters:
+    name (str): Short name used in messages, e.g. "model"
+    url (str): Where to download it from
+    path (str): Local file
+    sha256 (str): Expected SHA-256 (hex) of the file, if known
+
+    Returns:
+    dict: The artifact
+    """
+    return {"name": name, "url": url, "path": path, "sha256": sha256.lower() if sha256 else None}
+
+
+def _meta_path(path):
+    return f"{path}.meta.json"
+
+
+def file_sha256(path):
+    """SHA-256 (hex) of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_metadata(path):
+    """
+    Size, SHA-256, URL and time of the last good download of a file
+
+    Returns:
+    dict: The metadata, or None if the file was not downloaded by fetch_artifact
+    """
+    try:
+        with open(_meta_path(path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def verify_local(path, sha256=None, full=False):
+    """
+    Whether a local copy is complete and intact
+
+    The quick check compares the size with the recorded download. The
+    full check hashes the file. Files without a record (copied in by
+    hand) are trusted unless an expected checksum is given.
+
+    Parameters:
+    path (str): Local file
+    sha256 (str): Expected SHA-256 (hex), if known
+    full (bool): Hash the file instead of only checking its size
+
+    Returns:
+    bool: True if the file can be used
+    """
+    if not os.path.exists(path):
+        return False
+    meta = read_metadata(path)
+    expected = sha256 or (meta or {}).get("sha256")
+    if meta is not None and os.path.getsize(path) != meta["size"]:
+        return False
+    if sha256 and meta is not None and meta["sha256"] != sha256:
+        return False
+    if expected and (full or meta is None):
+        return file_sha256(path) == expected
+    return True
+
+
+def _backoff(attempt, backoff):
+    # Exponential with full jitter, so parallel clients do not retry in lockstep
+    return backoff * (2 ** attempt) * (0.5 + random.random())
+
+
+def fetch_file(url, path, sha256=None, retries=RETRIES, backoff=BACKOFF_SECONDS, timeout=TIMEOUT, session=None):
+    """
+    Stream a URL to a file, verifying and retrying
+
+    Parameters:
+    url (str): Where to download from
+    path (str): Destination; replaced atomically only by a complete, verified download
+    sha256 (str): Expected SHA-256 (hex), if known
+    retries (int): Retries after the first attempt
+    backoff (float): Base delay in seconds, doubled on every retry
+    timeout (tuple): (connect, read) timeouts in seconds
+    session (requests.Session): Session to use (a new one by default)
+
+    Returns:
+    dict: Size, SHA-256, URL and time of the download (also saved as <path>.meta.json)
+
+    Raises:
+    FetchError: If every attempt failed or the server refused the request
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    part = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+    http = session or requests.Session()
+    last_error = None
+    try:
+        for attempt in range(retries + 1):
+            try:
+                with http.get(url, stream=True, timeout=timeout) as response:
+                    if response.status_code in RETRY_STATUSES:
+                        raise _RetryableError(f"HTTP {response.status_code}")
+                    if response.status_code >= 400:
+                        raise FetchError(f"Failed to download {url}: HTTP {response.status_code}")
+                    # Content-Length is the encoded size; only comparable without content encoding
+                    length = response.headers.get("Content-Length")
+                    expected_size = int(length) if length and not response.headers.get("Content-Encoding") else None
+                    digest = hashlib.sha256()
+                    size = 0
+                    with open(part, "wb") as f:
+                        for chunk in response.iter_content(CHUNK_BYTES):
+                            f.write(chunk)
+                            digest.update(chunk)
+                            size += len(chunk)
+                if expected_size is not None and size != expected_size:
+                    raise _RetryableError(f"truncated body ({size:,} of {expected_size:,} bytes)")
+                if sha256 and digest.hexdigest() != sha256:
+                    raise _RetryableError(f"checksum mismatch (got {digest.hexdigest()[:12]})")
+                meta = {"url": url, "size": size, "sha256": digest.hexdigest(),
+                        "fetched": time.strftime("%Y-%m-%dT%H:%M:%S")}
+                os.replace(part, path)
+                with open(_meta_path(path) + ".tmp", "w", encoding="utf-8") as f:
+                    json.dump(meta, f)
+                os.replace(_meta_path(path) + ".tmp", _meta_path(path))
+                return meta
+            except (_RetryableError, requests.ConnectionError, requests.Timeout,
+                    requests.exceptions.ChunkedEncodingError) as exc:
+                last_error = exc
+                if attempt < retries:
+                    delay = _backoff(attempt, backoff)
+                    logger.warning("Download of %s failed (%s); retrying in %.1fs", url, exc, delay)
+                    time.sleep(delay)
+    finally:
+        if os.path.exists(part):
+            os.remove(part)
+    raise FetchError(f"Failed to download {url} after {retries + 1} attempts: {last_error}")
+
+
+def fetch_artifact(item, refresh=False, **options):
+    """
+    Make sure an artifact is on disk
+
+    Parameters:
+    item (dict): Output of artifact()
+    refresh (bool): Download even if a good local copy exists (falling back to it on failure)
+    options: Passed to fetch_file (retries, backoff, timeout, session)
+
+    Returns:
+    dict: "path" (None if there is no usable copy), "source" ("local", "download" or
+        "fallback") and "error" (the download error, if any)
+    """
+    path, sha256 = item["path"], item["sha256"]
+    if not refresh and verify_local(path, sha256):
+        return {"path": path, "source": "local", "error": None}
+    try:
+        fetch_file(item["url"], path, sha256, **options)
+        return {"path": path, "source": "download", "error": None}
+    except FetchError as exc:
+        # Offline or the server is down: the last good copy is better than nothing
+        if verify_local(path, sha256, full=True):
+            meta = read_metadata(path)
+            logger.warning("Using the local copy of %s%s: %s", item["name"],
+                           f" from {meta['fetched']}" if meta else "", exc)
+            return {"path": path, "source": "fallback", "error": str(exc)}
+        logger.error("No usable copy of %s: %s", item["name"], exc)
+        return {"path": None, "source": None, "error": str(exc)}
+
+
+def fetch_async(item, refresh=False, **options):
+    """
+    Fetch an artifact on the shared thread pool
+
+    Parameters:
+    item (dict): Output of artifact()
+    refresh (bool): See fetch_artifact
+    options: Passed to fetch_file
+
+    Returns:
+    concurrent.futures.Future: Resolves to the fetch_artifact result. A fetch of the
+        same path already in progress is shared instead of started again.
+    """
+    global _executor
+    with _lock:
+        future = _in_flight.get(item["path"])
+        if future is not None:
+            return future
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="fetch")
+        future = _executor.submit(fetch_artifact, item, refresh, **options)
+        _in_flight[item["path"]] = future
+    future.add_done_callback(lambda _: _forget(item["path"], future))
+    return future
+
+
+def _forget(path, future):
+    with _lock:
+        if _in_flight.get(path) is future:
+            del _in_flight[path]
+
+
+def fetch_all(items, refresh=False, **options):
+    """
+    Fetch several artifacts concurrently and wait for all of them
+
+    Parameters:
+    items (list): Outputs of artifact()
+    refresh (bool): See fetch_artifact
+    options: Passed to fetch_file
+
+    Returns:
+    dict: Artifact name -> fetch_artifact result
+    """
+    futures = {item["name"]: fetch_async(item, refresh, **options) for item in items}
+    return {name: future.result() for name, future in futures.items()}
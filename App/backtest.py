@@ -0,0 +1,209 @@
+"""
+Rolling-origin backtest of the demand model
+
+For every historical record and forecast horizon h, the feature row is
+rebuilt as of h records earlier, from the history the app would have had
+at that origin. lag_1 is the last value seen, lag_3 the value two records
+before it, and rolling_mean_3 the mean of those three. The rows are then
+predicted in chunks on the inference process pool and scored against the
+actual value. All horizons are built with vectorised group shifts, so the
+whole dataset is one pass per horizon rather than one model call per
+period.
+
+Usage:
+    python App/backtest.py --horizons 1 2 3 --start 2022-01-01 --out Data/backtest.csv
+"""
+import numpy as np
+import pandas as pd
+
+from utils import SERIES_COLUMNS
+
+HORIZONS = (1, 2, 3)
+# Rows per prediction job on the pool
+CHUNK_ROWS = 50_000
+
+
+def backtest_features(df, pipeline, horizons=HORIZONS, start=None):
+    """
+    Build the as-of feature rows for every record and horizon
+
+    Records with fewer than three earlier values at their origin, or with
+    locations the encoder does not know, are left out.
+
+    Parameters:
+    df (pandas.DataFrame): The dataset
+    pipeline (FeaturePipeline): Feature pipeline for the model
+    horizons (iterable): Forecast horizons in records (months) ahead of the origin
+    start (str or Timestamp): Only score target periods from this date on
+
+    Returns:
+    tuple: (features DataFrame in model column order, results DataFrame with county_name,
+        dataelement_name, period, horizon and actual for each row)
+    """
+    data = df.sort_values(SERIES_COLUMNS + ["period"], kind="stable")
+    values = data["value"]
+    grouped = values.groupby([data[c] for c in SERIES_COLUMNS], sort=False, observed=True)
+
+    eligible = np.ones(len(data), dtype=bool)
+    if pipeline.unknown_value is None:
+        eligible &= pipeline.supported(data)
+    if start is not None:
+        eligible &= (data["period"] >= pd.Timestamp(start)).to_numpy()
+
+    feature_frames, result_frames = [], []
+    for horizon in horizons:
+        lag_1 = grouped.shift(horizon)
+        lag_2 = grouped.shift(horizon + 1)
+        lag_3 = grouped.shift(horizon + 2)
+        keep = eligible & lag_3.notna().to_numpy()
+        rows = data[keep]
+        columns = {c: rows[c] for c in SERIES_COLUMNS}
+        columns.update(
+            month=rows["month"].to_numpy(),
+            year=rows["year"].to_numpy(),
+            quarter=rows["period"].dt.quarter.to_numpy(),
+            lag_1=lag_1[keep].to_numpy(),
+            lag_3=lag_3[keep].to_numpy(),
+            rolling_mean_3=((lag_1 + lag_2 + lag_3) / 3)[keep].to_numpy(),
+        )
+        feature_frames.append(pipeline.frame(columns))
+        result_frames.append(pd.DataFrame({
+            "county_name": rows["county_name"].to_numpy(),
+            "dataelement_name": rows["dataelement_name"].to_numpy(),
+            "period": rows["period"].to_numpy(),
+            "horizon": np.full(len(rows), horizon, dtype=np.int8),
+            "actual": rows["value"].to_numpy(dtype=np.float64),
+        }))
+    return (pd.concat(feature_frames, ignore_index=True),
+            pd.concat(result_frames, ignore_index=True))
+
+
+def run_backtest(df, pipeline, predict_async, horizons=HORIZONS, start=None, chunk_rows=CHUNK_ROWS,
+                 progress=None):
+    """
+    Predict every as-of feature row and attach the errors
+
+    Parameters:
+    df (pandas.DataFrame): The dataset
+    pipeline (FeaturePipeline): Feature pipeline for the model
+    predict_async (callable): Takes a feature DataFrame and returns a Future of predictions
+    horizons (iterable): Forecast horizons
+    start (str or Timestamp): First target period to score
+    chunk_rows (int): Rows per prediction job
+    progress (callable): Called with the completed fraction after each chunk
+
+    Returns:
+    pandas.DataFrame: One row per scored record and horizon, with prediction and error
+    """
+    X, results = backtest_features(df, pipeline, horizons, start)
+    predictions = predict_in_chunks(X, predict_async, chunk_rows, progress)
+    results["prediction"] = predictions
+    results["error"] = predictions - results["actual"].to_numpy()
+    return results
+
+
+def predict_in_chunks(X, predict_async, chunk_rows=CHUNK_ROWS, progress=None):
+    """
+    Predict a large feature matrix as parallel chunks
+
+    All chunks are submitted at once so the pool works on them in parallel.
+
+    Parameters:
+    X (pandas.DataFrame): Feature rows in model column order
+    predict_async (callable): Takes a feature DataFrame and returns a Future of predictions
+    chunk_rows (int): Rows per prediction job
+    progress (callable): Called with the completed fraction after each chunk
+
+    Returns:
+    numpy.ndarray: One prediction per row
+    """
+    offsets = range(0, len(X), chunk_rows)
+    futures = [predict_async(X.iloc[offset:offset + chunk_rows]) for offset in offsets]
+    predictions = np.empty(len(X), dtype=np.float64)
+    try:
+        for done, (offset, future) in enumerate(zip(offsets, futures), start=1):
+            predictions[offset:offset + chunk_rows] = future.result()
+            if progress is not None:
+                progress(done / len(futures))
+    except BaseException:
+        # e.g. Streamlit stopping the run from the progress callback: drop the queued chunks
+        for future in futures:
+            future.cancel()
+        raise
+    return predictions
+
+
+def accuracy_table(results, by):
+    """
+    Accuracy metrics per group
+
+    MAPE only counts records with a non-zero actual value. WAPE is the total
+    absolute error over the total actual value, which stays meaningful for
+    sparse series.
+
+    Parameters:
+    results (pandas.DataFrame): Output of run_backtest
+    by (list): Grouping columns, e.g. ["county_name", "horizon"]
+
+    Returns:
+    pandas.DataFrame: n, MAE, MAPE (%), WAPE (%) and Bias per group
+    """
+    actual = results["actual"].to_numpy()
+    abs_error = np.abs(results["error"].to_numpy())
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ape = np.where(actual > 0, abs_error / actual, np.nan)
+    scored = pd.DataFrame({c: results[c] for c in by})
+    scored = scored.assign(error=results["error"].to_numpy(), abs_error=abs_error, ape=ape, actual=actual)
+    table = scored.groupby(by, observed=True).agg(
+        n=("error", "size"),
+        MAE=("abs_error", "mean"),
+        MAPE=("ape", "mean"),
+        abs_error_total=("abs_error", "sum"),
+        actual_total=("actual", "sum"),
+        Bias=("error", "mean"),
+    )
+    table["MAPE"] *= 100
+    table["WAPE"] = 100 * table["abs_error_total"] / table["actual_total"].where(table["actual_total"] > 0)
+    return table[["n", "MAE", "MAPE", "WAPE", "Bias"]].reset_index()
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    import joblib
+
+    from data_store import prepare_shared_dataset, read_arrow_dataset
+    from features import FeaturePipeline
+    from inference import PRIORITY_BATCH, InferenceService
+    from model_store import ensure_model_files
+
+    parser = argparse.ArgumentParser(description="Backtest the demand model over the historical data")
+    parser.add_argument("--horizons", type=int, nargs="+", default=list(HORIZONS))
+    parser.add_argument("--start", help="First target period to score, e.g. 2022-01-01")
+    parser.add_argument("--workers", type=int, help="Inference processes (default: CPU count - 1)")
+    parser.add_argument("--out", help="Write the per-record results to this CSV file")
+    args = parser.parse_args()
+
+    model_path, encoder_path = ensure_model_files()
+    if not model_path or not encoder_path:
+        raise SystemExit("Model files are not available")
+    model = joblib.load(model_path)
+    pipeline = FeaturePipeline(joblib.load(encoder_path), getattr(model, "feature_names_in_", None))
+    df = read_arrow_dataset(prepare_shared_dataset())
+
+    service = InferenceService(model_path, max_workers=args.workers)
+    try:
+        started = time.perf_counter()
+        results = run_backtest(df, pipeline, lambda X: service.submit("predict", X, priority=PRIORITY_BATCH),
+                               args.horizons, args.start)
+        print(f"Scored {len(results):,} forecasts in {time.perf_counter() - started:.1f}s\n")
+    finally:
+        service.shutdown()
+
+    with pd.option_context("display.max_rows", 100, "display.width", 120, "display.float_format", "{:,.2f}".format):
+        print(accuracy_table(results, ["horizon"]).to_string(index=False), "\n")
+        print(accuracy_table(results, ["dataelement_name"]).to_string(index=False), "\n")
+        print(accuracy_table(results, ["county_name"]).sort_values("WAPE", ascending=False).to_string(index=False))
+    if args.out:
+        results.to_csv(args.out, index=False)
@@ -0,0 +1,116 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from inference import PRIORITY_INTERACTIVE, get_inference_service
+
+# Defaults can be tuned per deployment without code changes
+DEFAULT_MAX_BATCH_SIZE = int(os.environ.get("FP_BATCH_MAX_SIZE", 256))
+DEFAULT_MAX_WAIT_MS = float(os.environ.get("FP_BATCH_MAX_WAIT_MS", 5))
+
+
+class PredictionBatcher:
+    """
+    Coalesces concurrent prediction requests into one model call
+
+    Requests arriving within max_wait_ms of the first queued request are
+    stacked into a single feature matrix (up to max_batch_size rows) and
+    predicted together; each caller gets a future for its own rows.
+
+    Parameters:
+    predict_async (callable): Takes a feature DataFrame and returns a Future of predictions
+    max_batch_size (int): Maximum number of rows per model call
+    max_wait_ms (float): Longest time a request waits for others to join its batch
+    """
+
+    def __init__(self, predict_async, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS):
+        self.predict_async = predict_async
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.batches = 0
+        self.rows = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="prediction-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, X):
+        """
+        Queue rows for prediction
+
+        Parameters:
+        X (pandas.DataFrame): Feature rows in model column order
+
+        Returns:
+        concurrent.futures.Future: Resolves to a numpy array with one prediction per row
+        """
+        future = Future()
+        self._queue.put((X, future))
+        return future
+
+    def _collect(self):
+        first = self._queue.get()
+        batch = [first]
+        size = len(first[0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # Drop requests whose caller has already gone away
+            batch = [(X, f) for X, f in batch if f.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            self.batches += 1
+            self.rows += sum(len(X) for X, _ in batch)
+            try:
+                matrix = pd.concat([X for X, _ in batch], ignore_index=True)
+                result = self.predict_async(matrix)
+            except Exception as exc:
+                self._fail(batch, exc)
+                continue
+            result.add_done_callback(lambda done, batch=batch: self._distribute(batch, done))
+
+    def _distribute(self, batch, done):
+        if done.cancelled() or done.exception() is not None:
+            self._fail(batch, done.exception() if not done.cancelled() else RuntimeError("Batch cancelled"))
+            return
+        predictions = np.asarray(done.result())
+        offset = 0
+        for X, future in batch:
+            try:
+                future.set_result(predictions[offset:offset + len(X)])
+            except InvalidStateError:
+                pass
+            offset += len(X)
+
+    @staticmethod
+    def _fail(batch, exc):
+        for _, future in batch:
+            try:
+                future.set_exception(exc)
+            except InvalidStateError:
+                pass
+
+
+@st.cache_resource
+def get_prediction_batcher():
+    """Process-wide batcher in front of the inference pool"""
+    # Looked up per batch so a newly promoted model is used
+    return PredictionBatcher(lambda X: get_inference_service().submit("predict", X, priority=PRIORITY_INTERACTIVE))
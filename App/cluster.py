@@ -0,0 +1,204 @@
+"""
+Multi-process deployment mode
+
+Launches N Streamlit workers on loopback ports and puts a small bundled
+TCP reverse proxy in front of them on the public port. Connections are
+pinned to a worker by client address (X-Forwarded-For when present), so
+a browser's page loads and its websocket session always land on the
+same worker. Workers run in shared dataset mode so they all read the
+same memory-mapped data file and the same on-disk model files. Each
+worker warms its caches as it starts (see warmup.py), except for the
+inference pool and the briefs: N workers each starting a pool of one
+process per CPU would start about CPU^2 processes, and each would forecast
+every series for the briefs. Those start on first use instead, and each
+worker's pool gets an equal share of the CPUs (FP_INFERENCE_WORKERS).
+
+Usage:
+    python App/cluster.py --workers 4 --port 8501
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import signal
+import subprocess
+import sys
+import time
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+WARMUP_SCRIPT = os.path.join(APP_DIR, "warmup.py")
+
+# Warm-up steps of each worker (see warmup.STEPS); the inference pool and briefs start on first use
+WORKER_WARMUP_STEPS = ["data", "model", "index", "pages", "map", "aggregates"]
+
+# Upper bound on the bytes read while looking for the end of the HTTP headers
+MAX_HEADER_BYTES = 64 * 1024
+
+
+def pool_workers_per_worker(workers):
+    """
+    Inference pool size of each worker, so all pools together use one process per CPU but one
+
+    Parameters:
+    workers (int): Number of Streamlit workers
+
+    Returns:
+    int: Pool processes per worker (at least 1)
+    """
+    return max(1, ((os.cpu_count() or 2) - 1) // max(1, workers))
+
+
+def start_worker(port, extra_env=None):
+    """
+    Start one Streamlit worker bound to loopback
+
+    Parameters:
+    port (int): Port the worker listens on
+    extra_env (dict): Extra environment variables for the worker
+
+    Returns:
+    subprocess.Popen: The worker process
+    """
+    env = dict(os.environ)
+    env.setdefault("FP_SHARED_DATA", "1")
+    env.update(extra_env or {})
+    cmd = [
+        sys.executable, WARMUP_SCRIPT, "serve",
+        "--steps", *WORKER_WARMUP_STEPS,
+        "--server.port", str(port),
+        "--server.address", "127.0.0.1",
+        "--server.headless", "true",
+    ]
+    return subprocess.Popen(cmd, cwd=os.getcwd(), env=env)
+
+
+def sticky_key(peer_host, headers):
+    """
+    Pick the key used to pin a connection to a worker
+
+    Parameters:
+    peer_host (str): Address of the connecting peer
+    headers (bytes): Raw HTTP request headers
+
+    Returns:
+    str: The client identifier
+    """
+    for line in headers.split(b"\r\n")[1:]:
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"x-forwarded-for" and value.strip():
+            return value.split(b",")[0].strip().decode("latin-1")
+    return peer_host
+
+
+def pick_worker(key, ports):
+    """Map a client key to a worker port with a stable hash"""
+    digest = hashlib.md5(key.encode("utf-8")).digest()
+    return ports[int.from_bytes(digest[:4], "big") % len(ports)]
+
+
+async def _pipe(reader, writer):
+    try:
+        while True:
+            chunk = await reader.read(65536)
+            if not chunk:
+                break
+            writer.write(chunk)
+            await writer.drain()
+    except (ConnectionError, asyncio.CancelledError):
+        pass
+    finally:
+        try:
+            writer.close()
+        except Exception:
+            pass
+
+
+class StickyProxy:
+    """Byte-level reverse proxy with client-affinity routing (HTTP and websockets)"""
+
+    def __init__(self, ports):
+        self.ports = ports
+        self.connections = {port: 0 for port in ports}
+
+    async def handle(self, client_reader, client_writer):
+        peer = client_writer.get_extra_info("peername") or ("unknown", 0)
+        try:
+            head = await client_reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            client_writer.close()
+            return
+
+        port = pick_worker(sticky_key(peer[0], head), self.ports)
+        try:
+            backend_reader, backend_writer = await asyncio.open_connection("127.0.0.1", port)
+        except OSError:
+            client_writer.write(b"HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\n\r\n")
+            client_writer.close()
+            return
+
+        self.connections[port] += 1
+        try:
+            backend_writer.write(head)
+            await asyncio.gather(
+                _pipe(client_reader, backend_writer),
+                _pipe(backend_reader, client_writer),
+            )
+        finally:
+            self.connections[port] -= 1
+
+
+async def serve(args):
+    ports = [args.base_port + i for i in range(args.workers)]
+    worker_env = {"FP_INFERENCE_WORKERS": os.environ.get("FP_INFERENCE_WORKERS")
+                  or str(pool_workers_per_worker(args.workers))}
+    workers = {port: start_worker(port, worker_env) for port in ports}
+    proxy = StickyProxy(ports)
+    server = await asyncio.start_server(proxy.handle, args.address, args.port, limit=MAX_HEADER_BYTES)
+    print(f"Proxy listening on {args.address}:{args.port} -> workers {ports}", flush=True)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    last_report = time.monotonic()
+    async with server:
+        while not stop.is_set():
+            # Restart any worker that exited
+            for port, proc in workers.items():
+                if proc.poll() is not None:
+                    print(f"Worker on port {port} exited with {proc.returncode}, restarting", flush=True)
+                    workers[port] = start_worker(port, worker_env)
+            if time.monotonic() - last_report >= args.status_interval:
+                print(f"{time.strftime('%H:%M:%S')} open connections per worker: {proxy.connections}", flush=True)
+                last_report = time.monotonic()
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=2.0)
+            except asyncio.TimeoutError:
+                pass
+
+    for proc in workers.values():
+        proc.terminate()
+    for proc in workers.values():
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the dashboard as N workers behind a sticky local proxy")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1)))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8501)))
+    parser.add_argument("--address", default="0.0.0.0")
+    parser.add_argument("--base-port", type=int, default=8600, help="First loopback port used by the workers")
+    parser.add_argument("--status-interval", type=float, default=60.0, help="Seconds between connection reports")
+    args = parser.parse_args()
+
+    # Build the shared data file once so the workers do not all download it at start-up
+    sys.path.insert(0, APP_DIR)
+    from data_store import prepare_shared_dataset
+    prepare_shared_dataset()
+
+    asyncio.run(serve(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Compiled inference path for the gradient boosting model
+
+The sklearn ensemble is flattened into plain node arrays (feature,
+threshold, left, right, scaled leaf value). They are evaluated by a
+parallel Numba kernel when numba is installed, or otherwise with NumPy
+for a whole block of rows at once, one tree level per step. Both skip
+the per-call validation and per-tree dispatch of model.predict.
+
+Usage (parity check against model.predict on the historical features):
+    python App/compiled_model.py
+"""
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+# "sklearn" (default) or "compiled"
+BACKEND = os.environ.get("FP_INFERENCE_BACKEND", "sklearn")
+
+logger = logging.getLogger("fp.compiled")
+
+# Rows evaluated per block; bounds the (rows x trees) node matrix
+BLOCK_ROWS = 8192
+
+
+_kernel = []
+
+
+def _predict_kernel():
+    """
+    Numba kernel for CompiledEnsemble.predict, built on first use
+
+    numba is imported here rather than at module level so processes on the
+    default sklearn backend never pay for it.
+
+    Returns:
+    callable: The compiled kernel, or None when numba is not installed
+    """
+    if not _kernel:
+        try:
+            from numba import njit, prange
+        except ImportError:  # numba is optional
+            _kernel.append(None)
+            return None
+
+        @njit(parallel=True, cache=True)
+        def kernel(X, roots, split_feature, threshold, children, value, init_value):
+            out = np.full(X.shape[0], init_value)
+            # Tree-major like sklearn: one small tree stays in cache while all rows pass through it
+            for t in range(roots.shape[0]):
+                root = roots[t]
+                for i in prange(X.shape[0]):
+                    node = root
+                    f = split_feature[node]
+                    while f >= 0:
+                        node = children[2 * node + (X[i, f] > threshold[node])]
+                        f = split_feature[node]
+                    out[i] += value[node]
+            return out
+
+        _kernel.append(kernel)
+    return _kernel[0]
+
+
+class CompiledEnsemble:
+    """
+    Flattened array-of-nodes form of a fitted GradientBoostingRegressor
+
+    Parameters:
+    model (GradientBoostingRegressor): The fitted sklearn model
+    """
+
+    def __init__(self, model):
+        if getattr(model, "init_", None) == "zero":
+            self.init_value = 0.0
+        elif hasattr(model.init_, "constant_"):
+            self.init_value = float(np.ravel(model.init_.constant_)[0])
+        else:
+            raise TypeError("Only constant (Dummy) init estimators can be compiled")
+
+        self.feature_names = list(getattr(model, "feature_names_in_", []))
+        trees = [est.tree_ for est in np.ravel(model.estimators_)]
+
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        for tree in trees:
+            n = tree.node_count
+            node_ids = np.arange(n)
+            leaf = tree.children_left == -1
+            # Leaves point at themselves so every row can take the same number of steps
+            lefts.append(np.where(leaf, node_ids, tree.children_left) + offset)
+            rights.append(np.where(leaf, node_ids, tree.children_right) + offset)
+            features.append(np.where(leaf, 0, tree.feature))
+            thresholds.append(np.where(leaf, np.inf, tree.threshold))
+            values.append(model.learning_rate * tree.value[:, 0, 0])
+            roots.append(offset)
+            offset += n
+
+        self.feature = np.concatenate(features).astype(np.intp)
+        self.threshold = np.concatenate(thresholds)
+        self.left = np.concatenate(lefts).astype(np.intp)
+        self.right = np.concatenate(rights).astype(np.intp)
+        self.value = np.concatenate(values)
+        self.roots = np.asarray(roots, dtype=np.intp)
+        self.depth = max(tree.max_depth for tree in trees)
+
+        # Kernel layout: -1 marks a leaf, children[2n] / children[2n + 1] are left / right of node n
+        self.split_feature = np.where(self.left == np.arange(offset), -1, self.feature).astype(np.int32)
+        self.children = np.stack([self.left, self.right], axis=1).ravel().astype(np.int32)
+
+    def _as_matrix(self, X):
+        if isinstance(X, pd.DataFrame) and self.feature_names:
+            X = X[self.feature_names]
+        # sklearn compares float32 features against float64 thresholds
+        return np.asarray(X, dtype=np.float32)
+
+    def predict(self, X):
+        """
+        Predict for a feature matrix
+
+        Parameters:
+        X (pandas.DataFrame or numpy.ndarray): Rows in model feature order
+
+        Returns:
+        numpy.ndarray: One prediction per row
+        """
+        X = self._as_matrix(X)
+        kernel = _predict_kernel()
+        if kernel is not None:
+            return kernel(X, self.roots, self.split_feature, self.threshold,
+                                   self.children, self.value, self.init_value)
+
+        out = np.empty(len(X), dtype=np.float64)
+        for start in range(0, len(X), BLOCK_ROWS):
+            block = X[start:start + BLOCK_ROWS]
+            rows = np.arange(len(block))[:, None]
+            nodes = np.broadcast_to(self.roots, (len(block), len(self.roots))).copy()
+            for _ in range(self.depth):
+                go_left = block[rows, self.feature[nodes]] <= self.threshold[nodes]
+                nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+            leaf_values = self.value[nodes]
+            # Accumulate stage by stage, in the same order as sklearn
+            raw = np.full(len(block), self.init_value)
+            for stage in range(leaf_values.shape[1]):
+                raw += leaf_values[:, stage]
+            out[start:start + len(block)] = raw
+        return out
+
+
+def check_parity(model, compiled, X, atol=1e-8):
+    """
+    Compare the compiled ensemble against model.predict
+
+    Parameters:
+    model: The fitted sklearn model
+    compiled (CompiledEnsemble): Compiled form of the same model
+    X (pandas.DataFrame): Feature rows to compare on
+    atol (float): Allowed absolute difference
+
+    Returns:
+    float: Largest absolute difference
+
+    Raises:
+    AssertionError: If any prediction differs by more than atol
+    """
+    diff = float(np.max(np.abs(model.predict(X) - compiled.predict(X)))) if len(X) else 0.0
+    if diff > atol:
+        raise AssertionError(f"Compiled model differs from model.predict by {diff}")
+    return diff
+
+
+def probe_rows(compiled, n_rows=512, seed=0):
+    """
+    Synthesise feature rows that straddle the split thresholds of the ensemble
+
+    Parameters:
+    compiled (CompiledEnsemble): The compiled model
+    n_rows (int): Number of rows to generate
+    seed (int): Random seed
+
+    Returns:
+    pandas.DataFrame: Probe rows in model feature order
+    """
+    rng = np.random.default_rng(seed)
+    n_features = len(compiled.feature_names) or int(compiled.feature.max()) + 1
+    X = np.zeros((n_rows, n_features), dtype=np.float64)
+    for f in range(n_features):
+        thresholds = compiled.threshold[(compiled.feature == f) & np.isfinite(compiled.threshold)]
+        if len(thresholds) == 0:
+            continue
+        picks = rng.choice(thresholds, n_rows)
+        X[:, f] = picks + rng.choice([-1.0, 0.0, 1.0], n_rows) * np.maximum(np.abs(picks), 1.0) * 1e-3
+    return pd.DataFrame(X, columns=compiled.feature_names or None)
+
+
+def load_predictor(model, backend=BACKEND):
+    """
+    Pick the predictor used for inference
+
+    With the "compiled" backend the model is flattened and checked against
+    model.predict on threshold probes; any failure (e.g. an estimator other
+    than GradientBoostingRegressor) is logged and falls back to the model.
+
+    Parameters:
+    model: The fitted sklearn model
+    backend (str): "sklearn" or "compiled"
+
+    Returns:
+    object: Something with a predict(X) method
+    """
+    if backend != "compiled":
+        return model
+    try:
+        compiled = CompiledEnsemble(model)
+        check_parity(model, compiled, probe_rows(compiled))
+        return compiled
+    except (AttributeError, TypeError, AssertionError) as exc:
+        logger.warning("Cannot compile %s (%s: %s); predicting with model.predict",
+                       type(model).__name__, type(exc).__name__, exc)
+        return model
+
+
+if __name__ == "__main__":
+    import time
+    from data_store import read_csv_dataset
+    from model_store import load_model_artifacts, load_feature_pipeline
+    from features import historical_feature_frame
+
+    model, encoder = load_model_artifacts()
+    compiled = CompiledEnsemble(model)
+    X = historical_feature_frame(read_csv_dataset(), load_feature_pipeline())[compiled.feature_names]
+
+    start = time.perf_counter()
+    expected = model.predict(X)
+    sklearn_time = time.perf_counter() - start
+    start = time.perf_counter()
+    actual = compiled.predict(X)
+    compiled_time = time.perf_counter() - start
+
+    diff = float(np.max(np.abs(expected - actual))) if len(X) else 0.0
+    print(f"rows={len(X)} max_abs_diff={diff:.3g} sklearn={sklearn_time:.3f}s compiled={compiled_time:.3f}s")
+    if diff > 1e-8:
+        raise SystemExit("Parity check failed")
@@ -0,0 +1,231 @@
+import os
+import shutil
+import streamlit as st
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+from artifacts import FetchError, artifact, fetch_async
+from instrumentation import span
+from utils import build_location_index, build_series_lag_index
+from memo import data_version, stamp_data_version
+from panel import SeriesPanel
+
+# Google Drive id of the historical distribution data
+DATA_FILE_ID = "1Oj2n3_DcJVk7q6Cn0v2TNamgP9unnUpi"
+# Direct download, skipping Drive's virus-scan page for large files (FP_DATA_URL to override)
+DATA_URL = os.environ.get(
+    "FP_DATA_URL", f"https://drive.usercontent.google.com/download?id={DATA_FILE_ID}&export=download&confirm=t")
+# Optional expected SHA-256 of the CSV
+DATA_SHA256 = os.environ.get("FP_DATA_SHA256")
+CSV_FILE = "downloaded_file.csv"
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.environ.get("FP_CACHE_DIR", os.path.join(BASE_DIR, "Data", "cache"))
+ARROW_FILE = os.path.join(CACHE_DIR, "historical_data.arrow")
+# Schema metadata key of the content version (memo.data_version) in the Arrow file
+VERSION_KEY = b"fp_data_version"
+# Series x month panels (panel.SeriesPanel), one directory per data version
+PANEL_DIR = os.path.join(CACHE_DIR, "panels")
+
+# DataFrame.attrs key of the warning to show with the data (read_csv_dataset)
+WARNING_ATTR = "fp_data_warning"
+
+# Columns stored dictionary-encoded (pandas category) in the shared file
+CATEGORICAL_COLUMNS = ["county_name", "sub_county_name", "ward_name", "facility_name", "dataelement_name", "quarter"]
+
+# Set FP_SHARED_DATA=1 to serve one read-only, memory-mapped copy of the data
+SHARED_MODE = os.environ.get("FP_SHARED_DATA", "0") == "1"
+
+
+def read_csv_dataset(output=CSV_FILE):
+    """
+    Download the historical data CSV and derive the calendar columns
+
+    The CSV is downloaded again on every call; if that fails, the last
+    good copy in output is used and a warning for the user is stored in
+    df.attrs[WARNING_ATTR]. The caller shows it, since this function runs
+    inside a cache.
+
+    Parameters:
+    output (str): Local path to save the downloaded CSV to
+
+    Returns:
+    pandas.DataFrame: The prepared dataset
+
+    Raises:
+    FetchError: If the download failed and there is no local copy
+    """
+    with span("data.download"):
+        result = fetch_async(artifact("data", DATA_URL, output, DATA_SHA256), refresh=True).result()
+    if result["path"] is None:
+        raise FetchError(f"The historical data is not available: {result['error']}")
+    with span("data.parse"):
+        df = parse_csv_dataset(output)
+    if result["source"] == "fallback":
+        df.attrs[WARNING_ATTR] = "⚠️ Could not download the latest data; showing the last downloaded copy."
+    return df
+
+
+def parse_csv_dataset(path):
+    """
+    Read a historical data CSV and derive the calendar columns
+
+    Parameters:
+    path (str): Path of the CSV file
+
+    Returns:
+    pandas.DataFrame: The prepared dataset
+    """
+    # Read the CSV file
+    df = pd.read_csv(path)
+    # Drop 'Unnamed: 0' column if it exists
+    if 'Unnamed: 0' in df.columns:
+        df = df.drop('Unnamed: 0', axis=1)
+    df["period"] = pd.to_datetime(df["period"], errors="coerce")
+    df["year"] = df["period"].dt.year
+    df["month"] = df["period"].dt.month
+    df["quarter"] = df["period"].dt.to_period("Q").astype(str)
+    # Stored sorted by period, so a time range is a contiguous block of rows (utils.build_period_index)
+    df = df.sort_values("period", kind="stable", na_position="last", ignore_index=True)
+    # Hashed once here; results cached in memory and on disk are keyed by it
+    return stamp_data_version(df)
+
+
+def write_arrow_dataset(df, path=ARROW_FILE):
+    """
+    Write the dataset as an uncompressed Arrow IPC file that can be memory-mapped
+
+    The file is written to a temporary name and renamed into place, so
+    concurrent worker processes never see a partially written file.
+
+    Parameters:
+    df (pandas.DataFrame): The prepared dataset
+    path (str): Destination of the Arrow file
+
+    Returns:
+    str: Path of the written file
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    version = data_version(df)
+    df = df.astype({c: "category" for c in CATEGORICAL_COLUMNS if c in df.columns})
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    # Readers take the content version from here instead of hashing the data again
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), VERSION_KEY: version.encode()})
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_arrow_dataset(path=ARROW_FILE):
+    """
+    Memory-map the Arrow file and expose it as a DataFrame
+
+    Numeric columns are zero-copy views over the mapped pages, so every
+    process on the host shares them through the OS page cache.
+
+    Parameters:
+    path (str): Path of the Arrow file
+
+    Returns:
+    pandas.DataFrame: Read-only view of the dataset
+    """
+    source = pa.memory_map(path, "r")
+    table = ipc.open_file(source).read_all()
+    # split_blocks keeps one block per column so pandas does not consolidate (copy) them
+    df = table.to_pandas(split_blocks=True, self_destruct=False)
+    version = (table.schema.metadata or {}).get(VERSION_KEY)
+    # Files written before the version was stored are hashed on read
+    return stamp_data_version(df, version.decode() if version else None)
+
+
+def prepare_shared_dataset(refresh=False):
+    """
+    Make sure the shared Arrow file exists, downloading and converting the CSV if needed
+
+    Parameters:
+    refresh (bool): Download the CSV again and rebuild the file even if it exists
+
+    Returns:
+    str: Path of the Arrow file
+    """
+    if refresh or not os.path.exists(ARROW_FILE):
+        write_arrow_dataset(read_csv_dataset())
+    return ARROW_FILE
+
+
+def prepare_series_panel(df):
+    """
+    Make sure the panel of this data is saved under PANEL_DIR, building it if needed
+
+    Panels of other data versions are removed.
+
+    Parameters:
+    df (pandas.DataFrame): The dataset
+
+    Returns:
+    str: Directory of the panel
+    """
+    version = data_version(df)
+    path = os.path.join(PANEL_DIR, version)
+    if not os.path.exists(path):
+        SeriesPanel.from_frame(df, version).save(path)
+        for name in os.listdir(PANEL_DIR):
+            if name != version and not name.endswith(".tmp"):
+                shutil.rmtree(os.path.join(PANEL_DIR, name), ignore_errors=True)
+    return path
+
+
+def _load_shared():
+    return read_arrow_dataset(prepare_shared_dataset())
+
+
+if SHARED_MODE:
+    # One immutable frame per process, handed out by reference to every session.
+    # Pages must treat it as read-only (filter or copy before modifying).
+    load_data = st.cache_resource(show_spinner="Loading data...")(_load_shared)
+else:
+    load_data = st.cache_data(read_csv_dataset)
+
+
+def load_location_index():
+    """Location index of the data, built once per data version; row positions are valid for every copy of it"""
+    df = load_data()
+    return _location_index(df, data_version(df))
+
+
+def load_series_panel(df):
+    """
+    Dense series x month panel of the data, built once per data version
+
+    In shared dataset mode the panel is saved next to the Arrow file and
+    memory-mapped, so all processes on the host share one copy.
+    """
+    return _series_panel(df, data_version(df))
+
+
+def load_series_lags(df):
+    """Latest lag features of every series, built once per data version"""
+    return _series_lags(df, data_version(df))
+
+
+# The frame is not hashed by the caches below; the version argument is, so refreshed data is not served stale results
+
+@st.cache_resource
+def _location_index(_df, version):
+    return build_location_index(_df)
+
+
+@st.cache_resource
+def _series_panel(_df, version):
+    if SHARED_MODE:
+        return SeriesPanel.load(prepare_series_panel(_df))
+    return SeriesPanel.from_frame(_df, version)
+
+
+@st.cache_resource
+def _series_lags(_df, version):
+    return build_series_lag_index(_df)
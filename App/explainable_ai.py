@@ -3,17 +3,69 @@ import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
-import joblib
-import shap
-import matplotlib.pyplot as plt
-from utils import filter_data, calculate_lag_features
+from utils import filter_data, calculate_lag_features, series_options
+from model_store import load_model_artifacts, load_feature_pipeline, load_supported_series, model_version
+from inference import PRIORITY_BATCH, PRIORITY_EXPLAIN, get_inference_service, session_key, wait_for_result
+from instrumentation import instrumented, span
+from memo import data_version, memo_cache
+from shap_plots import summary_figure, waterfall_figure
+from data_store import load_series_lags
+from backtest import backtest_features, predict_in_chunks
+from scenarios import LAG_FEATURES, baseline_forecast, compare_scenarios, make_scenario, run_scenario, scenario_key
 
-def show_explainable_ai_page(df):
+# Explained rows kept in memory across sessions; the oldest are dropped first
+SHAP_CACHE_SIZE = 256
+# Scenario results (and baselines) kept per process
+MAX_SCENARIO_RESULTS = 32
+# Selections whose lag features, predictions and charts are kept per process
+MAX_CACHED_SELECTIONS = 256
+# Feature rows scored for permutation importance, for models without feature_importances_
+IMPORTANCE_ROWS = 2000
+
+SCENARIO_FORMATS = {
+    "series": st.column_config.NumberColumn("Series", format="%d"),
+    "baseline": st.column_config.NumberColumn("Baseline (units)", format="%.0f"),
+    "scenario": st.column_config.NumberColumn("Scenario (units)", format="%.0f"),
+    "change": st.column_config.NumberColumn("Change (units)", format="%+.0f"),
+    "change_pct": st.column_config.NumberColumn("Change", format="%+.1f%%"),
+}
+
+def _shap_cache():
+    """Process-wide LRU of SHAP figures keyed by (model version, series, feature row)"""
+    return memo_cache("xai.shap", max_entries=SHAP_CACHE_SIZE)
+
+def get_cached_explanation(key):
+    """
+    Look up a cached explanation, marking it as recently used
+    
+    Parameters:
+    key (tuple): (model version, series, feature row)
+    
+    Returns:
+    dict: prediction, waterfall and summary figures, or None
+    """
+    return _shap_cache().get(key)
+
+def _scenario_store():
+    """Process-wide store of baselines and scenario results keyed by (data and model version, year, month, scenario hash)"""
+    return memo_cache("xai.scenarios", max_entries=MAX_SCENARIO_RESULTS)
+
+def cached_scenario_result(key, compute):
+    """Return the stored result for key, computing and storing it on a miss"""
+    return _scenario_store().get_or_compute(key, compute)
+
+def store_explanation(key, entry):
+    """Add an explanation to the cache, evicting the least recently used beyond SHAP_CACHE_SIZE"""
+    _shap_cache().put(key, entry)
+
+@instrumented("page.explainable_ai")
+def show_explainable_ai_page(df, index=None):
     """
     Display the explainable AI page to help users understand model predictions
     
     Parameters:
     df (pandas.DataFrame): The dataset to use for predictions and explanations
+    index (dict): Precomputed location index from utils.build_location_index
     """
     # Apply custom header with gradient background
     st.markdown("""
@@ -33,27 +85,35 @@ def show_explainable_ai_page(df):
     col1, content_col, col2 = st.columns([0.05, 0.9, 0.05])
     
     with content_col:
-        # Load model and encoder
+        # Load model and feature pipeline (encoder lookups)
         try:
-            model = joblib.load("C:/Users/Admin/Documents/CT/school/PF/Models/best_gb_model.pkl")
-            encoder = joblib.load("C:/Users/Admin/Documents/CT/school/PF/Models/encoder.pkl")
+            with span("model.load"):
+                model, _ = load_model_artifacts()
+                pipeline = load_feature_pipeline()
+                # Only locations the model was trained on can be explained
+                series = load_supported_series(df)
+                series = series[series["supported"]]
             
             # Create tabs for different explanation approaches
-            tab1, tab2, tab3 = st.tabs(["Feature Importance", "SHAP Values", "What-If Analysis"])
+            tab1, tab2, tab3, tab4 = st.tabs(["Feature Importance", "SHAP Values", "What-If Analysis", "Scenario Planning"])
             
             with tab1:
-                show_feature_importance(model, df)
+                show_feature_importance(model, pipeline, df)
                 
             with tab2:
-                show_shap_analysis(model, encoder, df)
+                show_shap_analysis(model, pipeline, df, series, index)
                 
             with tab3:
-                show_what_if_analysis(model, encoder, df)
+                show_what_if_analysis(model, pipeline, df, series, index)
+                
+            with tab4:
+                show_scenario_planning(pipeline, df, series)
                 
         except FileNotFoundError:
             st.error("Model files not found. Please ensure 'best_gb_model.pkl' and 'encoder.pkl' are in the application directory.")
 
-def show_feature_importance(model, df):
+@instrumented("xai.feature_importance")
+def show_feature_importance(model, pipeline, df):
     """Display global feature importance for the predictive model"""
     st.markdown("""
     <div style="background-color: white; padding: 2px; border-radius: 10px; box-shadow: 0 4px 12px rgba(0,0,0,0.1); margin-bottom: 5px;">
@@ -62,46 +122,14 @@ def show_feature_importance(model, df):
     """, unsafe_allow_html=True)
     
     try:
-        # Get feature names from the model
-        feature_names = model.feature_names_in_
-        
-        # Get feature importances
-        importances = model.feature_importances_
-        
-        # Create a DataFrame for visualization
-        importance_df = pd.DataFrame({
-            'Feature': feature_names,
-            'Importance': importances
-        }).sort_values('Importance', ascending=False)
-        
-        # Calculate percentage importance
-        importance_df['Percentage'] = importance_df['Importance'] / importance_df['Importance'].sum() * 100
-        
-        # Create a bar chart with Plotly
-        fig = px.bar(
-            importance_df,
-            x='Percentage',
-            y='Feature',
-            orientation='h',
-            title='Feature Importance (%)',
-            labels={'Percentage': 'Importance (%)', 'Feature': 'Feature Name'},
-            color='Percentage',
-            color_continuous_scale='Viridis'
-        )
-        
-        # Customize layout
-        fig.update_layout(
-            plot_bgcolor="rgba(255,255,255,0.9)",
-            paper_bgcolor="rgba(255,255,255,0)",
-            font=dict(color="#2c3e50"),
-            xaxis=dict(showgrid=True, gridcolor="#eee"),
-            yaxis=dict(showgrid=False)
-        )
+        # The chart only changes with the model (and the data, for permutation importance)
+        importance = memo_cache("xai", max_entries=MAX_CACHED_SELECTIONS).get_or_compute(
+            ("importance", model_version(), data_version(df)), lambda: feature_importance_figure(model, pipeline, df))
         
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(importance["figure"], use_container_width=True)
         
         # Add explanation about top features
-        top_features = importance_df.head(3)['Feature'].tolist()
+        top_features = importance["top_features"]
         
         st.markdown(f"""
         <div style="background-color: #e3f2fd; padding: 2px; border-radius: 8px; margin: 5px 0; border-left: 4px solid #2196F3;">
@@ -114,7 +142,105 @@ def show_feature_importance(model, df):
     
     st.markdown("</div>", unsafe_allow_html=True)  # Close the card container
 
-def show_shap_analysis(model, encoder, df):
+def permutation_importances(model, pipeline, df, max_rows=IMPORTANCE_ROWS):
+    """
+    Increase in mean absolute error when each feature is shuffled
+    
+    Parameters:
+    model: The fitted model
+    pipeline (FeaturePipeline): Feature pipeline of the model
+    df (pandas.DataFrame): The dataset
+    max_rows (int): Score a random sample of this many feature rows
+    
+    Returns:
+    numpy.ndarray: Importance of each feature, in model column order
+    """
+    from sklearn.inspection import permutation_importance
+    X, rows = backtest_features(df, pipeline, horizons=(1,))
+    if len(X) > max_rows:
+        keep = np.sort(np.random.default_rng(0).choice(len(X), max_rows, replace=False))
+        X, rows = X.iloc[keep], rows.iloc[keep]
+    result = permutation_importance(model, X, rows["actual"].to_numpy(), scoring="neg_mean_absolute_error",
+                                    n_repeats=5, random_state=0)
+    # Shuffling a feature the model barely uses can help by chance; count that as no importance
+    return np.clip(result.importances_mean, 0, None)
+
+def feature_importance_figure(model, pipeline=None, df=None):
+    """
+    Bar chart of the model's feature importances
+    
+    Models without impurity importances (HistGradientBoostingRegressor)
+    are shown with permutation importances on the data instead.
+    
+    Parameters:
+    model: The fitted model
+    pipeline (FeaturePipeline): Feature pipeline, needed for permutation importance
+    df (pandas.DataFrame): The dataset, needed for permutation importance
+    
+    Returns:
+    dict: "figure" and "top_features" (the three most important feature names)
+    """
+    # Get feature names from the model
+    feature_names = model.feature_names_in_
+    
+    # Get feature importances
+    importances = getattr(model, "feature_importances_", None)
+    title = 'Feature Importance (%)'
+    if importances is None:
+        importances = permutation_importances(model, pipeline, df)
+        title = 'Permutation Importance (%)'
+    
+    # Create a DataFrame for visualization
+    importance_df = pd.DataFrame({
+        'Feature': feature_names,
+        'Importance': importances
+    }).sort_values('Importance', ascending=False)
+    
+    # Calculate percentage importance
+    importance_df['Percentage'] = importance_df['Importance'] / importance_df['Importance'].sum() * 100
+    
+    # Create a bar chart with Plotly
+    fig = px.bar(
+        importance_df,
+        x='Percentage',
+        y='Feature',
+        orientation='h',
+        title=title,
+        labels={'Percentage': 'Importance (%)', 'Feature': 'Feature Name'},
+        color='Percentage',
+        color_continuous_scale='Viridis'
+    )
+    
+    # Customize layout
+    fig.update_layout(
+        plot_bgcolor="rgba(255,255,255,0.9)",
+        paper_bgcolor="rgba(255,255,255,0)",
+        font=dict(color="#2c3e50"),
+        xaxis=dict(showgrid=True, gridcolor="#eee"),
+        yaxis=dict(showgrid=False)
+    )
+    return {"figure": fig, "top_features": importance_df.head(3)['Feature'].tolist()}
+
+def shap_case(df, series, index, county, subcounty, facility, commodity):
+    """
+    Ward and lag features of the case explained on the SHAP tab
+    
+    Returns:
+    dict: "ward" and "lags" (calculate_lag_features), or None when the selection has no data
+    """
+    filtered_df = filter_data(df, county=county, sub_county=subcounty, facility=facility,
+                              commodities=[commodity], index=index)
+    # A facility name can repeat across wards; use a ward the model knows for it
+    filtered_df = filtered_df[filtered_df["ward_name"].isin(series_options(
+        series, "ward_name", county_name=county, sub_county_name=subcounty, facility_name=facility,
+        dataelement_name=commodity))]
+    if filtered_df.empty:
+        return None
+    # Get most recent data for time-based features
+    return {"ward": filtered_df['ward_name'].iloc[0], "lags": calculate_lag_features(filtered_df)}
+
+@instrumented("xai.shap")
+def show_shap_analysis(model, pipeline, df, series, index=None):
     """Display SHAP values for model explanation"""
     st.markdown("""
     <div style="background-color: white; padding: 2px; border-radius: 10px; box-shadow: 0 4px 12px rgba(0,0,0,0.1); margin-bottom: 5px;">
@@ -133,36 +259,32 @@ def show_shap_analysis(model, encoder, df):
         # Location filters
         col1, col2, col3 = st.columns(3)
         with col1:
-            counties = sorted(df['county_name'].unique())
-            county = st.selectbox("County", options=counties)
+            county = st.selectbox("County", options=series_options(series, "county_name"))
             
         with col2:
-            filtered_df = df[df['county_name'] == county]
-            subcounties = sorted(filtered_df['sub_county_name'].unique())
-            subcounty = st.selectbox("Sub-County", options=subcounties)
+            subcounty = st.selectbox("Sub-County", options=series_options(series, "sub_county_name", county_name=county))
             
         with col3:
-            filtered_df = filtered_df[filtered_df['sub_county_name'] == subcounty]
-            facilities = sorted(filtered_df['facility_name'].unique())
-            facility = st.selectbox("Facility", options=facilities)
+            facility = st.selectbox("Facility", options=series_options(series, "facility_name", county_name=county,
+                                                                       sub_county_name=subcounty))
             
         # Further filter by commodity
-        filtered_df = filtered_df[filtered_df['facility_name'] == facility]
-        commodities = sorted(filtered_df['dataelement_name'].unique())
-        commodity = st.selectbox("Commodity", options=commodities)
+        commodity = st.selectbox("Commodity", options=series_options(series, "dataelement_name", county_name=county,
+                                                                     sub_county_name=subcounty, facility_name=facility))
         
-        # Create sample data
-        filtered_df = filtered_df[filtered_df['dataelement_name'] == commodity]
+        # Create sample data (looked up once per selection)
+        case = memo_cache("xai", max_entries=MAX_CACHED_SELECTIONS).get_or_compute(
+            ("shap_case", data_version(df), county, subcounty, facility, commodity),
+            lambda: shap_case(df, series, index, county, subcounty, facility, commodity))
         
-        if not filtered_df.empty:
-            # Get most recent data for time-based features
-            lag_features = calculate_lag_features(filtered_df)
+        if case is not None:
+            lag_features = case["lags"]
             
             # Create a sample for explanation
-            sample_data = pd.DataFrame([{
+            sample_data_encoded = pipeline.frame({
                 "county_name": county,
                 "sub_county_name": subcounty,
-                "ward_name": filtered_df['ward_name'].iloc[0],
+                "ward_name": case["ward"],
                 "facility_name": facility,
                 "dataelement_name": commodity,
                 "month": 4,  # Example value
@@ -171,16 +293,23 @@ def show_shap_analysis(model, encoder, df):
                 "lag_1": lag_features["lag_1"],
                 "lag_3": lag_features["lag_3"],
                 "rolling_mean_3": lag_features["rolling_mean_3"]
-            }])
+            })
             
-            # Transform categorical features
-            cat_cols = ['county_name', 'sub_county_name', 'ward_name', 'facility_name', 'dataelement_name']
-            sample_data_encoded = sample_data.copy()
-            sample_data_encoded[cat_cols] = encoder.transform(sample_data[cat_cols])
+            features = pipeline.feature_names
+            row = sample_data_encoded[features]
+            cache_key = (model_version(), (county, subcounty, facility, commodity), tuple(row.iloc[0]))
+            explanation = get_cached_explanation(cache_key)
             
-            # Predict
-            features = ['month', 'year', 'quarter', 'lag_1', 'lag_3', 'rolling_mean_3'] + cat_cols
-            prediction = model.predict(sample_data_encoded[features])[0]
+            if explanation is None:
+                # Predict and explain on the inference pool; a newer selection cancels a stale job
+                service = get_inference_service()
+                predict_key = session_key("shap_predict")
+                explain_key = session_key("shap_explain")
+                prediction_future = service.submit("predict", row, key=predict_key)
+                explain_future = service.submit("explain", row, priority=PRIORITY_EXPLAIN, key=explain_key)
+                prediction = wait_for_result(prediction_future, service, predict_key, message="Predicting")[0]
+            else:
+                prediction = explanation["prediction"]
             
             # Display prediction
             st.markdown(f"""
@@ -192,54 +321,53 @@ def show_shap_analysis(model, encoder, df):
             # Calculate SHAP values
             st.subheader("SHAP Values Explanation")
             
-            with st.spinner("Calculating SHAP values..."):
-                # Create a background dataset for SHAP
-                # We'll use a small random sample of the data for the background
-                background_data = df.sample(min(100, len(df)))
-                
-                # Encode the background data
-                background_data_encoded = background_data.copy()
-                background_data_encoded[cat_cols] = encoder.transform(background_data[cat_cols])
-                
-                # Initialize the SHAP explainer
-                explainer = shap.Explainer(model)
-                
-                # Calculate SHAP values for the sample
-                shap_values = explainer(sample_data_encoded[features])
+            if explanation is None:
+                # Calculate SHAP values for the sample (the tree explainer needs no background data)
+                with span("xai.shap.explain"):
+                    shap_values = wait_for_result(explain_future, service, explain_key,
+                                                  message="Calculating SHAP values")
                 
-                # Create a SHAP force plot
-                fig, ax = plt.subplots(figsize=(10, 3))
-                shap.plots.waterfall(shap_values[0], max_display=10, show=False)
-                plt.title("SHAP Waterfall Plot - Feature Contributions")
-                plt.tight_layout()
-                st.pyplot(fig)
-                
-                # Add interpretation
-                st.markdown("""
-                <div style="background-color: #f5f5f5; padding: 2px; border-radius: 8px; margin: 5px 0;">
-                    <h4 style="color: #2c3e50; margin-top: 0;">How to Interpret the Chart:</h4>
-                    <ul>
-                        <li>Red bars push the prediction higher</li>
-                        <li>Blue bars push the prediction lower</li>
-                        <li>The final prediction is the sum of the base value and all feature contributions</li>
-                    </ul>
-                </div>
-                """, unsafe_allow_html=True)
+                # Build the figures once from the SHAP arrays; repeat views reuse them
+                with span("xai.shap.build_figures"):
+                    values = np.asarray(shap_values.values)[0]
+                    base_value = float(np.ravel(shap_values.base_values)[0])
+                    data = row.to_numpy()[0]
+                    explanation = {
+                        "prediction": prediction,
+                        "waterfall": waterfall_figure(values, base_value, data, features, max_display=10),
+                        "summary": summary_figure(values[None, :], data[None, :], features),
+                    }
+                store_explanation(cache_key, explanation)
+            
+            # Create a SHAP waterfall plot
+            with span("xai.shap.waterfall_plot"):
+                st.plotly_chart(explanation["waterfall"], use_container_width=True)
                 
-                # Create a SHAP summary plot
-                plt.figure(figsize=(10, 6))
-                shap.summary_plot(shap_values, sample_data_encoded[features], feature_names=features, show=False)
-                plt.tight_layout()
-                st.pyplot(plt)
+            # Add interpretation
+            st.markdown("""
+            <div style="background-color: #f5f5f5; padding: 2px; border-radius: 8px; margin: 5px 0;">
+                <h4 style="color: #2c3e50; margin-top: 0;">How to Interpret the Chart:</h4>
+                <ul>
+                    <li>Red bars push the prediction higher</li>
+                    <li>Blue bars push the prediction lower</li>
+                    <li>The final prediction is the sum of the base value and all feature contributions</li>
+                </ul>
+            </div>
+            """, unsafe_allow_html=True)
+            
+            # Create a SHAP summary plot
+            with span("xai.shap.summary_plot"):
+                st.plotly_chart(explanation["summary"], use_container_width=True)
         else:
             st.warning("No data available for the selected filters. Please choose different criteria.")
     except Exception as e:
         st.error(f"Error in SHAP analysis: {str(e)}")
-        st.info("SHAP analysis requires scikit-learn, shap, and matplotlib libraries. Please ensure they are installed.")
+        st.info("SHAP analysis requires the scikit-learn and shap libraries. Please ensure they are installed.")
     
     st.markdown("</div>", unsafe_allow_html=True)  # Close the card container
 
-def show_what_if_analysis(model, encoder, df):
+@instrumented("xai.what_if")
+def show_what_if_analysis(model, pipeline, df, series, index=None):
     """Interactive what-if analysis to see how changing inputs affects predictions"""
     st.markdown("""
     <div style="background-color: white; padding: 2px; border-radius: 10px; box-shadow: 0 4px 12px rgba(0,0,0,0.1); margin-bottom: 5px;">
@@ -248,9 +376,6 @@ def show_what_if_analysis(model, encoder, df):
     """, unsafe_allow_html=True)
     
     try:
-        # Get valid categorical values from the encoder
-        valid_counties = encoder.categories_[0]
-        
         # Get features used by the model
         feature_names = model.feature_names_in_
         
@@ -260,51 +385,40 @@ def show_what_if_analysis(model, encoder, df):
         # Location filters
         col1, col2, col3 = st.columns(3)
         with col1:
-            county = st.selectbox("County", options=valid_counties, key="whatif_county")
-            
-        # Filter subcounties based on selected county
-        county_df = df[df["county_name"] == county]
-        valid_subcounties = sorted(county_df["sub_county_name"].unique())
+            county = st.selectbox("County", options=series_options(series, "county_name"), key="whatif_county")
         
         with col2:
-            sub_county = st.selectbox("Sub-County", options=valid_subcounties, key="whatif_subcounty")
-        
-        # Filter wards based on selected subcounty
-        subcounty_df = county_df[county_df["sub_county_name"] == sub_county]
-        valid_wards = sorted(subcounty_df["ward_name"].unique())
+            sub_county = st.selectbox("Sub-County", options=series_options(series, "sub_county_name", county_name=county),
+                                      key="whatif_subcounty")
         
         with col3:
-            ward = st.selectbox("Ward", options=valid_wards, key="whatif_ward")
-        
-        # Filter facilities based on selected ward
-        ward_df = subcounty_df[subcounty_df["ward_name"] == ward]
-        valid_facilities = sorted(ward_df["facility_name"].unique())
+            ward = st.selectbox("Ward", options=series_options(series, "ward_name", county_name=county,
+                                                               sub_county_name=sub_county), key="whatif_ward")
         
         col4, col5 = st.columns(2)
         with col4:
-            facility = st.selectbox("Facility", options=valid_facilities, key="whatif_facility")
-        
-        # Get valid commodities for the selected facility
-        facility_df = ward_df[ward_df["facility_name"] == facility]
-        valid_commodities = sorted(facility_df["dataelement_name"].unique())
+            facility = st.selectbox("Facility", options=series_options(series, "facility_name", county_name=county,
+                                                                       sub_county_name=sub_county, ward_name=ward),
+                                    key="whatif_facility")
         
         with col5:
-            commodity = st.selectbox("Commodity", options=valid_commodities, key="whatif_commodity")
+            commodity = st.selectbox("Commodity", options=series_options(series, "dataelement_name", county_name=county,
+                                                                         sub_county_name=sub_county, ward_name=ward,
+                                                                         facility_name=facility),
+                                     key="whatif_commodity")
         
         # Time features
         st.subheader("2. Adjust Numerical Features")
         st.markdown("Experiment with these values to see how they affect the prediction")
         
-        # Get base values for numerical features
-        facility_commodity_df = df[
-            (df["county_name"] == county) &
-            (df["sub_county_name"] == sub_county) &
-            (df["ward_name"] == ward) &
-            (df["facility_name"] == facility) &
-            (df["dataelement_name"] == commodity)
-        ].sort_values("period")
-        
-        lag_features = calculate_lag_features(facility_commodity_df)
+        # Get base values for numerical features (once per selection)
+        cache = memo_cache("xai", max_entries=MAX_CACHED_SELECTIONS)
+        lag_features = cache.get_or_compute(
+            ("what_if_lags", data_version(df), county, sub_county, ward, facility, commodity),
+            lambda: calculate_lag_features(filter_data(
+                df, county=county, sub_county=sub_county, ward=ward,
+                facility=facility, commodities=[commodity], index=index
+            ).sort_values("period")))
         
         # Create sliders for numerical inputs
         col1, col2 = st.columns(2)
@@ -338,7 +452,7 @@ def show_what_if_analysis(model, encoder, df):
                                      key="whatif_rolling")
         
         # Create input data for prediction
-        input_data = pd.DataFrame([{
+        input_data = pipeline.frame({
             "county_name": county,
             "sub_county_name": sub_county,
             "ward_name": ward,
@@ -350,15 +464,17 @@ def show_what_if_analysis(model, encoder, df):
             "lag_1": lag_1,
             "lag_3": lag_3,
             "rolling_mean_3": rolling_mean_3
-        }])
-        
-        # Transform categorical features
-        cat_cols = ['county_name', 'sub_county_name', 'ward_name', 'facility_name', 'dataelement_name']
-        input_data[cat_cols] = encoder.transform(input_data[cat_cols])
-        features = ['month', 'year', 'quarter', 'lag_1', 'lag_3', 'rolling_mean_3'] + cat_cols
-        
-        # Make prediction
-        prediction = model.predict(input_data[features])[0]
+        })
+        features = pipeline.feature_names
+        
+        # Make prediction on the inference pool; settings seen before are answered from the cache
+        service = get_inference_service()
+        predict_key = session_key("whatif_predict")
+        row_key = (model_version(), tuple(input_data[features].iloc[0]))
+        prediction = cache.get_or_compute(
+            ("what_if_prediction",) + row_key,
+            lambda: wait_for_result(service.submit("predict", input_data[features], key=predict_key),
+                                    service, predict_key, message="Predicting")[0])
         
         # Display prediction
         st.markdown(f"""
@@ -393,63 +509,18 @@ def show_what_if_analysis(model, encoder, df):
             
         values = np.linspace(min_value, max_value, 10)
         
-        # Calculate predictions for each value
-        sensitivity_results = []
-        
-        for value in values:
-            # Create a copy of the input data and update the selected feature
-            temp_data = input_data.copy()
-            temp_data[sensitivity_feature] = value
-            
-            # Make prediction
-            temp_prediction = model.predict(temp_data[features])[0]
-            
-            # Store result
-            sensitivity_results.append({
-                "Value": value,
-                "Prediction": temp_prediction
-            })
-        
-        # Create DataFrame from results
-        sensitivity_df = pd.DataFrame(sensitivity_results)
-        
-        # Create line chart
-        fig = px.line(
-            sensitivity_df, 
-            x="Value", 
-            y="Prediction",
-            title=f"Sensitivity Analysis for {sensitivity_feature}",
-            markers=True
-        )
-        
-        # Add vertical line at current value
-        fig.add_vline(
-            x=base_value,
-            line_dash="dash",
-            line_color="red",
-            annotation_text="Current Value",
-            annotation_position="top right"
-        )
-        
-        # Add horizontal line at current prediction
-        fig.add_hline(
-            y=prediction,
-            line_dash="dash",
-            line_color="green",
-            annotation_text="Current Prediction",
-            annotation_position="left"
-        )
+        # Calculate predictions for all values as one sweep job
+        def sweep_figure():
+            sweep_key = session_key("whatif_sweep")
+            sweep_future = service.submit("sweep", input_data[features], sensitivity_feature, values,
+                                          priority=PRIORITY_EXPLAIN, key=sweep_key)
+            with span("xai.what_if.sweep"):
+                sweep_predictions = wait_for_result(sweep_future, service, sweep_key,
+                                                    message="Running sensitivity sweep")
+            return sensitivity_figure(values, sweep_predictions, sensitivity_feature, base_value, prediction)
         
-        # Customize layout
-        fig.update_layout(
-            xaxis_title=f"{sensitivity_feature} Value",
-            yaxis_title="Predicted Demand",
-            plot_bgcolor="rgba(255,255,255,0.9)",
-            paper_bgcolor="rgba(255,255,255,0)",
-            font=dict(color="#2c3e50"),
-            xaxis=dict(showgrid=True, gridcolor="#eee"),
-            yaxis=dict(showgrid=True, gridcolor="#eee")
-        )
+        # The sweep and its chart depend only on the model, the settings and the feature
+        fig = cache.get_or_compute(("what_if_sweep",) + row_key + (sensitivity_feature,), sweep_figure)
         
         st.plotly_chart(fig, use_container_width=True)
         
@@ -463,4 +534,164 @@ def show_what_if_analysis(model, encoder, df):
     except Exception as e:
         st.error(f"Error in what-if analysis: {str(e)}")
     
-    st.markdown("</div>", unsafe_allow_html=True)  # Close the card container
\ No newline at end of file
+    st.markdown("</div>", unsafe_allow_html=True)  # Close the card container
+def sensitivity_figure(values, predictions, feature, base_value, prediction):
+    """Line chart of the predictions of a sensitivity sweep, marking the current value and prediction"""
+    # Create DataFrame from results
+    sensitivity_df = pd.DataFrame({
+        "Value": values,
+        "Prediction": predictions
+    })
+    
+    # Create line chart
+    fig = px.line(
+        sensitivity_df, 
+        x="Value", 
+        y="Prediction",
+        title=f"Sensitivity Analysis for {feature}",
+        markers=True
+    )
+    
+    # Add vertical line at current value
+    fig.add_vline(
+        x=base_value,
+        line_dash="dash",
+        line_color="red",
+        annotation_text="Current Value",
+        annotation_position="top right"
+    )
+    
+    # Add horizontal line at current prediction
+    fig.add_hline(
+        y=prediction,
+        line_dash="dash",
+        line_color="green",
+        annotation_text="Current Prediction",
+        annotation_position="left"
+    )
+    
+    # Customize layout
+    fig.update_layout(
+        xaxis_title=f"{feature} Value",
+        yaxis_title="Predicted Demand",
+        plot_bgcolor="rgba(255,255,255,0.9)",
+        paper_bgcolor="rgba(255,255,255,0)",
+        font=dict(color="#2c3e50"),
+        xaxis=dict(showgrid=True, gridcolor="#eee"),
+        yaxis=dict(showgrid=True, gridcolor="#eee")
+    )
+    return fig
+
+@instrumented("xai.scenarios")
+def show_scenario_planning(pipeline, df, series):
+    """Forecast one month for every series under several demand scenarios and compare them"""
+    st.markdown("""
+    <div style="background-color: white; padding: 2px; border-radius: 10px; box-shadow: 0 4px 12px rgba(0,0,0,0.1); margin-bottom: 5px;">
+        <h3 style="color: #2c3e50; border-bottom: 2px solid #4CAF50; padding-bottom: 10px;">Scenario Planning</h3>
+        <p>Change recent demand for a group of facilities, such as every facility in a county, and compare the forecasts with the baseline.</p>
+    """, unsafe_allow_html=True)
+    
+    scenarios = st.session_state.setdefault("scenarios", [])
+    
+    # Forecast month: defaults to the month after the latest data
+    next_period = df["period"].max() + pd.DateOffset(months=1)
+    time_col1, time_col2 = st.columns(2)
+    with time_col1:
+        month = st.number_input("Month", min_value=1, max_value=12, value=int(next_period.month), key="scenario_month")
+    with time_col2:
+        year = st.number_input("Year", min_value=2011, max_value=2030, value=int(next_period.year), key="scenario_year")
+    
+    # Scenario definition
+    st.subheader("1. Define a Scenario")
+    def_col1, def_col2, def_col3 = st.columns(3)
+    with def_col1:
+        counties = st.multiselect("Counties", options=series_options(series, "county_name"),
+                                  placeholder="All counties", key="scenario_counties")
+    with def_col2:
+        commodities = st.multiselect("Commodities", options=series_options(series, "dataelement_name"),
+                                     placeholder="All commodities", key="scenario_commodities")
+    with def_col3:
+        in_counties = series[series["county_name"].isin(counties)] if counties else series
+        facilities = st.multiselect("Facilities", options=sorted(in_counties["facility_name"].unique()),
+                                    placeholder="All facilities", key="scenario_facilities")
+    
+    change_col, feature_col = st.columns(2)
+    with change_col:
+        demand_change = st.slider("Change in recent demand (%)", min_value=-100, max_value=200, value=-20, step=5,
+                                  key="scenario_change")
+    with feature_col:
+        features = st.multiselect("Applied to", options=LAG_FEATURES, default=LAG_FEATURES, key="scenario_features")
+    
+    default_name = f"{demand_change:+d}% " + (", ".join(counties[:2]) + ("…" if len(counties) > 2 else "") or "national")
+    # No key: the suggested name follows the selections until the user edits it
+    name = st.text_input("Scenario name", value=default_name)
+    
+    add_col, clear_col = st.columns(2)
+    with add_col:
+        if st.button("Add scenario", use_container_width=True):
+            scenario = make_scenario(name, counties, commodities, facilities, demand_change / 100, features)
+            if all(scenario_key(s) != scenario_key(scenario) for s in scenarios):
+                # Names label the comparison, so keep them unique
+                names = {s["name"] for s in scenarios}
+                suffix = 2
+                while scenario["name"] in names:
+                    scenario["name"] = f"{name} ({suffix})"
+                    suffix += 1
+                scenarios.append(scenario)
+    with clear_col:
+        if st.button("Clear scenarios", use_container_width=True, disabled=not scenarios):
+            scenarios.clear()
+    
+    if not scenarios:
+        st.info("Add one or more scenarios to compare them with the baseline forecast.")
+        st.markdown("</div>", unsafe_allow_html=True)
+        return
+    
+    # Forecast the baseline and every scenario (each cached by its hash)
+    st.subheader("2. Compare Scenarios")
+    service = get_inference_service()
+    progress = st.progress(0.0, text="Forecasting scenarios...")
+    predict = lambda X: predict_in_chunks(X, lambda chunk: service.submit("predict", chunk, priority=PRIORITY_BATCH))
+    version = (data_version(df), model_version())
+    with span("xai.scenarios.baseline"):
+        baseline = cached_scenario_result(
+            (*version, int(year), int(month), "baseline"),
+            lambda: baseline_forecast(load_series_lags(df), pipeline, predict, int(year), int(month)),
+        )
+    results = {}
+    for done, scenario in enumerate(scenarios, start=1):
+        with span("xai.scenarios.run"):
+            results[scenario["name"]] = cached_scenario_result(
+                (*version, int(year), int(month), scenario_key(scenario)),
+                lambda: run_scenario(baseline, scenario, predict),
+            )
+        progress.progress(done / len(scenarios), text=f"Forecasting scenarios... {done}/{len(scenarios)}")
+    progress.empty()
+    
+    summary = compare_scenarios(results)
+    st.dataframe(summary, column_config=SCENARIO_FORMATS, use_container_width=True, hide_index=True)
+    
+    by_county = compare_scenarios(results, by="county_name")
+    fig = px.bar(
+        by_county, x="county_name", y="change", color="Scenario", barmode="group",
+        labels={"county_name": "County", "change": "Change in forecast demand (units)"},
+        title=f"Change from the baseline forecast, {int(year)}-{int(month):02d}",
+    )
+    fig.update_layout(
+        plot_bgcolor="rgba(255,255,255,0.9)",
+        paper_bgcolor="rgba(255,255,255,0)",
+        font=dict(color="#2c3e50"),
+        xaxis=dict(showgrid=False, tickangle=-45),
+        yaxis=dict(showgrid=True, gridcolor="#eee"),
+    )
+    st.plotly_chart(fig, use_container_width=True)
+    
+    st.download_button(
+        "Download scenario forecasts (CSV)",
+        pd.concat([r.assign(scenario_name=n) for n, r in results.items()], ignore_index=True)
+            .to_csv(index=False).encode("utf-8"),
+        file_name="scenarios.csv",
+        mime="text/csv",
+    )
+    
+    st.markdown("</div>", unsafe_allow_html=True)  # Close the card container
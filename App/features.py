@@ -0,0 +1,170 @@
+import numpy as np
+import pandas as pd
+
+from utils import SERIES_COLUMNS
+
+# Categorical model inputs, in encoder.categories_ order
+CATEGORICAL_FEATURES = SERIES_COLUMNS
+# Model input columns, in the order the model was trained on
+NUMERIC_FEATURES = ["month", "year", "quarter", "lag_1", "lag_3", "rolling_mean_3"]
+MODEL_FEATURES = NUMERIC_FEATURES + CATEGORICAL_FEATURES
+# Code of a category the encoder was not fitted on
+UNKNOWN_CODE = -1
+
+
+class FeaturePipeline:
+    """
+    Turns columnar inputs into the model's feature matrix in one vectorised pass
+
+    The categorical encoding is precomputed from the fitted OrdinalEncoder:
+    each column's categories become a hashed pandas Index, so encoding is a
+    single get_indexer lookup (or a take over category codes for
+    categorical columns) instead of an encoder.transform on a DataFrame.
+    Works the same for one row or a million.
+
+    Parameters:
+    encoder (OrdinalEncoder): Fitted encoder for the categorical columns
+    feature_names (list): Model column order (defaults to MODEL_FEATURES)
+    """
+
+    def __init__(self, encoder, feature_names=None):
+        self.feature_names = list(feature_names) if feature_names is not None else list(MODEL_FEATURES)
+        self.categories = {
+            column: pd.Index(categories)
+            for column, categories in zip(CATEGORICAL_FEATURES, encoder.categories_)
+        }
+        # Mirror OrdinalEncoder(handle_unknown="use_encoded_value") when the encoder was fitted that way
+        if getattr(encoder, "handle_unknown", "error") == "use_encoded_value":
+            self.unknown_value = encoder.unknown_value
+        else:
+            self.unknown_value = None
+
+    def codes(self, column, values):
+        """
+        Encoder codes for one categorical column, UNKNOWN_CODE for unknown values
+
+        Parameters:
+        column (str): Categorical column name
+        values (array-like): Raw category values (pandas categorical columns use their codes)
+
+        Returns:
+        numpy.ndarray: Integer codes
+        """
+        index = self.categories[column]
+        if isinstance(getattr(values, "dtype", None), pd.CategoricalDtype):
+            values = pd.Categorical(values)
+            # Map each distinct category once, then take by code
+            lookup = np.append(index.get_indexer(values.categories), UNKNOWN_CODE)
+            return lookup[values.codes]
+        return index.get_indexer(np.asarray(values, dtype=object))
+
+    def supported(self, columns):
+        """
+        Whether the model was trained on every category of each row
+
+        Parameters:
+        columns (dict or pandas.DataFrame): The categorical columns as equal-length arrays
+
+        Returns:
+        numpy.ndarray: Boolean flag per row
+        """
+        flags = None
+        for column in CATEGORICAL_FEATURES:
+            known = self.codes(column, columns[column]) != UNKNOWN_CODE
+            flags = known if flags is None else flags & known
+        return flags
+
+    def encode(self, column, values):
+        """
+        Encode one categorical column as the model expects (float codes)
+
+        Raises:
+        ValueError: On categories the encoder was not fitted on, like encoder.transform
+        """
+        codes = self.codes(column, values)
+        unknown = codes == UNKNOWN_CODE
+        if unknown.any():
+            if self.unknown_value is None:
+                bad = pd.unique(np.asarray(values, dtype=object)[unknown])[:5]
+                raise ValueError(f"Found unknown categories {list(bad)} in column {column}")
+            return np.where(unknown, self.unknown_value, codes).astype(np.float64)
+        return codes.astype(np.float64)
+
+    def transform(self, columns):
+        """
+        Build the model feature matrix
+
+        Parameters:
+        columns (dict or pandas.DataFrame): Location columns, month, year, lag_1, lag_3 and
+            rolling_mean_3 as scalars or equal-length arrays; quarter is derived from month
+            when not given
+
+        Returns:
+        numpy.ndarray: float64 matrix with one row per input, columns in feature_names order
+        """
+        n = max(len(v) if np.ndim(v) else 1 for v in (columns[c] for c in columns))
+        X = np.empty((n, len(self.feature_names)), dtype=np.float64)
+        for position, name in enumerate(self.feature_names):
+            if name == "quarter" and "quarter" not in columns:
+                values = (np.asarray(columns["month"]) - 1) // 3 + 1
+            elif name in self.categories:
+                values = self.encode(name, columns[name] if np.ndim(columns[name]) else [columns[name]])
+            else:
+                values = np.asarray(columns[name], dtype=np.float64)
+            X[:, position] = values
+        return X
+
+    def frame(self, columns, index=None):
+        """Same as transform, wrapped (without copying) in a DataFrame with the model's column names"""
+        return pd.DataFrame(self.transform(columns), columns=self.feature_names, index=index, copy=False)
+
+
+def supported_series(df, pipeline):
+    """
+    Every facility x commodity series in the data, flagged by whether the model can score it
+
+    Parameters:
+    df (pandas.DataFrame): The dataset
+    pipeline (FeaturePipeline): Feature pipeline for the model
+
+    Returns:
+    pandas.DataFrame: One row per series with the SERIES_COLUMNS and a boolean "supported" column,
+        sorted by location
+    """
+    series = df[SERIES_COLUMNS].drop_duplicates().sort_values(SERIES_COLUMNS).reset_index(drop=True)
+    series["supported"] = pipeline.supported(series)
+    return series
+
+
+def historical_feature_frame(df, pipeline):
+    """
+    Build the model feature rows for every historical record in one pass
+
+    Each row gets the lag features the app would have computed just before
+    its period: lag_1 and lag_3 are the values 1 and 3 records earlier in the
+    same series and rolling_mean_3 is the mean of the previous three values.
+
+    Parameters:
+    df (pandas.DataFrame): The dataset
+    pipeline (FeaturePipeline): Feature pipeline for the model
+
+    Returns:
+    pandas.DataFrame: Encoded feature rows (plus the actual "value"), aligned with the sorted data
+    """
+    data = df.sort_values(SERIES_COLUMNS + ["period"], kind="stable")
+    values = data["value"]
+    grouped = values.groupby([data[c] for c in SERIES_COLUMNS], sort=False, observed=True)
+    previous = grouped.shift(1)
+    columns = {c: data[c] for c in SERIES_COLUMNS}
+    columns.update(
+        month=data["month"].to_numpy(),
+        year=data["year"].to_numpy(),
+        quarter=data["period"].dt.quarter.to_numpy(),
+        lag_1=previous.fillna(0).to_numpy(),
+        lag_3=grouped.shift(3).fillna(0).to_numpy(),
+        # Mean of the three values before this one, within the series
+        rolling_mean_3=((previous + grouped.shift(2) + grouped.shift(3)) / 3).fillna(0).to_numpy(),
+    )
+    features = pipeline.frame(columns, index=data.index)
+    features["value"] = values.to_numpy()
+    return features
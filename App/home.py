@@ -1,12 +1,60 @@
+import io
+import os
+import tempfile
+import zipfile
 import streamlit as st
 from map import render_map
+from instrumentation import instrumented, span
+from model_store import load_feature_pipeline, model_paths, model_version
+from data_store import load_series_lags
+from memo import data_version, memo_cache
 
-def show_home_page(df):
+# The briefs (reports, backtest, the inference pool) are imported when a user asks for them,
+# so a plain Home page view stays light
+
+@st.cache_resource(show_spinner="Forecasting every series for the briefs...", max_entries=2)
+def load_report_context(_df, version):
+    """Aggregates and forecasts shared by every brief, computed once per model version"""
+    from backtest import predict_in_chunks
+    from inference import PRIORITY_BATCH, get_inference_service
+    from reports import report_context
+    service = get_inference_service()
+    predict = lambda X: predict_in_chunks(X, lambda chunk: service.submit("predict", chunk, priority=PRIORITY_BATCH))
+    return report_context(_df, load_series_lags(_df), load_feature_pipeline(), predict, model_version=version)
+
+class PoolExplainer:
+    """
+    SHAP values from the inference pool, whose workers keep an explainer loaded
+    
+    Stands in for shap.TreeExplainer in reports.brief_drivers, so a brief
+    rendered in the server process does not build its own explainer.
+    """
+    
+    def shap_values(self, X, check_additivity=False):
+        from inference import PRIORITY_EXPLAIN, get_inference_service
+        return get_inference_service().submit("explain", X, priority=PRIORITY_EXPLAIN).result().values
+
+def overview_metrics(df):
+    """
+    Headline figures of the dataset, computed once per data version
+    
+    Returns:
+    dict: commodities, counties and units (total dispensed)
+    """
+    return memo_cache("home").get_or_compute(("overview", data_version(df)), lambda: {
+        "commodities": df["dataelement_name"].nunique(),
+        "counties": df["county_name"].nunique(),
+        "units": df["value"].sum(),
+    })
+
+@instrumented("page.home")
+def show_home_page(df, index=None):
     """
     Display the home page with map visualization
     
     Parameters:
     df (pandas.DataFrame): The dataset to visualize
+    index (dict): Precomputed location index from utils.build_location_index
     """
     # Apply custom header with gradient background
     st.markdown("""
@@ -17,20 +65,22 @@ def show_home_page(df):
     
     # Display metrics summary
     col1, col2, col3 = st.columns(3)
-    with col1:
-        display_metric("Total Commodities", 
-                      df["dataelement_name"].nunique(),
-                      "📦")
-        
-    with col2:
-        display_metric("Counties Covered", 
-                      df["county_name"].nunique(),
-                      "🗺️")
-        
-    with col3:
-        display_metric("Total Distributed Units", 
-                      f"{df['value'].sum():,.0f}",
-                      "📈")
+    with span("home.metrics"):
+        metrics = overview_metrics(df)
+        with col1:
+            display_metric("Total Commodities", 
+                          metrics["commodities"],
+                          "📦")
+            
+        with col2:
+            display_metric("Counties Covered", 
+                          metrics["counties"],
+                          "🗺️")
+            
+        with col3:
+            display_metric("Total Distributed Units", 
+                          f"{metrics['units']:,.0f}",
+                          "📈")
     
     # Create card-like container for the description
     st.markdown("""
@@ -54,10 +104,13 @@ def show_home_page(df):
     col1, map_col, col2 = st.columns([0.05, 0.9, 0.05])
     with map_col:
         # Make map use the column width with minimal padding
-        render_map(df)
+        render_map(df, index)
     
     st.markdown("</div>", unsafe_allow_html=True)
     
+    with st.expander("📄 County and commodity briefs"):
+        show_report_export(df)
+    
     # Add footer with info
     st.markdown("""
     <div style="margin-top: 30px; text-align: center; color: #666; font-size: 14px;">
@@ -65,6 +118,71 @@ def show_home_page(df):
     </div>
     """, unsafe_allow_html=True)
 
+@instrumented("home.reports")
+def show_report_export(df):
+    """
+    Generate county or commodity briefs (HTML/PDF) for download
+    
+    Parameters:
+    df (pandas.DataFrame): The dataset
+    """
+    # Expanders run their body even when collapsed: forecast every series only once asked to
+    if not st.checkbox("Prepare briefs", key="report_enabled",
+                       help="Forecasts every series nationally; takes a while on the first use"):
+        return
+    from reports import FORMATS, KINDS, brief_filename, brief_names, generate_reports
+    
+    try:
+        context = load_report_context(df, model_version())
+    except FileNotFoundError:
+        st.error("❌ Model files are not available, so briefs cannot be generated.")
+        return
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        kind = st.radio("Brief", options=list(KINDS), format_func=str.capitalize, horizontal=True, key="report_kind")
+    with col2:
+        name = st.selectbox(kind.capitalize(), options=brief_names(context, kind), key="report_name")
+    with col3:
+        formats = st.multiselect("Formats", options=FORMATS, default=FORMATS, format_func=str.upper,
+                                 key="report_formats")
+    
+    one_col, all_col = st.columns(2)
+    with one_col:
+        one = st.button("Generate brief", use_container_width=True, disabled=not formats or name is None)
+    with all_col:
+        everything = st.button("Generate all briefs (zip)", use_container_width=True, disabled=not formats,
+                               help="Every county and commodity, rendered in parallel worker processes")
+    
+    if one or everything:
+        briefs = [(k, n) for k in KINDS for n in brief_names(context, k)] if everything else [(kind, name)]
+        progress = st.progress(0.0, text="Rendering briefs...")
+        with tempfile.TemporaryDirectory() as out_dir, span("home.reports.generate"):
+            generate_reports(
+                context, briefs, formats, out_dir, workers=None if everything else 1, model_path=model_paths()[0],
+                # A single brief renders here; its SHAP drivers come from the inference pool
+                explainer=None if everything else PoolExplainer(),
+                progress=lambda done, total: progress.progress(done / total, text=f"Rendered {done} of {total} briefs"),
+            )
+            if everything:
+                buffer = io.BytesIO()
+                with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+                    for path in os.listdir(out_dir):
+                        archive.write(os.path.join(out_dir, path), path)
+                files = [("briefs.zip", buffer.getvalue(), "application/zip")]
+            else:
+                files = []
+                for fmt in formats:
+                    with open(os.path.join(out_dir, brief_filename(kind, name, fmt)), "rb") as f:
+                        files.append((brief_filename(kind, name, fmt), f.read(),
+                                      "text/html" if fmt == "html" else "application/pdf"))
+        progress.empty()
+        # Kept across the rerun a download click triggers
+        st.session_state["report_files"] = files
+    
+    for file_name, data, mime in st.session_state.get("report_files", []):
+        st.download_button(f"Download {file_name}", data, file_name=file_name, mime=mime, key=f"report_{file_name}")
+
 def display_metric(label, value, icon):
     """
     Display a metric in a visually appealing card
@@ -0,0 +1,335 @@
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import CancelledError, Future, InvalidStateError, ProcessPoolExecutor
+
+import joblib
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from model_store import model_paths
+from compiled_model import load_predictor
+
+# Pool processes per server process (default: one per CPU but one); cluster.py lowers it per worker
+POOL_WORKERS = int(os.environ.get("FP_INFERENCE_WORKERS", 0))
+
+# Lower numbers are dispatched first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_EXPLAIN = 5
+PRIORITY_BATCH = 10
+
+# Per-process state of the pool workers
+_MODEL = None
+_PREDICTOR = None
+_EXPLAINER = None
+
+
+def _init_worker(model_path):
+    global _MODEL, _PREDICTOR
+    _MODEL = joblib.load(model_path)
+    # SHAP needs the sklearn model; predictions may use the compiled ensemble
+    _PREDICTOR = load_predictor(_MODEL)
+
+
+def _predict(X):
+    return _PREDICTOR.predict(X)
+
+
+def _sweep(row, column, values):
+    # One matrix for the whole sweep instead of one predict call per value
+    X = pd.concat([row] * len(values), ignore_index=True)
+    X[column] = values
+    return _PREDICTOR.predict(X)
+
+
+def _explainer():
+    global _EXPLAINER
+    import shap
+    if _EXPLAINER is None:
+        _EXPLAINER = shap.Explainer(_MODEL)
+    return _EXPLAINER
+
+
+def _explain(X):
+    return _explainer()(X)
+
+
+def _warm(hold):
+    # Build the explainer now rather than on the first SHAP request; holding the
+    # worker briefly makes the pool start a new process for the next warm job
+    _explainer()
+    time.sleep(hold)
+    return os.getpid()
+
+
+JOBS = {
+    "predict": _predict,
+    "sweep": _sweep,
+    "explain": _explain,
+    "warm": _warm,
+}
+
+
+class _Job:
+    __slots__ = ("fn", "args", "future", "key", "inner")
+
+    def __init__(self, fn, args, future, key):
+        self.fn = fn
+        self.args = args
+        self.future = future
+        self.key = key
+        self.inner = None
+
+
+class InferenceService:
+    """
+    Runs prediction, sweep and SHAP jobs on a pool of worker processes
+
+    Jobs wait in a priority queue and are only handed to the pool when a
+    worker is free, so interactive requests overtake queued batch work.
+    Submitting a job with the same key as an earlier one cancels the
+    earlier job, which is how stale work is dropped when a user changes
+    their inputs.
+    """
+
+    def __init__(self, model_path, max_workers=None):
+        self.max_workers = max_workers or POOL_WORKERS or max(1, (os.cpu_count() or 2) - 1)
+        # spawn: forking a threaded Streamlit server is not safe
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model_path,),
+        )
+        self._queue = queue.PriorityQueue()
+        self._slots = threading.Semaphore(self.max_workers)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._by_key = {}
+        self._closed = False
+        self._dispatcher = threading.Thread(target=self._dispatch, name="inference-dispatch", daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, kind, *args, priority=PRIORITY_INTERACTIVE, key=None):
+        """
+        Queue a job and return a future for its result
+
+        Parameters:
+        kind (str): One of "predict", "sweep", "explain" or "warm"
+        args: Arguments for the job (feature frames, sweep column and values)
+        priority (int): Dispatch priority, lower runs first
+        key (hashable): Optional slot; a newer job with the same key cancels this one
+
+        Returns:
+        concurrent.futures.Future: Resolves to the job result
+        """
+        if kind not in JOBS:
+            raise ValueError(f"Unknown inference job: {kind}")
+        job = _Job(JOBS[kind], args, Future(), key)
+        previous = None
+        # Under the lock, so no job is queued after shutdown has drained the queue
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("cannot schedule new jobs after shutdown")
+            if key is not None:
+                previous = self._by_key.get(key)
+                self._by_key[key] = job
+            self._queue.put((priority, next(self._seq), job))
+        if previous is not None:
+            self._cancel_job(previous)
+        return job.future
+
+    def cancel(self, key, future=None):
+        """
+        Cancel the job currently registered under key
+
+        Parameters:
+        key (hashable): Slot the job was submitted with
+        future (concurrent.futures.Future): Only cancel if the registered job is this one
+        """
+        with self._lock:
+            job = self._by_key.get(key)
+            if job is None or (future is not None and job.future is not future):
+                return
+            del self._by_key[key]
+        self._cancel_job(job)
+
+    def warm_up(self, hold=0.5):
+        """
+        Start every worker and build its SHAP explainer
+
+        Parameters:
+        hold (float): Seconds each warm job keeps its worker busy, so the jobs spread over the workers
+
+        Returns:
+        list: Process ids of the workers that ran a warm job
+        """
+        futures = [self.submit("warm", hold, priority=PRIORITY_BATCH) for _ in range(self.max_workers)]
+        return sorted({future.result() for future in futures})
+
+    def shutdown(self):
+        """
+        Stop the pool without waiting for running jobs
+
+        Queued jobs are cancelled, so no caller is left waiting on a future
+        that will never resolve.
+        """
+        with self._lock:
+            self._closed = True
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._drain()
+        # Wakes the dispatcher so it exits
+        self._queue.put((-1, -1, None))
+
+    def _cancel_job(self, job):
+        if job.future.cancel():
+            # Wakes concurrent.futures.wait / as_completed, which ignore a bare cancel()
+            try:
+                job.future.set_running_or_notify_cancel()
+            except RuntimeError:
+                # Already notified: cancelled twice, or the dispatcher dequeued it meanwhile
+                pass
+            return
+        # Already running: the worker cannot be interrupted, but the caller stops waiting
+        if job.inner is not None:
+            job.inner.cancel()
+        try:
+            job.future.set_exception(CancelledError())
+        except InvalidStateError:
+            pass
+
+    def _dispatch(self):
+        while True:
+            self._slots.acquire()
+            _, _, job = self._queue.get()
+            if job is None:
+                self._drain()
+                return
+            try:
+                running = job.future.set_running_or_notify_cancel()
+            except RuntimeError:
+                # Cancelled while queued, and _cancel_job already notified the waiters
+                running = False
+            if not running:
+                self._slots.release()
+                continue
+            try:
+                job.inner = self._pool.submit(job.fn, *job.args)
+            except RuntimeError as exc:
+                # The pool was shut down after the job was dequeued, or a worker died (BrokenProcessPool)
+                self._slots.release()
+                self._fail(job, exc)
+                if self._closed:
+                    self._drain()
+                    return
+                continue
+            job.inner.add_done_callback(lambda inner, job=job: self._finish(job, inner))
+
+    def _drain(self):
+        # After shutdown nothing will run the queued jobs; fail them instead of leaving callers waiting
+        while True:
+            try:
+                _, _, job = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if job is not None:
+                self._cancel_job(job)
+
+    def _fail(self, job, exc):
+        with self._lock:
+            if job.key is not None and self._by_key.get(job.key) is job:
+                del self._by_key[job.key]
+        try:
+            job.future.set_exception(exc)
+        except InvalidStateError:
+            pass
+
+    def _finish(self, job, inner):
+        self._slots.release()
+        with self._lock:
+            if job.key is not None and self._by_key.get(job.key) is job:
+                del self._by_key[job.key]
+        try:
+            if inner.cancelled():
+                job.future.set_exception(CancelledError())
+            elif inner.exception() is not None:
+                job.future.set_exception(inner.exception())
+            else:
+                job.future.set_result(inner.result())
+        except InvalidStateError:
+            # Cancelled while it was running
+            pass
+
+
+@st.cache_resource
+def _service_slot():
+    """The running service, the model path it was started with, and a lock"""
+    return {"service": None, "model_path": None}, threading.Lock()
+
+
+def get_inference_service():
+    """
+    Shared inference pool for all sessions of this process
+
+    When a new model version is promoted, a pool for it is started and the
+    old pool is shut down; its queued jobs are cancelled.
+
+    Raises:
+    FileNotFoundError: If the model files are not available
+    """
+    model_path, _ = model_paths()
+    slot, lock = _service_slot()
+    with lock:
+        if slot["model_path"] != model_path:
+            previous = slot["service"]
+            slot["service"] = InferenceService(model_path)
+            slot["model_path"] = model_path
+            if previous is not None:
+                previous.shutdown()
+        return slot["service"]
+
+
+def session_key(slot):
+    """Key a job slot to the current browser session"""
+    ctx = get_script_run_ctx()
+    return (ctx.session_id if ctx else None, slot)
+
+
+def wait_for_result(future, service=None, key=None, message="Working..."):
+    """
+    Wait for a job while keeping the Streamlit script interruptible
+
+    The status line is refreshed while waiting; each refresh gives
+    Streamlit a chance to abort this run when the user changes an input,
+    in which case the pending job is cancelled.
+
+    Parameters:
+    future (concurrent.futures.Future): Future returned by InferenceService.submit
+    service (InferenceService): Service the job was submitted to
+    key (hashable): Key the job was submitted with
+    message (str): Status text shown while waiting
+
+    Returns:
+    object: The job result
+    """
+    status = st.empty()
+    start = time.perf_counter()
+    try:
+        while not future.done():
+            status.caption(f"⏳ {message} ({time.perf_counter() - start:.1f}s)")
+            try:
+                return future.result(timeout=0.1)
+            except TimeoutError:
+                continue
+        return future.result()
+    finally:
+        if not future.done():
+            if service is not None and key is not None:
+                service.cancel(key, future)
+            else:
+                future.cancel()
+        status.empty()
@@ -0,0 +1,198 @@
+"""
+Per-rerun timing and memory instrumentation
+
+Page entry points and their heavy steps are wrapped in named spans. Each
+span records wall time and the change in process resident memory. When a
+rerun finishes, its spans are emitted as one JSON record. Records go to
+the "fp.timings" logger, or to a JSON-lines file when FP_TIMINGS_LOG is
+set. With FP_METRICS_PORT set and prometheus_client installed, span
+durations are also exported as a Prometheus histogram. The last rerun can
+be shown in a sidebar overlay with FP_DEBUG_OVERLAY=1 or ?debug=timings.
+
+Streamlit runs each session's script on its own thread, so the spans of
+the current rerun are kept per thread.
+"""
+import contextlib
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+import streamlit as st
+
+from memo import memo_stats
+
+TIMINGS_LOG = os.environ.get("FP_TIMINGS_LOG")
+METRICS_PORT = os.environ.get("FP_METRICS_PORT")
+DEBUG_OVERLAY = os.environ.get("FP_DEBUG_OVERLAY", "0") == "1"
+
+logger = logging.getLogger("fp.timings")
+
+_local = threading.local()
+_write_lock = threading.Lock()
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+try:
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = 4096
+
+
+def rss_bytes():
+    """
+    Current resident memory of this process
+
+    Returns:
+    int: Resident set size in bytes (peak RSS where /proc is not available)
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        try:
+            import resource
+        except ImportError:
+            return 0
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _span_histogram():
+    """Prometheus histogram for span durations, or None when metrics are off"""
+    if not METRICS_PORT:
+        return None
+    with _metrics_lock:
+        if "histogram" not in _metrics:
+            try:
+                from prometheus_client import Histogram, start_http_server
+            except ImportError:
+                logger.warning("FP_METRICS_PORT is set but prometheus_client is not installed")
+                _metrics["histogram"] = None
+                return None
+            _metrics["histogram"] = Histogram(
+                "fp_span_seconds", "Time spent in instrumented steps", ["span"],
+                buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+            )
+            try:
+                start_http_server(int(METRICS_PORT))
+            except OSError as exc:
+                # Another worker on this host already serves the port
+                logger.warning("Metrics endpoint not started on port %s: %s", METRICS_PORT, exc)
+        return _metrics["histogram"]
+
+
+@contextlib.contextmanager
+def span(name):
+    """
+    Time a block and record it on the current rerun
+
+    Parameters:
+    name (str): Span name, e.g. "map.render"
+    """
+    spans = getattr(_local, "spans", None)
+    depth = getattr(_local, "depth", 0)
+    _local.depth = depth + 1
+    record = {"name": name, "depth": depth}
+    if spans is not None:
+        # Keep spans in start order so the overlay reads top to bottom
+        spans.append(record)
+    rss = rss_bytes()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record["seconds"] = time.perf_counter() - start
+        record["rss_delta_mb"] = (rss_bytes() - rss) / 2**20
+        _local.depth = depth
+        histogram = _span_histogram()
+        if histogram is not None:
+            histogram.labels(span=name).observe(record["seconds"])
+
+
+def instrumented(name):
+    """
+    Decorator form of span
+
+    Parameters:
+    name (str): Span name
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def begin_rerun():
+    """Start collecting spans for the current script run"""
+    _local.spans = []
+    _local.depth = 0
+    _local.start = time.perf_counter()
+    _local.rss = rss_bytes()
+
+
+def end_rerun(page, interrupted=False):
+    """
+    Emit the spans collected since begin_rerun
+
+    Parameters:
+    page (str): Page that was rendered
+    interrupted (bool): Whether the run was cut short (e.g. by a rerun request)
+
+    Returns:
+    dict: The emitted record, or None if begin_rerun was not called
+    """
+    spans = getattr(_local, "spans", None)
+    if spans is None:
+        return None
+    _local.spans = None
+    record = {
+        "timestamp": time.time(),
+        "page": page,
+        "pid": os.getpid(),
+        "interrupted": interrupted,
+        "seconds": time.perf_counter() - _local.start,
+        "rss_mb": rss_bytes() / 2**20,
+        "rss_delta_mb": (rss_bytes() - _local.rss) / 2**20,
+        # Spans left open by an interruption have no timing
+        "spans": [s for s in spans if "seconds" in s],
+    }
+    line = json.dumps(record)
+    if TIMINGS_LOG:
+        with _write_lock, open(TIMINGS_LOG, "a") as f:
+            f.write(line + "\n")
+    else:
+        logger.info(line)
+    try:
+        st.session_state["_last_rerun_timings"] = record
+    except Exception:
+        pass  # Not running inside a Streamlit session
+    return record
+
+
+def overlay_enabled():
+    """Whether the sidebar timing overlay was requested"""
+    return DEBUG_OVERLAY or st.query_params.get("debug") == "timings"
+
+
+def render_overlay():
+    """Show the last rerun's timings in the sidebar"""
+    record = st.session_state.get("_last_rerun_timings")
+    if not record or not overlay_enabled():
+        return
+    with st.sidebar.expander(f"⏱️ {record['page']}: {record['seconds'] * 1000:,.0f} ms", expanded=False):
+        lines = [
+            f"{'&nbsp;' * 4 * s['depth']}{s['name']}: **{s['seconds'] * 1000:,.1f} ms**, {s['rss_delta_mb']:+.1f} MB"
+            for s in record["spans"]
+        ]
+        st.markdown("  \n".join(lines) or "No spans recorded")
+        st.caption(f"RSS {record['rss_mb']:,.0f} MB ({record['rss_delta_mb']:+.1f} MB this run)")
+        caches = memo_stats()
+        if caches:
+            st.caption("Result caches: " + ", ".join(
+                f"{c['name']} {c['entries']} ({c['bytes'] / 2**20:,.1f} MB, {c['hits']}/{c['hits'] + c['misses']} hits)"
+                for c in caches))
@@ -1,27 +1,156 @@
 import streamlit as st
 import folium
 import json
+import os
 import branca.colormap as cm
 from streamlit_folium import st_folium
 import pandas as pd
+from utils import county_key, filter_data, geojson_county_key, period_range
+from widgets import time_range_slider
+from instrumentation import instrumented, span
+from memo import data_version, memo_cache
 
-def render_map(df):
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+KENYA_GEOJSON = os.path.join(BASE_DIR, "Data", "kenya.geojson")
+# Commodity and time range selections whose county totals are kept per process
+MAX_CACHED_SELECTIONS = 64
+
+@st.cache_data
+def load_kenya_geojson():
+    """
+    Load the Kenya counties GeoJSON
+    
+    Raises:
+    FileNotFoundError: If the file is missing (failures are not cached)
+    """
+    with open(KENYA_GEOJSON, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def aggregate_county_values(df):
+    """
+    Aggregate dispensed units by county for the choropleth
+    
+    Parameters:
+    df (pandas.DataFrame): Dataset containing county-level distribution data
+    
+    Returns:
+    pandas.DataFrame: county_name, value and the upper-case "county" key used by the GeoJSON
+    """
+    data = df.groupby("county_name", observed=True)["value"].sum().reset_index()
+    data["county"] = county_key(data["county_name"])
+    return data
+
+def map_commodities(df):
+    """Sorted commodity names offered as map filters, looked up once per data version"""
+    return memo_cache("map", max_entries=MAX_CACHED_SELECTIONS).get_or_compute(
+        ("commodities", data_version(df)), lambda: sorted(df["dataelement_name"].unique()))
+
+def county_values(df, index=None, commodities=None, start=None, end=None):
+    """
+    Total dispensed units per county for a commodity and time range selection, cached per process
+    
+    Parameters:
+    df (pandas.DataFrame): Dataset containing county-level distribution data
+    index (dict): Precomputed location index from utils.build_location_index
+    commodities (list): Commodities to include (None for all)
+    start (pandas.Timestamp): First period included (None for no lower bound)
+    end (pandas.Timestamp): Last period included (None for no upper bound)
+    
+    Returns:
+    dict: Value per upper-case county name (the "county" key from aggregate_county_values)
+    """
+    def compute():
+        if commodities is not None and not commodities:
+            return {}
+        data = aggregate_county_values(filter_data(df, commodities=commodities, index=index, start=start, end=end))
+        return dict(zip(data["county"], data["value"]))
+    key = ("counties", data_version(df), None if commodities is None else tuple(commodities), start, end)
+    return memo_cache("map", max_entries=MAX_CACHED_SELECTIONS).get_or_compute(key, compute)
+
+def county_choropleth(kenya_geo, value_dict, caption, colors=('#ffffb2', '#fecc5c', '#fd8d3c', '#f03b20', '#bd0026')):
+    """
+    Build a folium choropleth of Kenya's counties
+    
+    Parameters:
+    kenya_geo (dict): Kenya counties GeoJSON
+    value_dict (dict): Value per upper-case county name (the "county" key from aggregate_county_values)
+    caption (str): Legend caption
+    colors (tuple): Colour ramp from low to high
+    
+    Returns:
+    folium.Map: The map
+    """
+    min_value = min(value_dict.values()) if value_dict else 0
+    max_value = max(value_dict.values()) if value_dict else 100
+   
+    color_scale = cm.LinearColormap(list(colors), vmin=min_value, vmax=max_value)
+   
+    m = folium.Map(location=[0.0236, 37.9062], zoom_start=6, tiles="cartodbpositron")
+   
+    def style_function(feature):
+        value = value_dict.get(geojson_county_key(feature), 0)
+       
+        color = color_scale(value)
+       
+        return {
+            'fillColor': color,
+            'color': 'black',
+            'weight': 1,
+            'fillOpacity': 0.7
+        }
+   
+    def highlight_function(feature):
+        return {
+            'weight': 3,
+            'color': '#666',
+            'dashArray': '',
+            'fillOpacity': 0.9
+        }
+   
+    def tooltip_function(feature):
+        county_name = feature["properties"].get("COUNTY_NAM") or "Unknown"
+        value = value_dict.get(geojson_county_key(feature), 0)
+        return f"{county_name}: {value:,.0f}"
+   
+    with span("map.build"):
+        folium.GeoJson(
+            kenya_geo,
+            style_function=style_function,
+            highlight_function=highlight_function,
+            tooltip=folium.GeoJsonTooltip(
+                fields=["COUNTY_NAM"],
+                aliases=["County:"],
+                localize=True,
+                sticky=True,
+            )
+        ).add_to(m)
+   
+    color_scale.caption = caption
+    m.add_child(color_scale)
+   
+    return m
+
+@instrumented("map")
+def render_map(df, index=None):
     """
     Renders a choropleth map of Kenya counties with health commodity distribution data
     using Folium, with commodity type filters on the right side.
     
     Parameters:
     df (pandas.DataFrame): Dataset containing county-level distribution data
+    index (dict): Precomputed location index from utils.build_location_index
     """
     
     # Create a layout with map on the left and checkboxes on the right
     col1, col2 = st.columns([0.8, 0.2])
     
     # Get unique commodity types
-    unique_commodities = sorted(df["dataelement_name"].unique())
+    unique_commodities = map_commodities(df)
     
     # In the right column, create vertical checkboxes for commodity types
     with col2:
+        start, end = time_range_slider(period_range(df, index), key="map_time_range")
+        
         st.write("**Filter by Commodity:**")
         
         # Create a dictionary to hold checkbox states, defaulting to all True
@@ -42,99 +171,23 @@ def render_map(df):
         else:
             st.info(f"Showing {len(commodities_to_show)} of {len(unique_commodities)} commodities")
     
-    # Filter data based on selected commodities
-    filtered_df = df[df["dataelement_name"].isin(commodities_to_show)]
+    # Filter data based on the time range and selected commodities
+    all_commodities = len(commodities_to_show) == len(unique_commodities)
     
     # In the left column, render the map
     with col1:
         try:
-            with open("C:/Users/Admin/Documents/CT/school/PF/Data/kenya.geojson", "r", encoding="utf-8") as f:
-                kenya_geo = json.load(f)
+            kenya_geo = load_kenya_geojson()
            
             # Aggregate data by county based on filtered commodities
-            data = filtered_df.groupby("county_name")["value"].sum().reset_index()
-           
-            data["county"] = data["county_name"].str.replace(" County", "", case=False).str.upper()
-           
-            # Add county name mappings for inconsistencies between dataset and GeoJSON
-            county_mapping = {
-                "ELEGEYO-MARAKWET": "ELGEYO MARAKWET",
-                "MURANG'A": "MURANGA",
-                "THARAKA - NITHI": "THARAKA NITHI"
-            }
-           
-            value_dict = dict(zip(data["county"], data["value"]))
-           
-            min_value = data["value"].min() if not data.empty else 0
-            max_value = data["value"].max() if not data.empty else 100
-           
-            colors = ['#ffffb2', '#fecc5c', '#fd8d3c', '#f03b20', '#bd0026']
-            color_scale = cm.LinearColormap(colors, vmin=min_value, vmax=max_value)
-           
-            m = folium.Map(location=[0.0236, 37.9062], zoom_start=6, tiles="cartodbpositron")
-           
-            def style_function(feature):
-                county_name = feature["properties"].get("COUNTY_NAM", "")
-               
-                if county_name is None:
-                    county_name = ""
-                   
-                county_name = county_name.upper()
-                if county_name in county_mapping:
-                    county_name = county_mapping[county_name]
-               
-                value = value_dict.get(county_name, 0)
-               
-                color = color_scale(value)
-               
-                return {
-                    'fillColor': color,
-                    'color': 'black',
-                    'weight': 1,
-                    'fillOpacity': 0.7
-                }
-           
-            def highlight_function(feature):
-                return {
-                    'weight': 3,
-                    'color': '#666',
-                    'dashArray': '',
-                    'fillOpacity': 0.9
-                }
-           
-            def tooltip_function(feature):
-                county_name = feature["properties"].get("COUNTY_NAM", "Unknown")
-               
-                if county_name is None:
-                    county_name = "Unknown"
-                    county_name_upper = ""
-                else:
-                    county_name_upper = county_name.upper()
-               
-                if county_name_upper in county_mapping:
-                    county_name_upper = county_mapping[county_name_upper]
-               
-                value = value_dict.get(county_name_upper, 0)
-               
-                return f"{county_name}: {value:,.0f}"
-           
-            folium.GeoJson(
-                kenya_geo,
-                style_function=style_function,
-                highlight_function=highlight_function,
-                tooltip=folium.GeoJsonTooltip(
-                    fields=["COUNTY_NAM"],
-                    aliases=["County:"],
-                    localize=True,
-                    sticky=True,
-                )
-            ).add_to(m)
+            with span("map.aggregate"):
+                value_dict = county_values(df, index, None if all_commodities else commodities_to_show, start, end)
            
-            color_scale.caption = 'Total Units Dispensed'
-            m.add_child(color_scale)
+            m = county_choropleth(kenya_geo, value_dict, "Total Units Dispensed")
            
-            # Display the map using streamlit-folium
-            st_folium(m, width=700, height=600)
+            # Display the map using streamlit-folium (serialises the GeoJSON layer)
+            with span("map.render"):
+                st_folium(m, width=700, height=600)
             
         except FileNotFoundError:
             st.error("❌ Error: Kenya GeoJSON file not found. Please make sure 'kenya.geojson' is in the same directory as the application.")
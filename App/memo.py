@@ -0,0 +1,304 @@
+"""
+Process-wide memoisation of page results
+
+Streamlit reruns the whole page script on every widget change, including
+changes that do not affect most of the page. Pages keep the results of
+their expensive steps (filtered series, aggregates, predictions, figures)
+here, keyed by the selection that produced them and by the data and
+model versions, so an unchanged step is looked up instead of recomputed,
+in the same session or in any other session of the process.
+
+Each named cache is a least-recently-used store bounded by a number of
+entries and by an estimate of the bytes it holds. All caches together are
+also held under one memory budget (FP_MEMO_MB, default 512 MB); beyond
+it the least recently used entry of any cache is dropped first.
+
+Cached values are shared between sessions and must be treated as
+read-only: copy or assign() before modifying a cached DataFrame.
+"""
+import collections
+import hashlib
+import itertools
+import os
+import sys
+import threading
+import weakref
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+MEMO_MAX_BYTES = int(float(os.environ.get("FP_MEMO_MB", "512")) * 2**20)
+
+
+def estimate_bytes(value):
+    """
+    Approximate memory held by a cached value
+
+    Parameters:
+    value: DataFrame, Series, array, plotly figure, or a container of them
+
+    Returns:
+    int: Estimated size in bytes
+    """
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_bytes(k) + estimate_bytes(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(estimate_bytes(v) for v in value)
+    if hasattr(value, "to_plotly_json"):
+        # Plotly figure: about the size of its JSON, which is what gets sent to the browser
+        return len(value.to_json())
+    return sys.getsizeof(value)
+
+
+class MemoCache:
+    """
+    Thread-safe LRU store bounded by entries and bytes
+
+    Parameters:
+    name (str): Cache name, shown in memo_stats
+    max_entries (int): Entries kept (None for no limit)
+    max_bytes (int): Estimated bytes kept (None for no limit); larger values are not stored
+    """
+
+    def __init__(self, name, max_entries=None, max_bytes=None):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # key -> [value, bytes, last use tick]
+        self._entries = collections.OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        """Cached value for key, marking it as recently used"""
+        with self.lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            entry[2] = next(_ticks)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        """
+        Store a value, evicting the least recently used entries beyond the limits
+
+        Returns:
+        The value
+        """
+        size = estimate_bytes(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return value
+        with self.lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self._entries[key] = [value, size, next(_ticks)]
+            self.bytes += size
+            while self._entries and ((self.max_entries is not None and len(self._entries) > self.max_entries)
+                                     or (self.max_bytes is not None and self.bytes > self.max_bytes)):
+                self._evict_oldest()
+        _enforce_budget()
+        return value
+
+    def get_or_compute(self, key, compute):
+        """
+        Cached value for key, computing and storing it on a miss
+
+        Two sessions missing the same key at once may both compute it; the
+        results are equal, so the second simply replaces the first.
+
+        Parameters:
+        key (tuple): Hashable key, e.g. (data version, selection...)
+        compute (callable): Produces the value
+
+        Returns:
+        The cached or computed value
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = self.put(key, compute())
+        return value
+
+    def clear(self):
+        """Drop every entry"""
+        with self.lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def oldest_tick(self):
+        """Last use of the least recently used entry, or None when empty"""
+        with self.lock:
+            if not self._entries:
+                return None
+            return next(iter(self._entries.values()))[2]
+
+    def evict_oldest(self):
+        """Drop the least recently used entry"""
+        with self.lock:
+            if self._entries:
+                self._evict_oldest()
+
+    def _evict_oldest(self):
+        _, (_, size, _) = self._entries.popitem(last=False)
+        self.bytes -= size
+        self.evictions += 1
+
+    def stats(self):
+        """Entries, bytes, hits, misses and evictions"""
+        with self.lock:
+            return {"name": self.name, "entries": len(self._entries), "bytes": self.bytes, "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions}
+
+
+_ticks = itertools.count()
+
+
+@st.cache_resource
+def _registry():
+    """Process-wide named caches"""
+    return {}, threading.Lock()
+
+
+def memo_cache(name, max_entries=None, max_bytes=None):
+    """
+    The process-wide cache with this name, created on first use
+
+    Parameters:
+    name (str): Cache name, e.g. "visualizations"
+    max_entries (int): Entries kept
+    max_bytes (int): Estimated bytes kept
+
+    Returns:
+    MemoCache: The cache
+    """
+    caches, lock = _registry()
+    with lock:
+        cache = caches.get(name)
+        if cache is None:
+            cache = caches[name] = MemoCache(name, max_entries, max_bytes)
+        return cache
+
+
+def _enforce_budget():
+    """Drop the least recently used entries of any cache while the total is over MEMO_MAX_BYTES"""
+    caches, lock = _registry()
+    with lock:
+        while sum(cache.bytes for cache in caches.values()) > MEMO_MAX_BYTES:
+            ticks = [(cache.oldest_tick(), name) for name, cache in caches.items()]
+            ticks = [t for t in ticks if t[0] is not None]
+            if not ticks:
+                break
+            caches[min(ticks)[1]].evict_oldest()
+
+
+def memo_stats():
+    """
+    Usage of every cache
+
+    Returns:
+    list: MemoCache.stats() of each cache, largest first
+    """
+    caches, lock = _registry()
+    with lock:
+        stats = [cache.stats() for cache in caches.values()]
+    return sorted(stats, key=lambda s: s["bytes"], reverse=True)
+
+
+_versions = {}
+_versions_lock = threading.Lock()
+
+# DataFrame.attrs key of the version recorded when the data was loaded
+VERSION_ATTR = "fp_data_version"
+
+
+def content_hash(df):
+    """
+    Short SHA-256 of every value of a dataset, in row order
+
+    About a second per million rows; data_version avoids repeating it for
+    copies of loaded data.
+
+    Parameters:
+    df (pandas.DataFrame): The dataset
+
+    Returns:
+    str: First 12 hex digits of the hash
+    """
+    digest = hashlib.sha256(repr((len(df), tuple(df.columns))).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()[:12]
+
+
+def _summary(df):
+    """Shape, columns, period range and value total: cheap, but blind to changes that keep them"""
+    periods = df["period"] if "period" in df else pd.Series(dtype="datetime64[ns]")
+    return (len(df), tuple(df.columns), str(periods.min()), str(periods.max()),
+            float(df["value"].sum()) if "value" in df else 0.0)
+
+
+def stamp_data_version(df, version=None):
+    """
+    Record the content version of freshly loaded data on the frame (df.attrs)
+
+    attrs travel with the copies st.cache_data hands each session, so the
+    content is hashed once per load rather than once per copy.
+
+    Parameters:
+    df (pandas.DataFrame): The loaded dataset
+    version (str): Its content_hash, if already known (e.g. stored with the Arrow file)
+
+    Returns:
+    pandas.DataFrame: df
+    """
+    df.attrs[VERSION_ATTR] = (_summary(df), version or content_hash(df))
+    return df
+
+
+def data_version(df):
+    """
+    Version of a dataset, used to key results derived from it in memory and on disk
+
+    The content hash recorded by stamp_data_version when the data was
+    loaded, or otherwise content_hash(df). pandas copies attrs to filtered
+    and modified frames too, so the recorded hash is only used while the
+    frame still has the shape, columns, period range and value total it
+    was loaded with. The version is kept per DataFrame object.
+
+    Parameters:
+    df (pandas.DataFrame): The dataset
+
+    Returns:
+    str: The version
+    """
+    with _versions_lock:
+        entry = _versions.get(id(df))
+        if entry is not None and entry[0]() is df:
+            return entry[1]
+    stamped = df.attrs.get(VERSION_ATTR)
+    if stamped is not None and stamped[0] == _summary(df):
+        version = stamped[1]
+    else:
+        version = content_hash(df)
+    with _versions_lock:
+        # Drop entries of frames that no longer exist
+        for key in [k for k, (ref, _) in _versions.items() if ref() is None]:
+            del _versions[key]
+        _versions[id(df)] = (weakref.ref(df), version)
+    return version
@@ -0,0 +1,244 @@
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime
+import streamlit as st
+import joblib
+from artifacts import artifact, fetch_all, fetch_async
+from features import FeaturePipeline, supported_series
+from instrumentation import span
+
+# Trained model artifacts published with the thesis project (FP_MODEL_URL / FP_ENCODER_URL to override)
+MODEL_URL = os.environ.get(
+    "FP_MODEL_URL", "https://github.com/Nyasoko/Final-Thesis/blob/main/Models/best_gb_model.pkl?raw=true")
+ENCODER_URL = os.environ.get(
+    "FP_ENCODER_URL", "https://github.com/Nyasoko/Final-Thesis/blob/main/Models/encoder.pkl?raw=true")
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_DIR = os.environ.get("FP_MODEL_DIR", os.path.join(BASE_DIR, "Models"))
+MODEL_FILE = os.path.join(MODEL_DIR, "best_gb_model.pkl")
+ENCODER_FILE = os.path.join(MODEL_DIR, "encoder.pkl")
+# Retrained models (see training.py), one directory per version; CURRENT names the one the app serves
+VERSIONS_DIR = os.path.join(MODEL_DIR, "versions")
+CURRENT_FILE = os.path.join(MODEL_DIR, "CURRENT")
+
+# Optional expected SHA-256 of the published files, checked after every download
+MODEL_ARTIFACTS = [
+    artifact("model", MODEL_URL, MODEL_FILE, os.environ.get("FP_MODEL_SHA256")),
+    artifact("encoder", ENCODER_URL, ENCODER_FILE, os.environ.get("FP_ENCODER_SHA256")),
+]
+
+
+def current_version():
+    """
+    Registered model version the app serves
+
+    Returns:
+    str: Version name, or None to serve the published model
+    """
+    try:
+        with open(CURRENT_FILE, "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def version_files(version):
+    """Paths of a registered version's (model, encoder, metadata) files"""
+    folder = os.path.join(VERSIONS_DIR, version)
+    return (os.path.join(folder, "model.pkl"), os.path.join(folder, "encoder.pkl"),
+            os.path.join(folder, "metadata.json"))
+
+
+def ensure_model_files():
+    """
+    Make sure the model and encoder are on disk, downloading them if needed
+
+    The files are shared by every session, worker process and the
+    inference pool, so they are only fetched once per host. Both files
+    download concurrently (see artifacts.py). A promoted retrained
+    version takes precedence over the published model.
+
+    Returns:
+    tuple: (model_path, encoder_path), either of which is None if the download failed
+    """
+    version = current_version()
+    if version:
+        model_path, encoder_path, _ = version_files(version)
+        if os.path.exists(model_path) and os.path.exists(encoder_path):
+            return model_path, encoder_path
+    with span("model.download"):
+        results = fetch_all(MODEL_ARTIFACTS)
+    for name, result in results.items():
+        if result["path"] is None:
+            st.error(f"Failed to download the {name}: {result['error']}")
+    return results["model"]["path"], results["encoder"]["path"]
+
+
+def prefetch_model_files():
+    """Start downloading missing published model files in the background, e.g. while the data loads"""
+    if current_version() is None:
+        for item in MODEL_ARTIFACTS:
+            fetch_async(item)
+
+
+def register_model(model, encoder, metadata, promote=True):
+    """
+    Save a trained model as a new version
+
+    The version is written to a temporary directory and renamed into
+    place, and CURRENT is replaced atomically, so running apps never see
+    a half-written version.
+
+    Parameters:
+    model: The fitted model
+    encoder (OrdinalEncoder): The fitted encoder
+    metadata (dict): Training details saved next to the model (JSON-serialisable)
+    promote (bool): Make it the version the app serves
+
+    Returns:
+    str: The version name
+    """
+    # Microseconds keep names unique for registrations in the same second and still sort by time
+    version = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    os.makedirs(VERSIONS_DIR, exist_ok=True)
+    staging = os.path.join(VERSIONS_DIR, f".{version}.tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    joblib.dump(model, os.path.join(staging, "model.pkl"))
+    joblib.dump(encoder, os.path.join(staging, "encoder.pkl"))
+    with open(os.path.join(staging, "metadata.json"), "w", encoding="utf-8") as f:
+        json.dump(dict(metadata, version=version), f, indent=2, default=str)
+    os.rename(staging, os.path.join(VERSIONS_DIR, version))
+    if promote:
+        promote_version(version)
+    return version
+
+
+def promote_version(version):
+    """
+    Serve a registered version (or roll back to an earlier one)
+
+    Parameters:
+    version (str): Version name, or None to go back to the published model
+    """
+    if version is None:
+        if os.path.exists(CURRENT_FILE):
+            os.remove(CURRENT_FILE)
+        return
+    if not all(os.path.exists(path) for path in version_files(version)[:2]):
+        raise FileNotFoundError(f"Model version {version} is not registered")
+    staging = CURRENT_FILE + ".tmp"
+    with open(staging, "w", encoding="utf-8") as f:
+        f.write(version + "\n")
+    os.replace(staging, CURRENT_FILE)
+
+
+def list_versions():
+    """
+    Registered versions, newest first
+
+    Returns:
+    list: Metadata dict of each version
+    """
+    if not os.path.isdir(VERSIONS_DIR):
+        return []
+    versions = []
+    for name in sorted(os.listdir(VERSIONS_DIR), reverse=True):
+        metadata_path = version_files(name)[2]
+        if not name.startswith(".") and os.path.exists(metadata_path):
+            with open(metadata_path, "r", encoding="utf-8") as f:
+                versions.append(json.load(f))
+    return versions
+
+
+def model_paths():
+    """
+    Paths of the model the app serves
+
+    Raises:
+    FileNotFoundError: If the files could not be downloaded
+    """
+    model_path, encoder_path = ensure_model_files()
+    if not model_path or not encoder_path:
+        raise FileNotFoundError("Model files are not available")
+    return model_path, encoder_path
+
+
+# The cached loaders below are keyed by file path, so promoting a new
+# version is picked up on the next rerun without restarting the server.
+
+@st.cache_resource(show_spinner="Loading model...")
+def _load_artifacts(model_path, encoder_path):
+    return joblib.load(model_path), joblib.load(encoder_path)
+
+
+def load_model_artifacts():
+    """
+    Load the shared model and encoder handles
+
+    Returns:
+    tuple: (model, encoder)
+
+    Raises:
+    FileNotFoundError: If the files could not be downloaded (failures are not cached)
+    """
+    return _load_artifacts(*model_paths())
+
+
+@st.cache_resource
+def _feature_pipeline(model_path, encoder_path):
+    model, encoder = _load_artifacts(model_path, encoder_path)
+    return FeaturePipeline(encoder, getattr(model, "feature_names_in_", None))
+
+
+def load_feature_pipeline():
+    """Feature pipeline with the encoder lookups precomputed, built once per encoder"""
+    return _feature_pipeline(*model_paths())
+
+
+@st.cache_resource
+def _supported_series(_df, model_path, encoder_path):
+    return supported_series(_df, _feature_pipeline(model_path, encoder_path))
+
+
+def load_supported_series(df):
+    """
+    Every series in the data with its "supported" flag, built once per encoder
+
+    Selectors list only supported series, so a prediction never reaches
+    the encoder with a location it was not trained on.
+
+    Parameters:
+    df (pandas.DataFrame): The dataset (the same object on every rerun)
+
+    Returns:
+    pandas.DataFrame: Output of features.supported_series
+    """
+    return _supported_series(df, *model_paths())
+
+
+def model_version():
+    """
+    Short content hash of the model file, used to key cached model outputs
+
+    Returns:
+    str: First 12 hex digits of the model file's SHA-256
+
+    Raises:
+    FileNotFoundError: If the model file could not be downloaded
+    """
+    path = model_paths()[0]
+    # A re-downloaded or promoted file at the same path gets a new size or mtime, so it is hashed again
+    stat = os.stat(path)
+    return _file_digest(path, stat.st_mtime_ns, stat.st_size)
+
+
+@st.cache_resource
+def _file_digest(path, mtime_ns, size):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
@@ -0,0 +1,258 @@
+"""
+Dense series x month panel of the dataset
+
+Most analytics work per facility x commodity series, but the dataset is
+a long table that repeats five location names on every row. The panel
+holds the same numbers as:
+
+- values: float32 matrix with one row per series and one column per month
+  from the first to the last period, NaN where a series did not report
+  (duplicate records of a month are summed, like the app's groupbys)
+- codes: int32 matrix with one row per series, indexing the sorted names
+  of each SERIES_COLUMNS column
+- periods: the month of each column
+
+Windowed features across every series are then single NumPy operations
+on the matrix (lag, rolling_mean, latest_lags).
+
+save() writes the arrays as .npy files in a directory and load() maps them
+read-only, so every process on the host shares one copy through the OS
+page cache, like the shared Arrow file in data_store.
+"""
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from utils import SERIES_COLUMNS
+
+VALUES_FILE = "values.npy"
+CODES_FILE = "codes.npy"
+META_FILE = "meta.json"
+
+
+class SeriesPanel:
+    """
+    Dense series x month matrix of the dataset
+
+    Use SeriesPanel.from_frame to build one and SeriesPanel.load to map a saved one.
+
+    Parameters:
+    values (numpy.ndarray): float32 (series x months), NaN where a series did not report
+    codes (numpy.ndarray): int32 (series x len(SERIES_COLUMNS)) codes into categories
+    categories (dict): Column -> sorted list of names
+    start (pandas.Timestamp): Month of the first column
+    version (str): Fingerprint of the data the panel was built from (memo.data_version)
+    """
+
+    def __init__(self, values, codes, categories, start, version=None):
+        self.values = values
+        self.codes = codes
+        self.categories = categories
+        self.periods = pd.date_range(start, periods=values.shape[1], freq="MS")
+        self.version = version
+        self._series = None
+
+    @classmethod
+    def from_frame(cls, df, version=None):
+        """
+        Build the panel from the long-format dataset
+
+        Parameters:
+        df (pandas.DataFrame): The dataset
+        version (str): Fingerprint of the data, stored with the panel
+
+        Returns:
+        SeriesPanel: The panel, with series sorted by their location columns
+        """
+        data = df[SERIES_COLUMNS + ["period", "value"]].dropna(subset=["period"])
+        # A missing location name is a series of its own, as in utils.build_series_lag_index
+        grouped = data.groupby(SERIES_COLUMNS, sort=True, observed=True, dropna=False)
+        rows = grouped.ngroup().to_numpy()
+        series = grouped.size().index.to_frame(index=False)
+
+        codes = np.empty((len(series), len(SERIES_COLUMNS)), dtype=np.int32)
+        categories = {}
+        for i, column in enumerate(SERIES_COLUMNS):
+            # Missing names get code -1, which pandas.Categorical.from_codes reads back as NaN
+            column_codes, names = pd.factorize(series[column].astype(object), sort=True)
+            codes[:, i] = column_codes
+            categories[column] = [str(name) for name in names]
+
+        month_number = data["period"].dt.year.to_numpy() * 12 + data["period"].dt.month.to_numpy() - 1
+        columns = month_number - int(month_number.min())
+        n_months = int(columns.max()) + 1
+
+        values = np.full((len(series), n_months), np.nan, dtype=np.float32)
+        flat = rows * n_months + columns
+        totals = np.bincount(flat, weights=data["value"].to_numpy(dtype=np.float64), minlength=values.size)
+        reported = np.bincount(flat, minlength=values.size) > 0
+        values.ravel()[reported] = totals[reported]
+        return cls(values, codes, categories, data["period"].min().to_period("M").to_timestamp(), version)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Open a panel written by save
+
+        Parameters:
+        path (str): Directory of the panel
+        mmap (bool): Map the arrays read-only instead of reading them into memory
+
+        Returns:
+        SeriesPanel: The panel
+        """
+        with open(os.path.join(path, META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        mode = "r" if mmap else None
+        values = np.load(os.path.join(path, VALUES_FILE), mmap_mode=mode)
+        codes = np.load(os.path.join(path, CODES_FILE), mmap_mode=mode)
+        return cls(values, codes, meta["categories"], pd.Timestamp(meta["start"]), meta.get("version"))
+
+    def save(self, path):
+        """
+        Write the panel to a directory
+
+        The files are written to a temporary directory that is renamed into
+        place, so concurrent processes never see a partial panel. If another
+        process saved the same panel first, its copy is kept.
+
+        Parameters:
+        path (str): Destination directory
+
+        Returns:
+        str: The destination directory
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        os.makedirs(tmp_path, exist_ok=True)
+        np.save(os.path.join(tmp_path, VALUES_FILE), np.ascontiguousarray(self.values))
+        np.save(os.path.join(tmp_path, CODES_FILE), np.ascontiguousarray(self.codes))
+        with open(os.path.join(tmp_path, META_FILE), "w", encoding="utf-8") as f:
+            json.dump({"columns": SERIES_COLUMNS, "categories": self.categories,
+                       "start": self.periods[0].isoformat(), "version": self.version}, f)
+        try:
+            os.replace(tmp_path, path)
+        except OSError:
+            if not os.path.exists(os.path.join(path, META_FILE)):
+                raise
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        return path
+
+    def __len__(self):
+        return self.values.shape[0]
+
+    @property
+    def series(self):
+        """Location columns of every series (categoricals), one row per panel row"""
+        if self._series is None:
+            self._series = pd.DataFrame({
+                column: pd.Categorical.from_codes(self.codes[:, i], self.categories[column])
+                for i, column in enumerate(SERIES_COLUMNS)
+            })
+        return self._series
+
+    @property
+    def nbytes(self):
+        """Bytes held by the arrays and the names"""
+        names = sum(len(name) for names in self.categories.values() for name in names)
+        return self.values.nbytes + self.codes.nbytes + names
+
+    def lag(self, k):
+        """See lag"""
+        return lag(self.values, k)
+
+    def rolling_mean(self, window, min_periods=1):
+        """See rolling_mean"""
+        return rolling_mean(self.values, window, min_periods)
+
+    def latest_lags(self):
+        """See latest_lags"""
+        return latest_lags(self.values, self.periods)
+
+
+def lag(values, k):
+    """
+    Value k months earlier, for every series and month
+
+    Parameters:
+    values (numpy.ndarray): series x months matrix
+    k (int): Months to shift by (0 or more)
+
+    Returns:
+    numpy.ndarray: Same shape as values, NaN for the first k months
+    """
+    shifted = np.full(values.shape, np.nan, dtype=values.dtype)
+    shifted[:, k:] = values[:, :values.shape[1] - k]
+    return shifted
+
+
+def rolling_mean(values, window, min_periods=1):
+    """
+    Mean of the reported values in the trailing window ending at each month
+
+    Computed from running sums, so the cost does not grow with the window.
+
+    Parameters:
+    values (numpy.ndarray): series x months matrix, NaN where not reported
+    window (int): Months in the window, including the month itself
+    min_periods (int): Reported months needed for a mean
+
+    Returns:
+    numpy.ndarray: float32 matrix of the same shape, NaN where the window has too few reports
+    """
+    reported = ~np.isnan(values)
+    # float64 running sums keep long histories exact; pad one zero column for the differences
+    sums = np.zeros((values.shape[0], values.shape[1] + 1))
+    np.cumsum(np.where(reported, values, 0.0), axis=1, out=sums[:, 1:])
+    counts = np.zeros(sums.shape, dtype=np.int32)
+    np.cumsum(reported, axis=1, out=counts[:, 1:])
+    start = np.maximum(np.arange(values.shape[1]) + 1 - window, 0)
+    window_sums = sums[:, 1:] - sums[:, start]
+    window_counts = counts[:, 1:] - counts[:, start]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = window_sums / window_counts
+    return np.where(window_counts >= max(min_periods, 1), means, np.nan).astype(np.float32)
+
+
+def latest_lags(values, periods):
+    """
+    Latest lag features of every series
+
+    Uses the rules of utils.calculate_lag_features over the reported months:
+    the last value, the third-last value and the mean of the last three,
+    with zeros when a series has fewer than three reports.
+
+    Parameters:
+    values (numpy.ndarray): series x months matrix, NaN where not reported
+    periods (pandas.DatetimeIndex): Month of each column
+
+    Returns:
+    pandas.DataFrame: lag_1, lag_3, rolling_mean_3 and last_period, one row per series
+    """
+    n = values.shape[0]
+    reported = ~np.isnan(values)
+    # Reports from each month to the end; the k-th last report is where this first equals k
+    from_end = np.cumsum(reported[:, ::-1], axis=1, dtype=np.int32)[:, ::-1]
+    rows = np.arange(n)
+
+    def kth_last(k):
+        mask = reported & (from_end == k)
+        found = mask.any(axis=1)
+        return found, mask.argmax(axis=1)
+
+    has_one, last = kth_last(1)
+    has_three, third = kth_last(3)
+    lag_1 = np.where(has_one, values[rows, last], 0.0)
+    lag_3 = np.where(has_three, values[rows, third], 0.0)
+    # The last three reports are the reported months from the third-last onwards
+    recent = reported & (from_end <= 3)
+    rolling_mean_3 = np.where(has_three, np.where(recent, values, 0.0).sum(axis=1, dtype=np.float64) / 3, 0.0)
+    return pd.DataFrame({
+        "lag_1": lag_1.astype(np.float64),
+        "lag_3": lag_3.astype(np.float64),
+        "rolling_mean_3": rolling_mean_3,
+        "last_period": np.where(has_one, periods.to_numpy()[last], np.datetime64("NaT")),
+    })
@@ -1,29 +1,33 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import joblib
-import requests
+from utils import filter_data, period_range, series_options
+from widgets import time_range_slider
+from data_store import load_series_lags
+from model_store import load_model_artifacts, load_feature_pipeline, load_supported_series, model_version
+from inference import PRIORITY_BATCH, get_inference_service, wait_for_result
+from batching import get_prediction_batcher
+from instrumentation import instrumented, span
+from reconciliation import reconciled_forecasts
+from memo import data_version, memo_cache
 
+# Reconciled months kept per process
+MAX_RECONCILED = 8
+# Selections whose history, predictions and charts are kept per process
+MAX_CACHED_SELECTIONS = 256
 
-def download_file(url, filename):
-    """
-    Download a file from the given URL and save it locally.
-    """
-    response = requests.get(url)
-    if response.status_code == 200:
-        with open(filename, 'wb') as f:
-            f.write(response.content)
-        return filename
-    else:
-        st.error(f"Failed to download {filename} from {url}. HTTP Status code: {response.status_code}")
-        return None
+def _reconciled_store():
+    """Process-wide store of reconciled hierarchies keyed by (data version, model version, year, month, method)"""
+    return memo_cache("predictions.reconciled", max_entries=MAX_RECONCILED)
 
-def show_predictions_page(df):
+@instrumented("page.predictions")
+def show_predictions_page(df, index=None):
     """
     Display the predictions page with model-based forecasting.
    
     Parameters:
     df (pandas.DataFrame): The dataset to use for predictions
+    index (dict): Precomputed location index from utils.build_location_index
     """
     # Apply custom header with gradient background
     st.markdown("""
@@ -43,57 +47,42 @@ def show_predictions_page(df):
     col1, content_col, col2 = st.columns([0.05, 0.9, 0.05])
    
     with content_col:
-        # URL of the model on GitHub
-        model_url = "https://github.com/Nyasoko/Final-Thesis/blob/main/Models/best_gb_model.pkl?raw=true"
-        encoder_url = "https://github.com/Nyasoko/Final-Thesis/blob/main/Models/encoder.pkl?raw=true"
-       
-        # Download the model and encoder files
-        model_path = download_file(model_url, "best_gb_model.pkl")
-        encoder_path = download_file(encoder_url, "encoder.pkl")
-       
-        if not model_path or not encoder_path:
+        # Shared model and encoder handles (downloaded once per host)
+        try:
+            with span("model.load"):
+                model, encoder = load_model_artifacts()
+                pipeline = load_feature_pipeline()
+                series = load_supported_series(df)
+        except FileNotFoundError:
             return  # If downloading fails, exit early
        
-        # Load the model using joblib
-        model = joblib.load(model_path)
-        encoder = joblib.load(encoder_path)
-       
-        # Get valid categorical values from the encoder
-        valid_counties = encoder.categories_[0]
+        # Only locations the model was trained on can be predicted
+        series = series[series["supported"]]
+        if series.empty:
+            st.error("The model does not support any location in the current data. Please retrain it.")
+            return
        
         # Row 1: Location dropdowns
         loc_col1, loc_col2, loc_col3 = st.columns(3)
         with loc_col1:
-            county = st.selectbox("County", options=valid_counties)
-           
-        # Filter subcounties based on selected county
-        county_df = df[df["county_name"] == county]
-        valid_subcounties = sorted(county_df["sub_county_name"].unique())
+            county = st.selectbox("County", options=series_options(series, "county_name"))
        
         with loc_col2:
-            sub_county = st.selectbox("Sub-County", options=valid_subcounties)
-       
-        # Filter wards based on selected subcounty
-        subcounty_df = county_df[county_df["sub_county_name"] == sub_county]
-        valid_wards = sorted(subcounty_df["ward_name"].unique())
+            sub_county = st.selectbox("Sub-County", options=series_options(series, "sub_county_name", county_name=county))
        
         with loc_col3:
-            ward = st.selectbox("Ward", options=valid_wards)
-       
-        # Filter facilities based on selected ward
-        ward_df = subcounty_df[subcounty_df["ward_name"] == ward]
-        valid_facilities = sorted(ward_df["facility_name"].unique())
+            ward = st.selectbox("Ward", options=series_options(series, "ward_name", county_name=county,
+                                                               sub_county_name=sub_county))
        
         fac_col1, fac_col2 = st.columns(2)
         with fac_col1:
-            facility = st.selectbox("Facility", options=valid_facilities)
-       
-        # Get valid commodities for the selected facility
-        facility_df = ward_df[ward_df["facility_name"] == facility]
-        valid_commodities = sorted(facility_df["dataelement_name"].unique())
+            facility = st.selectbox("Facility", options=series_options(series, "facility_name", county_name=county,
+                                                                       sub_county_name=sub_county, ward_name=ward))
        
         with fac_col2:
-            commodity = st.selectbox("Commodity", options=valid_commodities)
+            commodity = st.selectbox("Commodity", options=series_options(series, "dataelement_name", county_name=county,
+                                                                         sub_county_name=sub_county, ward_name=ward,
+                                                                         facility_name=facility))
        
         # Row 2: Temporal features
         st.markdown("""
@@ -115,34 +104,13 @@ def show_predictions_page(df):
             </div>
             """, unsafe_allow_html=True)
        
-        # Calculate time series features dynamically if historical data exists
-        facility_commodity_df = df[
-            (df["county_name"] == county) &
-            (df["sub_county_name"] == sub_county) &
-            (df["ward_name"] == ward) &
-            (df["facility_name"] == facility) &
-            (df["dataelement_name"] == commodity)
-        ].sort_values("period")
-       
-        # Initialize lag values
-        lag_1_value = 0
-        lag_3_value = 0
-        rolling_mean_3_value = 0
-       
-        # Calculate lag features if we have historical data
-        if not facility_commodity_df.empty:
-            # Get the most recent values for dynamic calculation
-            recent_values = facility_commodity_df["value"].tail(12).tolist()
-           
-            # Calculate lag features from historical data if available
-            if len(recent_values) >= 1:
-                lag_1_value = recent_values[-1]
-           
-            if len(recent_values) >= 3:
-                lag_3_value = recent_values[-3]
-           
-            if len(recent_values) >= 3:
-                rolling_mean_3_value = sum(recent_values[-3:]) / 3
+        # History and lag features of a series are computed once per process
+        cache = memo_cache("predictions", max_entries=MAX_CACHED_SELECTIONS)
+        version = data_version(df)
+        selection = (version, county, sub_county, ward, facility, commodity)
+        history = cache.get_or_compute(("history",) + selection, lambda: series_history(df, index, *selection[1:]))
+        facility_commodity_df = history["data"]
+        lag_1_value, lag_3_value, rolling_mean_3_value = history["lags"]
        
         st.markdown("""
         <div style="background-color: #f1f8e9; padding: 2px; border-radius: 8px; margin: 10px 0; border-left: 4px solid #4CAF50;">
@@ -174,8 +142,8 @@ def show_predictions_page(df):
             </div>
             """, unsafe_allow_html=True)
        
-        # Create input data for prediction
-        input_data = pd.DataFrame([{
+        # Create input data for prediction (shared with the HTTP API)
+        input_data = pipeline.frame({
             "county_name": county,
             "sub_county_name": sub_county,
             "ward_name": ward,
@@ -187,20 +155,28 @@ def show_predictions_page(df):
             "lag_1": lag_1,
             "lag_3": lag_3,
             "rolling_mean_3": rolling_mean_3
-        }])
-       
-        # Transform categorical features
-        cat_cols = ['county_name', 'sub_county_name', 'ward_name', 'facility_name', 'dataelement_name']
-        input_data[cat_cols] = encoder.transform(input_data[cat_cols])
-        features = ['month', 'year', 'quarter', 'lag_1', 'lag_3', 'rolling_mean_3'] + cat_cols
+        })
        
         st.markdown("</div>", unsafe_allow_html=True)  # Close the card container
        
+        # Months of history shown next to the prediction
+        periods = period_range(df, index)
+        history_start, history_end = time_range_slider(
+            periods, key="predictions_history_range", label="History shown in the chart",
+            default=(periods[max(0, len(periods) - 12)], periods[-1]) if len(periods) else None,
+        )
+       
         # Show prediction on button click
         predict_button = st.button("Predict", use_container_width=True)
        
         if predict_button:
-            prediction = model.predict(input_data[features])[0]
+            # Concurrent Predict clicks are coalesced into one model call on the inference pool;
+            # a repeated input is answered from the cache
+            with span("predictions.predict"):
+                prediction = cache.get_or_compute(
+                    ("prediction", model_version(), tuple(input_data.iloc[0])),
+                    lambda: wait_for_result(get_prediction_batcher().submit(input_data), message="Predicting")[0],
+                )
            
             st.markdown(f"""
             <div style="background-color: #e8f5e9; padding: 2px; border-radius: 10px; box-shadow: 0 4px 12px rgba(0,0,0,0.1); margin: 5px 0; text-align: center; border-left: 4px solid #4CAF50;">
@@ -218,58 +194,186 @@ def show_predictions_page(df):
                 """, unsafe_allow_html=True)
                
                 # Create a combined visualization
-                recent_df = facility_commodity_df.tail(12).copy()
-               
-                # Create a prediction point
-                prediction_date = pd.to_datetime(f"{year}-{month:02d}-01")
-                prediction_df = pd.DataFrame({
-                    "period": [prediction_date],
-                    "value": [prediction],
-                    "type": ["Prediction"]
-                })
-               
-                # Add type column to historical data
-                recent_df["type"] = "Historical"
-               
-                # Combine data for visualization
-                plot_df = pd.concat([
-                    recent_df[["period", "value", "type"]],
-                    prediction_df
-                ])
-               
-                # Create plot
-                fig = px.line(
-                    plot_df, x="period", y="value", color="type",
-                    markers=True,
-                    title=f"Historical Data and Prediction for {commodity}",
-                    labels={"value": "Dispensed Units", "period": "Period"}
-                )
-               
-                # Customize the plot
-                fig.update_layout(
-                    xaxis_title="Time Period",
-                    yaxis_title="Dispensed Units",
-                    legend_title="Data Type",
-                    plot_bgcolor="rgba(255,255,255,0.9)",
-                    paper_bgcolor="rgba(255,255,255,0)",
-                    font=dict(color="#2c3e50"),
-                    title_font=dict(size=20, color="#2c3e50"),
-                    xaxis=dict(showgrid=True, gridcolor="#eee"),
-                    yaxis=dict(showgrid=True, gridcolor="#eee")
-                )
-               
-                # Color customization
-                fig.update_traces(
-                    line=dict(width=3),
-                    selector=dict(name="Historical")
-                )
-                fig.update_traces(
-                    line=dict(width=4, dash='dot'),
-                    marker=dict(size=12, symbol='diamond'),
-                    selector=dict(name="Prediction")
+                fig = cache.get_or_compute(
+                    ("chart",) + selection + (history_start, history_end, int(year), int(month), prediction),
+                    lambda: prediction_figure(df, index, *selection[1:], history_start, history_end,
+                                              year, month, prediction),
                 )
                
                 # Make plotly chart use the full width
-                st.plotly_chart(fig, use_container_width=True)
+                with span("predictions.plot"):
+                    st.plotly_chart(fig, use_container_width=True)
                
-                st.markdown("</div>", unsafe_allow_html=True)  # Close the card container
\ No newline at end of file
+                st.markdown("</div>", unsafe_allow_html=True)  # Close the card container
+        
+        # Coherent totals for the selected commodity across the location hierarchy
+        show_reconciled_forecast(df, pipeline, county, sub_county, ward, facility, commodity, year, month)
+
+def series_history(df, index, county, sub_county, ward, facility, commodity):
+    """
+    History of one series and the lag features of its latest records
+    
+    Returns:
+    dict: "data" (the series' rows sorted by period) and "lags" (lag_1, lag_3, rolling_mean_3;
+          zeros where the history is too short)
+    """
+    facility_commodity_df = filter_data(
+        df, county=county, sub_county=sub_county, ward=ward,
+        facility=facility, commodities=[commodity], index=index
+    ).sort_values("period")
+    
+    # Initialize lag values
+    lag_1_value = 0
+    lag_3_value = 0
+    rolling_mean_3_value = 0
+    
+    # Calculate lag features if we have historical data
+    if not facility_commodity_df.empty:
+        # Get the most recent values for dynamic calculation
+        recent_values = facility_commodity_df["value"].tail(12).tolist()
+        
+        # Calculate lag features from historical data if available
+        if len(recent_values) >= 1:
+            lag_1_value = recent_values[-1]
+        
+        if len(recent_values) >= 3:
+            lag_3_value = recent_values[-3]
+        
+        if len(recent_values) >= 3:
+            rolling_mean_3_value = sum(recent_values[-3:]) / 3
+    
+    return {"data": facility_commodity_df, "lags": (lag_1_value, lag_3_value, rolling_mean_3_value)}
+
+def prediction_figure(df, index, county, sub_county, ward, facility, commodity, start, end, year, month, prediction):
+    """Line chart of a series' history in the time range, followed by the predicted month"""
+    recent_df = filter_data(
+        df, county=county, sub_county=sub_county, ward=ward, facility=facility,
+        commodities=[commodity], index=index, start=start, end=end
+    ).sort_values("period")
+    
+    # Create a prediction point
+    prediction_date = pd.to_datetime(f"{year}-{month:02d}-01")
+    prediction_df = pd.DataFrame({
+        "period": [prediction_date],
+        "value": [prediction],
+        "type": ["Prediction"]
+    })
+    
+    # Add type column to historical data
+    recent_df["type"] = "Historical"
+    
+    # Combine data for visualization
+    plot_df = pd.concat([
+        recent_df[["period", "value", "type"]],
+        prediction_df
+    ])
+    
+    # Create plot
+    fig = px.line(
+        plot_df, x="period", y="value", color="type",
+        markers=True,
+        title=f"Historical Data and Prediction for {commodity}",
+        labels={"value": "Dispensed Units", "period": "Period"}
+    )
+    
+    # Customize the plot
+    fig.update_layout(
+        xaxis_title="Time Period",
+        yaxis_title="Dispensed Units",
+        legend_title="Data Type",
+        plot_bgcolor="rgba(255,255,255,0.9)",
+        paper_bgcolor="rgba(255,255,255,0)",
+        font=dict(color="#2c3e50"),
+        title_font=dict(size=20, color="#2c3e50"),
+        xaxis=dict(showgrid=True, gridcolor="#eee"),
+        yaxis=dict(showgrid=True, gridcolor="#eee")
+    )
+    
+    # Color customization
+    fig.update_traces(
+        line=dict(width=3),
+        selector=dict(name="Historical")
+    )
+    fig.update_traces(
+        line=dict(width=4, dash='dot'),
+        marker=dict(size=12, symbol='diamond'),
+        selector=dict(name="Prediction")
+    )
+    return fig
+
+def show_reconciled_forecast(df, pipeline, county, sub_county, ward, facility, commodity, year, month):
+    """
+    Display facility, ward, sub-county, county and national forecasts that add up
+    
+    Parameters:
+    df (pandas.DataFrame): The dataset
+    pipeline (FeaturePipeline): Feature pipeline for the model
+    county, sub_county, ward, facility, commodity (str): Selected series
+    year, month (int): Forecast period
+    """
+    with st.expander("🧮 Reconciled forecast across the hierarchy"):
+        st.markdown("Forecasts every series for the selected month from its history, then makes facility, ward, "
+                    "sub-county, county and national totals add up. Lag values entered above are not used here.")
+        method = st.radio("Method", options=["mint", "bottom_up"], horizontal=True,
+                          format_func=lambda m: {"mint": "MinT (combine all levels)", "bottom_up": "Bottom-up"}[m])
+        key = (data_version(df), model_version(), int(year), int(month), method)
+        store = _reconciled_store()
+        result = store.get(key)
+        
+        if result is None:
+            if not st.button("Reconcile hierarchy", use_container_width=True):
+                return
+            service = get_inference_service()
+            with span("predictions.reconcile"):
+                result = reconciled_forecasts(
+                    df, load_series_lags(df), pipeline,
+                    lambda X: wait_for_result(service.submit("predict", X, priority=PRIORITY_BATCH),
+                                              message="Forecasting every series"),
+                    year, month, method,
+                )
+            store.put(key, result)
+        
+        # The selected series and each of its ancestors
+        nodes = result[result["dataelement_name"] == commodity]
+        path = [
+            ("National", nodes["level"] == "national"),
+            (f"County: {county}", (nodes["level"] == "county") & (nodes["county_name"] == county)),
+            (f"Sub-County: {sub_county}", (nodes["level"] == "sub_county") & (nodes["county_name"] == county)
+             & (nodes["sub_county_name"] == sub_county)),
+            (f"Ward: {ward}", (nodes["level"] == "ward") & (nodes["county_name"] == county)
+             & (nodes["sub_county_name"] == sub_county) & (nodes["ward_name"] == ward)),
+            (f"Facility: {facility}", (nodes["level"] == "facility") & (nodes["facility_name"] == facility)
+             & (nodes["ward_name"] == ward)),
+        ]
+        rows = [(label, nodes.loc[mask, "base"].sum(), nodes.loc[mask, "reconciled"].sum())
+                for label, mask in path if mask.any()]
+        st.dataframe(
+            pd.DataFrame(rows, columns=["Level", "Base forecast", "Reconciled forecast"]),
+            column_config={
+                "Base forecast": st.column_config.NumberColumn(format="%.0f"),
+                "Reconciled forecast": st.column_config.NumberColumn(format="%.0f"),
+            },
+            use_container_width=True, hide_index=True,
+        )
+        
+        counties = nodes[nodes["level"] == "county"].sort_values("reconciled", ascending=False)
+        st.download_button(
+            "Download all reconciled forecasts (CSV)",
+            result.to_csv(index=False).encode("utf-8"),
+            file_name=f"reconciled_{year}_{month:02d}_{method}.csv",
+            mime="text/csv",
+        )
+        fig = px.bar(
+            counties, x="county_name", y="reconciled",
+            labels={"county_name": "County", "reconciled": "Reconciled forecast"},
+            title=f"County Totals for {commodity} ({year}-{month:02d})",
+        )
+        fig.update_layout(
+            plot_bgcolor="rgba(255,255,255,0.9)",
+            paper_bgcolor="rgba(255,255,255,0)",
+            font=dict(color="#2c3e50"),
+            xaxis=dict(showgrid=False, tickangle=-45),
+            yaxis=dict(showgrid=True, gridcolor="#eee"),
+        )
+        fig.update_traces(marker_color="#4CAF50")
+        st.plotly_chart(fig, use_container_width=True)
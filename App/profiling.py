@@ -0,0 +1,221 @@
+"""
+Opt-in profiling of Streamlit reruns
+
+With FP_PROFILE=on every routed page call is profiled. With
+FP_PROFILE=query, only reruns whose URL has ?profile=1 are profiled. One
+set of files is written per rerun to FP_PROFILE_DIR:
+
+- FP_PROFILER=cprofile (default): <run>.prof (pstats; open with snakeviz
+  or pstats) and <run>.txt (top functions by cumulative time)
+- FP_PROFILER=sampling: <run>.speedscope.json, a sampled call-stack
+  profile that opens directly in https://www.speedscope.app
+- <run>.alloc.txt: top allocation sites during the rerun (tracemalloc),
+  unless FP_PROFILE_MEMORY=0
+
+tracemalloc is process-wide, so with concurrent sessions the allocation
+report also includes their allocations.
+"""
+import contextlib
+import cProfile
+import io
+import itertools
+import json
+import logging
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+
+import streamlit as st
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# "off" (default), "on" or "query" (only reruns with ?profile=1)
+PROFILE_MODE = os.environ.get("FP_PROFILE", "off")
+PROFILER = os.environ.get("FP_PROFILER", "cprofile")
+PROFILE_DIR = os.environ.get("FP_PROFILE_DIR", os.path.join(BASE_DIR, "Data", "profiles"))
+PROFILE_MEMORY = os.environ.get("FP_PROFILE_MEMORY", "1") == "1"
+SAMPLE_INTERVAL = float(os.environ.get("FP_PROFILE_INTERVAL_MS", 5)) / 1000.0
+TOP_N = 30
+
+logger = logging.getLogger("fp.profiling")
+
+_counter = itertools.count()
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+_tracemalloc_owned = False
+
+
+def profiling_requested():
+    """
+    Whether the current rerun should be profiled
+
+    Returns:
+    bool: True when profiling is on, or requested by query parameter in "query" mode
+    """
+    if PROFILE_MODE == "on":
+        return True
+    if PROFILE_MODE == "query":
+        return st.query_params.get("profile") == "1"
+    return False
+
+
+class StackSampler:
+    """
+    Samples one thread's Python call stack at a fixed interval
+
+    Parameters:
+    thread_id (int): Thread to sample (threading.get_ident() of the script thread)
+    interval (float): Seconds between samples
+    """
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.frames = {}
+        self.samples = []
+        self.weights = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.end_time = time.perf_counter()
+
+    def _frame_id(self, code):
+        key = (code.co_filename, code.co_name, code.co_firstlineno)
+        if key not in self.frames:
+            self.frames[key] = len(self.frames)
+        return self.frames[key]
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is None:
+                break
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_id(frame.f_code))
+                frame = frame.f_back
+            # speedscope wants root first
+            self.samples.append(stack[::-1])
+            self.weights.append(now - last)
+            last = now
+
+    def to_speedscope(self, name):
+        """
+        Export the samples in speedscope's file format
+
+        Parameters:
+        name (str): Profile name
+
+        Returns:
+        dict: JSON-serialisable speedscope document
+        """
+        frames = [None] * len(self.frames)
+        for (filename, function, line), i in self.frames.items():
+            frames[i] = {"name": function, "file": filename, "line": line}
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "fp-profiling",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": self.end_time - self.start_time,
+                "samples": self.samples,
+                "weights": self.weights,
+            }],
+        }
+
+
+def _start_tracemalloc():
+    global _tracemalloc_users, _tracemalloc_owned
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+            _tracemalloc_owned = True
+        _tracemalloc_users += 1
+    return tracemalloc.take_snapshot()
+
+
+def _stop_tracemalloc(before):
+    global _tracemalloc_users, _tracemalloc_owned
+    after = tracemalloc.take_snapshot()
+    peak = tracemalloc.get_traced_memory()[1]
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        # Leave tracing on if it was started outside this module (e.g. PYTHONTRACEMALLOC)
+        if _tracemalloc_users == 0 and _tracemalloc_owned:
+            tracemalloc.stop()
+            _tracemalloc_owned = False
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap*>")]
+    stats = after.filter_traces(filters).compare_to(before.filter_traces(filters), "lineno")
+    lines = [f"Peak traced memory: {peak / 2**20:.1f} MB", "", f"Top {TOP_N} allocation sites (size change):"]
+    for stat in stats[:TOP_N]:
+        lines.append(str(stat))
+    return "\n".join(lines) + "\n"
+
+
+def _run_name(page):
+    slug = re.sub(r"[^a-z0-9]+", "-", page.lower()).strip("-")
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{slug}-{os.getpid()}-{next(_counter)}"
+
+
+@contextlib.contextmanager
+def profile_rerun(page):
+    """
+    Profile the enclosed page render when profiling is requested
+
+    Parameters:
+    page (str): Page being rendered, used in the output file names
+    """
+    if not profiling_requested():
+        yield
+        return
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, _run_name(page))
+    snapshot = _start_tracemalloc() if PROFILE_MEMORY else None
+    if PROFILER == "sampling":
+        profiler = StackSampler(threading.get_ident())
+        profiler.start()
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        yield
+    finally:
+        # Written even when Streamlit interrupts the run, which is often the slow case
+        written = []
+        if PROFILER == "sampling":
+            profiler.stop()
+            with open(f"{base}.speedscope.json", "w") as f:
+                json.dump(profiler.to_speedscope(page), f)
+            written.append(f"{base}.speedscope.json")
+        else:
+            profiler.disable()
+            profiler.dump_stats(f"{base}.prof")
+            report = io.StringIO()
+            pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(TOP_N)
+            with open(f"{base}.txt", "w") as f:
+                f.write(report.getvalue())
+            written += [f"{base}.prof", f"{base}.txt"]
+        if snapshot is not None:
+            with open(f"{base}.alloc.txt", "w") as f:
+                f.write(_stop_tracemalloc(snapshot))
+            written.append(f"{base}.alloc.txt")
+        logger.info("Profile written: %s", ", ".join(written))
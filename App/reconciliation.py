@@ -0,0 +1,271 @@
+"""
+Hierarchical forecast reconciliation
+
+The model forecasts facility x commodity series. For each commodity, the
+location hierarchy is national -> county -> sub-county -> ward -> facility.
+A sparse summing matrix S maps the bottom series to every node of the
+hierarchy. Reconciled forecasts are S @ b, so they add up at every level.
+
+- bottom_up: b is the facility forecasts themselves.
+- mint: b is the minimum-trace (MinT) combination of the base forecasts
+  at all levels, with a diagonal error covariance W (structural weights,
+  i.e. the number of series under each node, or given variances). It is
+  solved with conjugate gradients on S' W^-1 S using sparse matrix
+  products only, so no dense n x n matrix is ever formed.
+
+Base forecasts above the facility level come from the aggregated history
+(seasonal naive with the recent level, see upper_base_forecasts). MinT
+then weighs them against the sum of the model's facility forecasts.
+
+Usage (county totals for a month):
+    python App/reconciliation.py --year 2024 --month 6 --method mint
+"""
+import inspect
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.sparse.linalg import LinearOperator, cg
+
+from utils import SERIES_COLUMNS
+
+# Aggregation levels above the bottom series, top first; each adds one location column
+LEVELS = [
+    ("national", []),
+    ("county", ["county_name"]),
+    ("sub_county", ["county_name", "sub_county_name"]),
+    ("ward", ["county_name", "sub_county_name", "ward_name"]),
+]
+LOCATION_COLUMNS = ["county_name", "sub_county_name", "ward_name", "facility_name"]
+METHODS = ["bottom_up", "mint"]
+# cg's relative tolerance is "rtol" from SciPy 1.12 and "tol" before (removed in 1.14)
+CG_TOLERANCE = "rtol" if "rtol" in inspect.signature(cg).parameters else "tol"
+
+
+class Hierarchy:
+    """
+    Summing matrix and node labels for the location hierarchy of each commodity
+
+    Parameters:
+    series (pandas.DataFrame): One row per bottom series with the SERIES_COLUMNS
+    """
+
+    def __init__(self, series):
+        self.bottom = series[SERIES_COLUMNS].reset_index(drop=True)
+        n = len(self.bottom)
+        blocks, labels = [], []
+        for level, columns in LEVELS:
+            keys = ["dataelement_name"] + columns
+            # dropna=False: a missing sub-county or ward name is a node of its own, not code -1
+            grouped = self.bottom.groupby(keys, sort=True, observed=True, dropna=False)
+            codes = grouped.ngroup().to_numpy()
+            blocks.append(sp.csr_matrix((np.ones(n), (codes, np.arange(n))), shape=(grouped.ngroups, n)))
+            label = grouped.size().index.to_frame(index=False)
+            label.insert(0, "level", level)
+            labels.append(label)
+        blocks.append(sp.identity(n, format="csr"))
+        bottom_labels = self.bottom.copy()
+        bottom_labels.insert(0, "level", "facility")
+        labels.append(bottom_labels)
+
+        self.S = sp.vstack(blocks, format="csr")
+        self.nodes = pd.concat(labels, ignore_index=True)[["level", "dataelement_name"] + LOCATION_COLUMNS]
+        # Node position of the first bottom series; the bottom block is last
+        self.bottom_start = self.S.shape[0] - n
+
+    def __len__(self):
+        return self.S.shape[0]
+
+    def aggregate(self, bottom_values):
+        """
+        Sum bottom-level values up to every node
+
+        Parameters:
+        bottom_values (numpy.ndarray): One value per bottom series (or a matrix, one column per series set)
+
+        Returns:
+        numpy.ndarray: One value per node
+        """
+        return self.S @ bottom_values
+
+
+def reconcile(hierarchy, base, method="mint", variances=None, tol=1e-10):
+    """
+    Make base forecasts coherent across the hierarchy
+
+    Parameters:
+    hierarchy (Hierarchy): The hierarchy
+    base (numpy.ndarray): Base forecast for every node, in hierarchy.nodes order
+    method (str): "bottom_up" or "mint"
+    variances (numpy.ndarray): Forecast error variance per node for mint; defaults to
+        structural weights (number of bottom series under each node)
+    tol (float): Relative tolerance of the conjugate gradient solve
+
+    Returns:
+    numpy.ndarray: Reconciled forecast for every node
+    """
+    base = np.asarray(base, dtype=np.float64)
+    S = hierarchy.S
+    if method == "bottom_up":
+        return S @ base[hierarchy.bottom_start:]
+    if method != "mint":
+        raise ValueError(f"Unknown reconciliation method: {method}")
+
+    if variances is None:
+        variances = np.asarray(S.sum(axis=1)).ravel()
+    inverse_w = 1.0 / np.asarray(variances, dtype=np.float64)
+
+    # Solve (S' W^-1 S) b = S' W^-1 y with matrix-free products; the diagonal is S' w^-1 since S is 0/1
+    n = S.shape[1]
+    St = S.T.tocsr()
+    normal = LinearOperator((n, n), matvec=lambda x: St @ (inverse_w * (S @ x)), dtype=np.float64)
+    preconditioner = 1.0 / (St @ inverse_w)
+    jacobi = LinearOperator((n, n), matvec=lambda x: preconditioner * x, dtype=np.float64)
+    rhs = St @ (inverse_w * base)
+    # Start from bottom-up, which is already close
+    bottom, info = cg(normal, rhs, x0=base[hierarchy.bottom_start:], maxiter=1000, M=jacobi, **{CG_TOLERANCE: tol})
+    if info > 0:
+        raise RuntimeError(f"MinT reconciliation did not converge in {info} iterations")
+    return S @ bottom
+
+
+def bottom_base_forecasts(lags, pipeline, predict, year, month):
+    """
+    Model forecasts for every bottom series for one month
+
+    Series whose locations the encoder does not know fall back to their
+    three-month rolling mean.
+
+    Parameters:
+    lags (pandas.DataFrame): Output of utils.build_series_lag_index
+    pipeline (FeaturePipeline): Feature pipeline for the model
+    predict (callable): Takes a feature DataFrame and returns predictions
+    year (int): Forecast year
+    month (int): Forecast month
+
+    Returns:
+    numpy.ndarray: One forecast per row of lags
+    """
+    series = lags.reset_index(drop=True)
+    forecasts = series["rolling_mean_3"].to_numpy(dtype=np.float64).copy()
+    known = np.ones(len(series), dtype=bool)
+    if pipeline.unknown_value is None:
+        known = pipeline.supported(series)
+    rows = series[known]
+    if len(rows):
+        columns = {c: rows[c] for c in SERIES_COLUMNS}
+        columns.update(
+            month=np.full(len(rows), month),
+            year=np.full(len(rows), year),
+            lag_1=rows["lag_1"].to_numpy(),
+            lag_3=rows["lag_3"].to_numpy(),
+            rolling_mean_3=rows["rolling_mean_3"].to_numpy(),
+        )
+        forecasts[known] = np.asarray(predict(pipeline.frame(columns)), dtype=np.float64)
+    return forecasts
+
+
+def _series_totals(df, hierarchy, periods):
+    """Sum of each bottom series over the given periods (0 where it did not report)"""
+    rows = df[df["period"].isin(periods)]
+    totals = rows.groupby(["facility_name", "dataelement_name"], observed=True, dropna=False)["value"].sum()
+    keys = pd.MultiIndex.from_frame(hierarchy.bottom[["facility_name", "dataelement_name"]].astype(object))
+    positions = totals.index.get_indexer(keys) if len(totals) else np.full(len(keys), -1)
+    out = np.zeros(len(keys))
+    found = positions >= 0
+    out[found] = totals.to_numpy()[positions[found]]
+    return out
+
+
+def upper_base_forecasts(df, hierarchy, year, month):
+    """
+    Base forecasts for every node from its aggregated history
+
+    Seasonal naive with the recent level: the node's total in the same month
+    a year before the target, scaled by the ratio of its last three months to
+    the same three months a year earlier. Nodes without that history use the
+    mean of their last three months.
+
+    Parameters:
+    df (pandas.DataFrame): The dataset
+    hierarchy (Hierarchy): The hierarchy
+    year (int): Forecast year
+    month (int): Forecast month
+
+    Returns:
+    numpy.ndarray: One forecast per node (bottom nodes included)
+    """
+    target = pd.Timestamp(year=int(year), month=int(month), day=1)
+    last = df["period"].max()
+    recent = pd.date_range(end=last, periods=3, freq="MS")
+    year_before = recent - pd.DateOffset(years=1)
+
+    level = hierarchy.aggregate(_series_totals(df, hierarchy, recent)) / 3
+    previous_level = hierarchy.aggregate(_series_totals(df, hierarchy, year_before)) / 3
+    seasonal = hierarchy.aggregate(_series_totals(df, hierarchy, [target - pd.DateOffset(years=1)]))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scaled = seasonal * level / previous_level
+    usable = (previous_level > 0) & (seasonal > 0)
+    return np.where(usable, scaled, level)
+
+
+def reconciled_forecasts(df, lags, pipeline, predict, year, month, method="mint"):
+    """
+    Coherent forecasts for every node of the hierarchy for one month
+
+    Parameters:
+    df (pandas.DataFrame): The dataset
+    lags (pandas.DataFrame): Output of utils.build_series_lag_index
+    pipeline (FeaturePipeline): Feature pipeline for the model
+    predict (callable): Takes a feature DataFrame and returns predictions
+    year (int): Forecast year
+    month (int): Forecast month
+    method (str): "bottom_up" or "mint"
+
+    Returns:
+    pandas.DataFrame: hierarchy.nodes with base and reconciled forecasts
+    """
+    hierarchy = Hierarchy(lags)
+    base = upper_base_forecasts(df, hierarchy, year, month)
+    base[hierarchy.bottom_start:] = bottom_base_forecasts(lags, pipeline, predict, year, month)
+    result = hierarchy.nodes.copy()
+    result["base"] = base
+    result["reconciled"] = reconcile(hierarchy, base, method)
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    import joblib
+
+    from data_store import prepare_shared_dataset, read_arrow_dataset
+    from features import FeaturePipeline
+    from model_store import ensure_model_files
+    from utils import build_series_lag_index
+
+    parser = argparse.ArgumentParser(description="Reconcile one month of forecasts across the location hierarchy")
+    parser.add_argument("--year", type=int, required=True)
+    parser.add_argument("--month", type=int, required=True)
+    parser.add_argument("--method", choices=METHODS, default="mint")
+    parser.add_argument("--out", help="Write every node's forecasts to this CSV file")
+    args = parser.parse_args()
+
+    model_path, encoder_path = ensure_model_files()
+    if not model_path or not encoder_path:
+        raise SystemExit("Model files are not available")
+    model = joblib.load(model_path)
+    pipeline = FeaturePipeline(joblib.load(encoder_path), getattr(model, "feature_names_in_", None))
+    df = read_arrow_dataset(prepare_shared_dataset())
+
+    started = time.perf_counter()
+    result = reconciled_forecasts(df, build_series_lag_index(df), pipeline, model.predict,
+                                  args.year, args.month, args.method)
+    print(f"Reconciled {len(result):,} nodes in {time.perf_counter() - started:.1f}s\n")
+    counties = result[result["level"].isin(["national", "county"])]
+    with pd.option_context("display.max_rows", 1000, "display.width", 120, "display.float_format", "{:,.0f}".format):
+        print(counties[["dataelement_name", "county_name", "base", "reconciled"]].to_string(index=False))
+    if args.out:
+        result.to_csv(args.out, index=False)
@@ -0,0 +1,565 @@
+"""
+Offline county and commodity briefs
+
+A brief is a one-page summary of one county or one commodity: headline
+figures, a county map, monthly trends, next month's forecast and the
+features driving it (mean SHAP values). Briefs are written as HTML
+(interactive plotly charts) and/or PDF (matplotlib, one A4 page).
+
+Everything the briefs share is computed once, in the parent process, by
+report_context: the county x commodity x month aggregates, facility
+counts and the national baseline forecast of every supported series
+(scenarios.baseline_forecast). Worker processes receive that context once
+through the pool initializer, load the GeoJSON and a SHAP explainer once,
+then each render a share of the briefs. No Streamlit server is needed.
+
+Usage (every county and commodity brief as HTML and PDF):
+    python App/reports.py --kind all --format html pdf --workers 8
+    python App/reports.py --kind county --name "Nairobi County" --format pdf
+"""
+import html
+import json
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from scenarios import baseline_forecast
+from utils import county_key, geojson_county_key
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPORT_DIR = os.path.join(BASE_DIR, "Data", "reports")
+GEOJSON_FILE = os.path.join(BASE_DIR, "Data", "kenya.geojson")
+
+KINDS = {"county": "county_name", "commodity": "dataelement_name"}
+FORMATS = ["html", "pdf"]
+# Months shown in the trend charts and summed in the headline figures
+TREND_MONTHS = 12
+# Largest lines drawn in a trend chart
+TOP_LINES = 6
+# Forecast rows explained per brief (a random sample beyond this)
+DRIVER_ROWS = 500
+MAP_COLORS = ["#ffffb2", "#fecc5c", "#fd8d3c", "#f03b20", "#bd0026"]
+# Decimal places kept in map coordinates (about 100 m); the GeoJSON is embedded in every HTML brief
+MAP_PRECISION = 3
+
+# Per-process state of the pool workers
+_CONTEXT = None
+_GEO = None
+_EXPLAINER = None
+
+
+def report_context(df, lags, pipeline, predict, year=None, month=None, model_version=None):
+    """
+    Aggregates and forecasts shared by every brief
+
+    Parameters:
+    df (pandas.DataFrame): The dataset
+    lags (pandas.DataFrame): Output of utils.build_series_lag_index
+    pipeline (FeaturePipeline): Feature pipeline for the model
+    predict (callable): Takes a feature DataFrame and returns predictions
+    year (int): Forecast year (defaults to the month after the latest data)
+    month (int): Forecast month
+    model_version (str): Shown in the briefs
+
+    Returns:
+    dict: "monthly" (county x commodity x month totals), "facilities" (facilities per
+        county), "forecast" (series columns and forecast per series), "X" (feature rows
+        of the forecast), "last_period", "year", "month", "model_version" and "generated"
+    """
+    last_period = df["period"].max()
+    if year is None or month is None:
+        target = last_period + pd.DateOffset(months=1)
+        year, month = target.year, target.month
+    baseline = baseline_forecast(lags, pipeline, predict, int(year), int(month))
+
+    monthly = (df.groupby(["county_name", "dataelement_name", "period"], observed=True)["value"]
+               .sum().reset_index())
+    monthly["county_name"] = monthly["county_name"].astype(str)
+    monthly["dataelement_name"] = monthly["dataelement_name"].astype(str)
+    forecast = baseline["series"].astype(str).assign(forecast=baseline["prediction"])
+    return {
+        "monthly": monthly,
+        "facilities": df.groupby("county_name", observed=True)["facility_name"].nunique()
+                        .rename(index=str).to_dict(),
+        "forecast": forecast,
+        "X": baseline["X"].reset_index(drop=True),
+        "last_period": last_period,
+        "year": int(year),
+        "month": int(month),
+        "model_version": model_version or "unknown",
+        "generated": pd.Timestamp.now().strftime("%Y-%m-%d %H:%M"),
+    }
+
+
+def brief_names(context, kind):
+    """Counties or commodities that have a brief, sorted"""
+    return sorted(context["monthly"][KINDS[kind]].unique())
+
+
+def _slug(name):
+    return re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-") or "unnamed"
+
+
+def brief_filename(kind, name, fmt):
+    """File name of a brief, e.g. county-nairobi-county.html"""
+    return f"{kind}-{_slug(name)}.{fmt}"
+
+
+def brief_drivers(explainer, X, max_rows=DRIVER_ROWS):
+    """
+    Mean SHAP contribution of each feature to a set of forecasts
+
+    Parameters:
+    explainer: shap.TreeExplainer of the model, or None
+    X (pandas.DataFrame): Feature rows of the forecasts
+    max_rows (int): Explain a random sample of this many rows
+
+    Returns:
+    pandas.DataFrame: feature, mean_abs and mean per feature, largest first, or None
+        without an explainer
+    """
+    if explainer is None or not len(X):
+        return None
+    if len(X) > max_rows:
+        X = X.sample(max_rows, random_state=0)
+    values = np.asarray(explainer.shap_values(X, check_additivity=False))
+    drivers = pd.DataFrame({"feature": X.columns, "mean_abs": np.abs(values).mean(axis=0),
+                            "mean": values.mean(axis=0)})
+    return drivers.sort_values("mean_abs", ascending=False, ignore_index=True)
+
+
+def brief_data(context, kind, name, explainer=None):
+    """
+    Sections of one brief
+
+    Parameters:
+    context (dict): Output of report_context
+    kind (str): "county" or "commodity"
+    name (str): County or commodity name
+    explainer: shap.TreeExplainer of the model, or None to leave out the drivers
+
+    Returns:
+    dict: title, kind, name, kpis, map (value per county key), map_caption, highlight
+        (county key or None), trend (month x line DataFrame), forecast (table DataFrame),
+        drivers and the context's metadata
+    """
+    column = KINDS[kind]
+    other = KINDS["commodity" if kind == "county" else "county"]
+    monthly = context["monthly"][context["monthly"][column] == name]
+    last = context["last_period"]
+    recent_start = last - pd.DateOffset(months=TREND_MONTHS - 1)
+    previous_start = recent_start - pd.DateOffset(months=TREND_MONTHS)
+    recent = monthly[monthly["period"] >= recent_start]
+    previous = monthly[(monthly["period"] >= previous_start) & (monthly["period"] < recent_start)]
+
+    rows = np.flatnonzero((context["forecast"][column] == name).to_numpy())
+    forecast = context["forecast"].iloc[rows]
+    target = pd.Timestamp(year=context["year"], month=context["month"], day=1)
+
+    # Trend: the largest lines over the recent months (a sum of the rest would dwarf them)
+    trend = recent.pivot_table(index="period", columns=other, values="value", aggfunc="sum", fill_value=0)
+    trend = trend[trend.sum().sort_values(ascending=False).index[:TOP_LINES]]
+
+    # Forecast table: latest month and forecast per county or commodity
+    latest = monthly[monthly["period"] == last].groupby(other)["value"].sum()
+    table = pd.DataFrame({"latest": latest, "forecast": forecast.groupby(other)["forecast"].sum()}).fillna(0)
+    table["change_pct"] = 100 * (table["forecast"] - table["latest"]) / table["latest"].where(table["latest"] != 0)
+    table = table.sort_values("forecast", ascending=False).rename_axis(other).reset_index()
+
+    # Map: for a county, every county's total for context; for a commodity, its total per county
+    map_source = context["monthly"] if kind == "county" else monthly
+    map_totals = map_source[map_source["period"] >= recent_start].groupby("county_name")["value"].sum()
+    map_values = dict(zip(county_key(map_totals.index.to_series()), map_totals.to_numpy()))
+
+    recent_total = float(recent["value"].sum())
+    previous_total = float(previous["value"].sum())
+    if kind == "county":
+        facilities = context["facilities"].get(name, 0)
+    else:
+        facilities = forecast["facility_name"].nunique()
+    kpis = [
+        (f"Units, last {TREND_MONTHS} months", f"{recent_total:,.0f}"),
+        (f"Change vs previous {TREND_MONTHS}", f"{100 * (recent_total / previous_total - 1):+.1f}%"
+         if previous_total else "n/a"),
+        ("Facilities", f"{facilities:,}"),
+        (f"Forecast {target:%b %Y}", f"{forecast['forecast'].sum():,.0f}"),
+    ]
+    return {
+        "title": f"{name} — {kind.capitalize()} Brief",
+        "kind": kind,
+        "name": name,
+        "kpis": kpis,
+        "map": map_values,
+        "map_caption": f"All commodities, last {TREND_MONTHS} months" if kind == "county"
+                       else f"Units by county, last {TREND_MONTHS} months",
+        "highlight": county_key(pd.Series([name])).iloc[0] if kind == "county" else None,
+        "trend": trend,
+        "trend_caption": f"Monthly units, largest {TOP_LINES} of {recent[other].nunique()}"
+                         if recent[other].nunique() > TOP_LINES else "Monthly units",
+        "forecast": table,
+        "forecast_label": "Commodity" if kind == "county" else "County",
+        "target": target,
+        "drivers": brief_drivers(explainer, context["X"].iloc[rows]),
+        "last_period": last,
+        "model_version": context["model_version"],
+        "generated": context["generated"],
+    }
+
+
+def _round_coordinates(coordinates):
+    if isinstance(coordinates[0], (int, float)):
+        return [round(c, MAP_PRECISION) for c in coordinates]
+    return [_round_coordinates(c) for c in coordinates]
+
+
+def load_report_geojson(path=GEOJSON_FILE):
+    """
+    Kenya counties GeoJSON, reduced to what the briefs draw
+
+    Parameters:
+    path (str): GeoJSON file
+
+    Returns:
+    dict: GeoJSON with rounded coordinates and only the COUNTY_NAM and county_key
+        (utils.geojson_county_key) properties
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        geo = json.load(f)
+    for feature in geo["features"]:
+        feature["properties"] = {"COUNTY_NAM": feature["properties"].get("COUNTY_NAM"),
+                                 "county_key": geojson_county_key(feature)}
+        feature["geometry"]["coordinates"] = _round_coordinates(feature["geometry"]["coordinates"])
+    return geo
+
+
+# --- HTML --------------------------------------------------------------------
+
+def _map_figure(brief, geo):
+    import plotly.graph_objects as go
+    keys = [f["properties"]["county_key"] for f in geo["features"]]
+    fig = go.Figure(go.Choropleth(
+        geojson=geo,
+        featureidkey="properties.county_key",
+        locations=keys,
+        z=[brief["map"].get(k, 0) for k in keys],
+        text=[f["properties"].get("COUNTY_NAM") or "" for f in geo["features"]],
+        hovertemplate="%{text}: %{z:,.0f}<extra></extra>",
+        colorscale=MAP_COLORS,
+        marker_line_color=["#2c3e50" if k == brief["highlight"] else "#666" for k in keys],
+        marker_line_width=[3 if k == brief["highlight"] else 0.5 for k in keys],
+        colorbar=dict(title="Units"),
+    ))
+    fig.update_geos(fitbounds="locations", visible=False)
+    fig.update_layout(title=brief["map_caption"], height=450, margin=dict(l=0, r=0, t=40, b=0))
+    return fig
+
+
+def _trend_figure(brief):
+    import plotly.graph_objects as go
+    fig = go.Figure()
+    for line in brief["trend"].columns:
+        fig.add_trace(go.Scatter(x=brief["trend"].index, y=brief["trend"][line], mode="lines+markers", name=line))
+    fig.update_layout(title=brief["trend_caption"], height=400, margin=dict(l=20, r=20, t=40, b=20),
+                      plot_bgcolor="rgba(255,255,255,0.9)", legend=dict(orientation="h", y=-0.2))
+    return fig
+
+
+def _drivers_figure(brief):
+    import plotly.graph_objects as go
+    drivers = brief["drivers"].iloc[::-1]
+    fig = go.Figure(go.Bar(
+        x=drivers["mean"], y=drivers["feature"], orientation="h",
+        marker_color=np.where(drivers["mean"] >= 0, "#ff0051", "#008bfb"),
+        customdata=drivers["mean_abs"],
+        hovertemplate="%{y}: %{x:+,.2f} (mean |SHAP| %{customdata:,.2f})<extra></extra>",
+    ))
+    fig.update_layout(title="Forecast drivers (mean SHAP value)", height=350,
+                      margin=dict(l=20, r=20, t=40, b=20), plot_bgcolor="rgba(255,255,255,0.9)")
+    return fig
+
+
+def render_html(brief, geo, path, plotlyjs=True):
+    """
+    Write a brief as a standalone HTML page
+
+    Parameters:
+    brief (dict): Output of brief_data
+    geo (dict): Output of load_report_geojson
+    path (str): Output file
+    plotlyjs (bool or str): True to embed plotly.js, "directory" to load plotly.min.js
+        from the same directory (write it once with write_plotlyjs)
+    """
+    figures = [_map_figure(brief, geo), _trend_figure(brief)]
+    if brief["drivers"] is not None:
+        figures.append(_drivers_figure(brief))
+    charts = [fig.to_html(full_html=False, include_plotlyjs=plotlyjs if i == 0 else False)
+              for i, fig in enumerate(figures)]
+
+    kpis = "".join(f'<div class="kpi"><div class="value">{html.escape(value)}</div>'
+                   f'<div class="label">{html.escape(label)}</div></div>' for label, value in brief["kpis"])
+    table = brief["forecast"].rename(columns={
+        brief["forecast"].columns[0]: brief["forecast_label"],
+        "latest": f"{brief['last_period']:%b %Y} (units)",
+        "forecast": f"Forecast {brief['target']:%b %Y}",
+        "change_pct": "Change",
+    }).to_html(index=False, border=0, classes="forecast", na_rep="n/a",
+               formatters={f"Forecast {brief['target']:%b %Y}": "{:,.0f}".format,
+                           f"{brief['last_period']:%b %Y} (units)": "{:,.0f}".format,
+                           "Change": "{:+.1f}%".format})
+    page = f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{html.escape(brief["title"])}</title>
+<style>
+body {{ font-family: sans-serif; color: #2c3e50; max-width: 1100px; margin: 0 auto; padding: 20px; }}
+.header {{ background: linear-gradient(to right, #4b6cb7, #182848); color: white; padding: 16px; border-radius: 10px; }}
+.kpis {{ display: flex; gap: 12px; margin: 16px 0; }}
+.kpi {{ flex: 1; background: white; border-radius: 10px; box-shadow: 0 4px 12px rgba(0,0,0,0.1); padding: 12px; text-align: center; }}
+.kpi .value {{ font-size: 24px; font-weight: bold; color: #4CAF50; }}
+.kpi .label {{ color: #666; }}
+.row {{ display: flex; gap: 12px; }} .row > div {{ flex: 1; min-width: 0; }}
+table.forecast {{ border-collapse: collapse; width: 100%; }}
+table.forecast th, table.forecast td {{ padding: 4px 8px; border-bottom: 1px solid #eee; text-align: right; }}
+table.forecast th:first-child, table.forecast td:first-child {{ text-align: left; }}
+.footer {{ color: #666; font-size: 13px; margin-top: 20px; text-align: center; }}
+</style></head><body>
+<div class="header"><h1>{html.escape(brief["title"])}</h1>
+<p>Data to {brief["last_period"]:%B %Y} · forecast for {brief["target"]:%B %Y}</p></div>
+<div class="kpis">{kpis}</div>
+<div class="row"><div>{charts[0]}</div><div>{charts[1]}</div></div>
+<h3>Forecast by {brief["forecast_label"].lower()}</h3>{table}
+{charts[2] if len(charts) > 2 else ""}
+<div class="footer">Model version {html.escape(brief["model_version"])} · generated {brief["generated"]}</div>
+</body></html>"""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(page)
+
+
+def write_plotlyjs(out_dir):
+    """Write plotly.min.js next to briefs rendered with plotlyjs="directory" """
+    from plotly.offline import get_plotlyjs
+    with open(os.path.join(out_dir, "plotly.min.js"), "w", encoding="utf-8") as f:
+        f.write(get_plotlyjs())
+
+
+# --- PDF ---------------------------------------------------------------------
+
+def _draw_map(ax, brief, geo):
+    from matplotlib import colors
+    from matplotlib.collections import PolyCollection
+    cmap = colors.LinearSegmentedColormap.from_list("brief", MAP_COLORS)
+    values = brief["map"]
+    norm = colors.Normalize(vmin=min(values.values(), default=0), vmax=max(values.values(), default=1))
+    polygons, faces, edges, widths = [], [], [], []
+    for feature in geo["features"]:
+        geometry = feature["geometry"]
+        rings = [geometry["coordinates"][0]] if geometry["type"] == "Polygon" \
+            else [polygon[0] for polygon in geometry["coordinates"]]
+        key = feature["properties"]["county_key"]
+        for ring in rings:
+            polygons.append(np.asarray(ring)[:, :2])
+            faces.append(cmap(norm(values.get(key, 0))))
+            highlight = key == brief["highlight"]
+            edges.append("#2c3e50" if highlight else "#666666")
+            widths.append(1.5 if highlight else 0.3)
+    ax.add_collection(PolyCollection(polygons, facecolors=faces, edgecolors=edges, linewidths=widths))
+    ax.autoscale_view()
+    ax.set_aspect("equal")
+    ax.axis("off")
+    ax.set_title(brief["map_caption"], fontsize=9)
+
+
+def render_pdf(brief, geo, path):
+    """
+    Write a brief as a one-page A4 PDF
+
+    Parameters:
+    brief (dict): Output of brief_data
+    geo (dict): Output of load_report_geojson
+    path (str): Output file
+    """
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(8.27, 11.69))
+    fig.text(0.05, 0.965, brief["title"], fontsize=16, weight="bold", color="#182848")
+    fig.text(0.05, 0.945, f"Data to {brief['last_period']:%B %Y} · forecast for {brief['target']:%B %Y}",
+             fontsize=9, color="#666666")
+    for i, (label, value) in enumerate(brief["kpis"]):
+        x = 0.05 + i * 0.2325
+        fig.text(x, 0.905, value, fontsize=14, weight="bold", color="#4CAF50")
+        fig.text(x, 0.89, label, fontsize=7.5, color="#666666")
+
+    _draw_map(fig.add_axes([0.03, 0.56, 0.45, 0.29]), brief, geo)
+
+    ax = fig.add_axes([0.57, 0.6, 0.39, 0.25])
+    for line in brief["trend"].columns:
+        ax.plot(brief["trend"].index, brief["trend"][line], marker="o", markersize=2, linewidth=1,
+                label=str(line)[:28])
+    ax.set_title(brief["trend_caption"], fontsize=9)
+    ax.tick_params(labelsize=6)
+    ax.tick_params(axis="x", rotation=45)
+    ax.legend(fontsize=5, loc="upper center", bbox_to_anchor=(0.5, -0.22), ncol=2, frameon=False)
+
+    table = brief["forecast"].head(15)
+    ax = fig.add_axes([0.05, 0.25 if brief["drivers"] is not None else 0.05, 0.9, 0.24])
+    ax.axis("off")
+    ax.set_title(f"Forecast by {brief['forecast_label'].lower()}", fontsize=9, loc="left")
+    cells = [[str(row.iloc[0])[:45], f"{row['latest']:,.0f}", f"{row['forecast']:,.0f}",
+              "n/a" if pd.isna(row["change_pct"]) else f"{row['change_pct']:+.1f}%"] for _, row in table.iterrows()]
+    if cells:
+        grid = ax.table(cellText=cells, loc="upper center", cellLoc="right",
+                        colLabels=[brief["forecast_label"], f"{brief['last_period']:%b %Y}",
+                                   f"Forecast {brief['target']:%b %Y}", "Change"],
+                        colWidths=[0.52, 0.16, 0.16, 0.16])
+        grid.auto_set_font_size(False)
+        grid.set_fontsize(7)
+        grid.scale(1, 1.1)
+        for (row, col), cell in grid.get_celld().items():
+            if col == 0 and row > 0:
+                cell.set_text_props(ha="left")
+
+    if brief["drivers"] is not None:
+        drivers = brief["drivers"].iloc[::-1]
+        ax = fig.add_axes([0.25, 0.05, 0.65, 0.16])
+        ax.barh(drivers["feature"], drivers["mean"],
+                color=np.where(drivers["mean"] >= 0, "#ff0051", "#008bfb"))
+        ax.axvline(0, color="#888888", linewidth=0.5)
+        ax.set_title("Forecast drivers (mean SHAP value)", fontsize=9)
+        ax.tick_params(labelsize=7)
+
+    fig.text(0.5, 0.015, f"Model version {brief['model_version']} · generated {brief['generated']}",
+             fontsize=7, color="#666666", ha="center")
+    fig.savefig(path, format="pdf")
+
+
+RENDERERS = {"html": render_html, "pdf": render_pdf}
+
+
+# --- Generation --------------------------------------------------------------
+
+def _init_worker(context, geojson_path, model_path, explainer=None):
+    global _CONTEXT, _GEO, _EXPLAINER
+    _CONTEXT = context
+    _GEO = load_report_geojson(geojson_path)
+    _EXPLAINER = explainer
+    if explainer is None and model_path:
+        try:
+            import joblib
+            import shap
+        except ImportError:
+            return
+        _EXPLAINER = shap.TreeExplainer(joblib.load(model_path))
+
+
+def _render_brief(kind, name, formats, out_dir, plotlyjs):
+    brief = brief_data(_CONTEXT, kind, name, _EXPLAINER)
+    paths = []
+    for fmt in formats:
+        path = os.path.join(out_dir, brief_filename(kind, name, fmt))
+        if fmt == "html":
+            render_html(brief, _GEO, path, plotlyjs)
+        else:
+            render_pdf(brief, _GEO, path)
+        paths.append(path)
+    return paths
+
+
+def generate_reports(context, briefs, formats=FORMATS, out_dir=REPORT_DIR, workers=None,
+                     geojson_path=GEOJSON_FILE, model_path=None, progress=None, explainer=None):
+    """
+    Render briefs in parallel worker processes
+
+    Parameters:
+    context (dict): Output of report_context
+    briefs (list): (kind, name) pairs
+    formats (list): "html" and/or "pdf"
+    out_dir (str): Output directory (created if missing)
+    workers (int): Worker processes; 1 renders in this process (defaults to the CPU count)
+    geojson_path (str): Kenya counties GeoJSON
+    model_path (str): Model file, for the SHAP drivers (None leaves them out)
+    progress (callable): Called with (done, total) after each brief
+    explainer: Object with shap_values(X) used instead of loading one from model_path
+        when rendering in this process (e.g. an explainer the caller already holds)
+
+    Returns:
+    list: Paths of the written files
+    """
+    unknown = set(formats) - set(RENDERERS)
+    if unknown:
+        raise ValueError(f"Unknown report formats: {sorted(unknown)}")
+    os.makedirs(out_dir, exist_ok=True)
+    # Several HTML briefs share one copy of plotly.js instead of embedding 3 MB each
+    plotlyjs = True
+    if "html" in formats and len(briefs) > 1:
+        write_plotlyjs(out_dir)
+        plotlyjs = "directory"
+
+    workers = min(workers or os.cpu_count() or 1, len(briefs)) or 1
+    paths = []
+    if workers == 1:
+        _init_worker(context, geojson_path, model_path, explainer)
+        for done, (kind, name) in enumerate(briefs, start=1):
+            paths.extend(_render_brief(kind, name, formats, out_dir, plotlyjs))
+            if progress is not None:
+                progress(done, len(briefs))
+        return paths
+
+    # spawn, like the inference pool: safe to start from the threaded Streamlit server
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker, initargs=(context, geojson_path, model_path)) as pool:
+        futures = [pool.submit(_render_brief, kind, name, formats, out_dir, plotlyjs) for kind, name in briefs]
+        for done, future in enumerate(as_completed(futures), start=1):
+            paths.extend(future.result())
+            if progress is not None:
+                progress(done, len(briefs))
+    return paths
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import joblib
+
+    from data_store import prepare_shared_dataset, read_arrow_dataset
+    from features import FeaturePipeline
+    from model_store import ensure_model_files, model_version
+    from utils import build_series_lag_index
+
+    parser = argparse.ArgumentParser(description="Render county and commodity briefs without the app")
+    parser.add_argument("--kind", choices=list(KINDS) + ["all"], default="all")
+    parser.add_argument("--name", action="append", default=[], help="Only these counties or commodities")
+    parser.add_argument("--format", nargs="+", choices=FORMATS, default=FORMATS)
+    parser.add_argument("--workers", type=int, help="Worker processes (defaults to the CPU count)")
+    parser.add_argument("--year", type=int, help="Forecast year (defaults to the month after the data)")
+    parser.add_argument("--month", type=int)
+    parser.add_argument("--no-drivers", action="store_true", help="Leave out the SHAP drivers")
+    parser.add_argument("--out", default=REPORT_DIR)
+    args = parser.parse_args()
+
+    model_path, encoder_path = ensure_model_files()
+    if not model_path or not encoder_path:
+        raise SystemExit("Model files are not available")
+    model = joblib.load(model_path)
+    pipeline = FeaturePipeline(joblib.load(encoder_path), getattr(model, "feature_names_in_", None))
+    df = read_arrow_dataset(prepare_shared_dataset())
+
+    started = time.perf_counter()
+    context = report_context(df, build_series_lag_index(df), pipeline, model.predict, args.year, args.month,
+                             model_version())
+    print(f"Aggregated the data and forecast {len(context['X']):,} series "
+          f"in {time.perf_counter() - started:.1f}s")
+
+    kinds = list(KINDS) if args.kind == "all" else [args.kind]
+    briefs = [(kind, name) for kind in kinds for name in brief_names(context, kind)
+              if not args.name or name in args.name]
+    if not briefs:
+        raise SystemExit("No briefs match the selection")
+    rendered = time.perf_counter()
+    paths = generate_reports(context, briefs, args.format, args.out, args.workers,
+                             model_path=None if args.no_drivers else model_path,
+                             progress=lambda done, total: print(f"\r{done}/{total} briefs", end="", flush=True))
+    print(f"\nWrote {len(paths):,} files to {args.out} in {time.perf_counter() - rendered:.1f}s "
+          f"({time.perf_counter() - started:.1f}s in total)")
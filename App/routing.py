@@ -0,0 +1,113 @@
+"""
+Page registry with lazy imports
+
+Page modules, and their heavy dependencies such as plotly and folium, are imported the first time their page is selected,
+not when the server starts. Each first import is timed and logged.
+
+Usage (import-time report, each page module in a fresh interpreter):
+    python App/routing.py
+"""
+import importlib
+import logging
+import os
+import sys
+import time
+
+from instrumentation import rss_bytes, span
+
+# Navigation label -> (module, entry point)
+PAGES = {
+    "Home": ("home", "show_home_page"),
+    "Visualizations": ("visualizations", "show_visualizations_page"),
+    "Predictions": ("predictions", "show_predictions_page"),
+    "Explainable AI": ("explainable_ai", "show_explainable_ai_page"),
+    "Accuracy": ("accuracy", "show_accuracy_page"),
+    "Alerts": ("alerts", "show_alerts_page"),
+}
+
+# Imported by main.py on every rerun, whichever page is selected
+STARTUP_MODULES = ["streamlit", "streamlit_option_menu", "pandas", "data_store", "model_store", "utils",
+                   "instrumentation", "profiling", "routing"]
+
+logger = logging.getLogger("fp.imports")
+
+# Module -> (seconds, RSS growth in bytes) of its first import in this process
+IMPORT_TIMES = {}
+
+
+def load_page(name):
+    """
+    Import a page module on first use and return its entry point
+
+    Parameters:
+    name (str): Navigation label of the page
+
+    Returns:
+    callable: The page's show_* function
+    """
+    module_name, function_name = PAGES[name]
+    if module_name not in sys.modules:
+        rss = rss_bytes()
+        start = time.perf_counter()
+        with span(f"import.{module_name}"):
+            importlib.import_module(module_name)
+        IMPORT_TIMES[module_name] = (time.perf_counter() - start, rss_bytes() - rss)
+        logger.info("Imported %s in %.2fs (%+.1f MB RSS)", module_name,
+                    IMPORT_TIMES[module_name][0], IMPORT_TIMES[module_name][1] / 2**20)
+    return getattr(sys.modules[module_name], function_name)
+
+
+def import_report(module_name, top=10):
+    """
+    Measure a cold import of one module in a fresh interpreter with -X importtime
+
+    Parameters:
+    module_name (str): Module to import (or several, comma separated)
+    top (int): Number of slowest packages to list
+
+    Returns:
+    dict: total_s, rss_mb, top (list of (package, seconds)) and error (str or None)
+    """
+    import subprocess
+
+    code = ("import resource, sys; import " + module_name + "; "
+            "print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, file=sys.stdout)")
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            cwd=app_dir, capture_output=True, text=True)
+    packages = {}
+    total = 0.0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        own, _, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        if not own.isdigit():
+            continue  # header line
+        # Charge each module's own time to its top-level package
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0.0) + int(own) / 1e6
+        total += int(own) / 1e6
+    error = None
+    if result.returncode != 0:
+        error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed"
+    rss = int(result.stdout.split()[-1]) / 1024 if result.returncode == 0 and result.stdout.split() else 0.0
+    slowest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {"total_s": total, "rss_mb": rss, "top": slowest, "error": error}
+
+
+if __name__ == "__main__":
+    # What every rerun needs, then what each page adds on top of it
+    baseline = import_report(", ".join(STARTUP_MODULES))
+    reports = [("Startup", baseline)] + [(page, import_report(module)) for page, (module, _) in PAGES.items()]
+    for label, report in reports:
+        print(f"\n{label}")
+        if report["error"]:
+            print(f"  failed: {report['error']}")
+            continue
+        print(f"  {report['total_s']:.2f}s, peak RSS {report['rss_mb']:.0f} MB", end="")
+        if report is not baseline and not baseline["error"]:
+            print(f" (+{report['total_s'] - baseline['total_s']:.2f}s, "
+                  f"+{report['rss_mb'] - baseline['rss_mb']:.0f} MB over startup)", end="")
+        print()
+        for package, seconds in report["top"]:
+            print(f"    {package:<28} {seconds:.3f}s")
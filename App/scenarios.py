@@ -0,0 +1,230 @@
+"""
+Scenario planning over every series at once
+
+The baseline is the model's forecast for one month for every supported
+facility x commodity series, from each series' latest lag features.
+A scenario selects a subset of series (counties, commodities, facilities)
+and perturbs their feature rows, e.g. "recent demand 20% lower" scales
+lag_1, lag_3 and rolling_mean_3 by 0.8. Only the selected rows are
+predicted again, in one batch, and diffed against the baseline.
+
+Scenarios are plain dicts (see make_scenario). scenario_key hashes
+everything except the name, so the same scenario under another name hits
+the same cached result.
+
+Usage (national scenario from the command line):
+    python App/scenarios.py --year 2024 --month 6 --demand-change -20 --county "Nairobi County"
+"""
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+
+from utils import SERIES_COLUMNS
+
+LAG_FEATURES = ["lag_1", "lag_3", "rolling_mean_3"]
+# Scenario filters: series column -> scenario field
+FILTERS = {"county_name": "counties", "dataelement_name": "commodities", "facility_name": "facilities"}
+# Perturbation operations on a feature column
+OPERATIONS = {
+    "scale": lambda values, amount: values * amount,
+    "add": lambda values, amount: np.maximum(values + amount, 0.0),
+    "set": lambda values, amount: np.full_like(values, amount),
+}
+
+
+def make_scenario(name, counties=(), commodities=(), facilities=(), demand_change=0.0,
+                  features=LAG_FEATURES, adjustments=None):
+    """
+    Describe a scenario
+
+    Parameters:
+    name (str): Label shown in comparisons
+    counties (iterable): Counties affected (empty for all)
+    commodities (iterable): Commodities affected (empty for all)
+    facilities (iterable): Facilities affected (empty for all)
+    demand_change (float): Relative change of recent demand, e.g. -0.2 for 20% lower
+    features (iterable): Lag features the demand change applies to
+    adjustments (dict): Extra perturbations, feature -> (operation, amount) with operation
+        "scale", "add" or "set", applied after the demand change
+
+    Returns:
+    dict: The scenario
+    """
+    for feature, (operation, _) in (adjustments or {}).items():
+        if operation not in OPERATIONS:
+            raise ValueError(f"Unknown operation {operation!r} for {feature}")
+    return {
+        "name": name,
+        "counties": sorted(counties),
+        "commodities": sorted(commodities),
+        "facilities": sorted(facilities),
+        "demand_change": float(demand_change),
+        "features": sorted(features),
+        "adjustments": {k: [v[0], float(v[1])] for k, v in sorted((adjustments or {}).items())},
+    }
+
+
+def scenario_key(scenario):
+    """Hash of a scenario's definition, excluding its name"""
+    definition = {k: v for k, v in scenario.items() if k != "name"}
+    return hashlib.sha256(json.dumps(definition, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def baseline_forecast(lags, pipeline, predict, year, month):
+    """
+    Feature rows and forecasts of every supported series for one month
+
+    Parameters:
+    lags (pandas.DataFrame): Output of utils.build_series_lag_index
+    pipeline (FeaturePipeline): Feature pipeline for the model
+    predict (callable): Takes a feature DataFrame and returns predictions
+    year (int): Forecast year
+    month (int): Forecast month
+
+    Returns:
+    dict: "series" (location columns), "X" (feature rows) and "prediction" (numpy array)
+    """
+    series = lags.reset_index(drop=True)
+    series = series[pipeline.supported(series)].reset_index(drop=True)
+    columns = {c: series[c] for c in SERIES_COLUMNS}
+    columns.update(
+        month=np.full(len(series), month),
+        year=np.full(len(series), year),
+        **{c: series[c].to_numpy(dtype=np.float64) for c in LAG_FEATURES},
+    )
+    X = pipeline.frame(columns)
+    prediction = np.asarray(predict(X), dtype=np.float64) if len(X) else np.empty(0)
+    return {"series": series[SERIES_COLUMNS], "X": X, "prediction": prediction}
+
+
+def scenario_rows(series, scenario):
+    """
+    Positions of the series a scenario applies to
+
+    Parameters:
+    series (pandas.DataFrame): The baseline's location columns
+    scenario (dict): The scenario
+
+    Returns:
+    numpy.ndarray: Row positions
+    """
+    mask = np.ones(len(series), dtype=bool)
+    for column, field in FILTERS.items():
+        if scenario[field]:
+            mask &= series[column].isin(scenario[field]).to_numpy()
+    return np.flatnonzero(mask)
+
+
+def perturb(X, scenario):
+    """
+    Apply a scenario's perturbations to feature rows
+
+    Parameters:
+    X (pandas.DataFrame): Feature rows of the affected series
+    scenario (dict): The scenario
+
+    Returns:
+    pandas.DataFrame: Perturbed copy
+    """
+    X = X.copy()
+    if scenario["demand_change"]:
+        factor = max(0.0, 1.0 + scenario["demand_change"])
+        for feature in scenario["features"]:
+            X[feature] = X[feature].to_numpy() * factor
+    for feature, (operation, amount) in scenario["adjustments"].items():
+        X[feature] = OPERATIONS[operation](X[feature].to_numpy(dtype=np.float64), amount)
+    if "quarter" in X and "month" in scenario["adjustments"]:
+        X["quarter"] = (X["month"].to_numpy() - 1) // 3 + 1
+    return X
+
+
+def run_scenario(baseline, scenario, predict):
+    """
+    Forecast the affected series under a scenario and diff them against the baseline
+
+    Parameters:
+    baseline (dict): Output of baseline_forecast
+    scenario (dict): The scenario
+    predict (callable): Takes a feature DataFrame and returns predictions
+
+    Returns:
+    pandas.DataFrame: One row per affected series with the location columns, baseline,
+        scenario and change
+    """
+    rows = scenario_rows(baseline["series"], scenario)
+    X = perturb(baseline["X"].iloc[rows], scenario)
+    predicted = np.asarray(predict(X), dtype=np.float64) if len(rows) else np.empty(0)
+    result = baseline["series"].iloc[rows].reset_index(drop=True)
+    result["baseline"] = baseline["prediction"][rows]
+    result["scenario"] = predicted
+    result["change"] = predicted - result["baseline"].to_numpy()
+    return result
+
+
+def compare_scenarios(results, by=None):
+    """
+    Side-by-side totals of several scenario results
+
+    Parameters:
+    results (dict): Scenario name -> output of run_scenario
+    by (str): Also break the totals down by this column, e.g. "county_name"
+
+    Returns:
+    pandas.DataFrame: Series, baseline, scenario, change and change % per scenario (and group)
+    """
+    frames = []
+    for name, result in results.items():
+        keys = [by] if by else []
+        grouped = result.assign(series=1).groupby(keys, observed=True) if keys else result.assign(series=1)
+        totals = grouped[["series", "baseline", "scenario", "change"]].sum()
+        totals = totals.reset_index() if keys else totals.to_frame().T
+        totals.insert(0, "Scenario", name)
+        frames.append(totals)
+    if not frames:
+        return pd.DataFrame(columns=["Scenario", "series", "baseline", "scenario", "change", "change_pct"])
+    table = pd.concat(frames, ignore_index=True)
+    table["series"] = table["series"].astype(int)
+    table["change_pct"] = 100 * table["change"] / table["baseline"].where(table["baseline"] != 0)
+    return table
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    import joblib
+
+    from data_store import prepare_shared_dataset, read_arrow_dataset
+    from features import FeaturePipeline
+    from model_store import ensure_model_files
+    from utils import build_series_lag_index
+
+    parser = argparse.ArgumentParser(description="Forecast one month under a demand scenario")
+    parser.add_argument("--year", type=int, required=True)
+    parser.add_argument("--month", type=int, required=True)
+    parser.add_argument("--demand-change", type=float, default=0.0, help="Percent change of recent demand")
+    parser.add_argument("--county", action="append", default=[])
+    parser.add_argument("--commodity", action="append", default=[])
+    parser.add_argument("--facility", action="append", default=[])
+    parser.add_argument("--out", help="Write the per-series results to this CSV file")
+    args = parser.parse_args()
+
+    model_path, encoder_path = ensure_model_files()
+    if not model_path or not encoder_path:
+        raise SystemExit("Model files are not available")
+    model = joblib.load(model_path)
+    pipeline = FeaturePipeline(joblib.load(encoder_path), getattr(model, "feature_names_in_", None))
+    df = read_arrow_dataset(prepare_shared_dataset())
+
+    started = time.perf_counter()
+    baseline = baseline_forecast(build_series_lag_index(df), pipeline, model.predict, args.year, args.month)
+    scenario = make_scenario("scenario", args.county, args.commodity, args.facility, args.demand_change / 100)
+    result = run_scenario(baseline, scenario, model.predict)
+    print(f"Forecast {len(baseline['X']):,} series, {len(result):,} affected, "
+          f"in {time.perf_counter() - started:.1f}s\n")
+    with pd.option_context("display.width", 120, "display.float_format", "{:,.1f}".format):
+        print(compare_scenarios({"scenario": result}, by="county_name").to_string(index=False))
+    if args.out:
+        result.to_csv(args.out, index=False)
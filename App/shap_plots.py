@@ -0,0 +1,121 @@
+"""
+Plotly versions of the SHAP waterfall and summary plots
+
+Built from plain SHAP arrays, so the figures can be cached and sent to
+the browser as JSON. No matplotlib figure is rasterised on each rerun.
+"""
+import numpy as np
+import plotly.graph_objects as go
+
+INCREASE_COLOR = "#ff0051"  # SHAP's red: pushes the prediction higher
+DECREASE_COLOR = "#008bfb"  # SHAP's blue: pushes the prediction lower
+
+
+def _format_value(value):
+    return f"{value:,.0f}" if float(value).is_integer() else f"{value:,.3g}"
+
+
+def waterfall_figure(values, base_value, data, feature_names, max_display=10):
+    """
+    Waterfall of one prediction's feature contributions, largest first
+
+    Parameters:
+    values (numpy.ndarray): SHAP values for one row
+    base_value (float): Expected model output
+    data (numpy.ndarray): Feature values of the row
+    feature_names (list): Feature names in the same order
+    max_display (int): Features shown; the rest are merged into one bar
+
+    Returns:
+    plotly.graph_objects.Figure: The waterfall chart
+    """
+    values = np.asarray(values, dtype=float)
+    order = np.argsort(-np.abs(values))
+    shown = order[:max_display - 1] if len(order) > max_display else order
+    rest = np.setdiff1d(order, shown)
+
+    labels = [f"{_format_value(data[i])} = {feature_names[i]}" for i in shown]
+    contributions = list(values[shown])
+    if len(rest):
+        labels.append(f"{len(rest)} other features")
+        contributions.append(float(values[rest].sum()))
+
+    # Plotted bottom-up so the largest contribution ends up at the top, next to f(x)
+    labels, contributions = labels[::-1], contributions[::-1]
+    prediction = base_value + float(values.sum())
+    fig = go.Figure(go.Waterfall(
+        orientation="h",
+        base=base_value,
+        measure=["relative"] * len(contributions),
+        y=labels,
+        x=contributions,
+        text=[f"{c:+,.2f}" for c in contributions],
+        textposition="outside",
+        increasing=dict(marker=dict(color=INCREASE_COLOR)),
+        decreasing=dict(marker=dict(color=DECREASE_COLOR)),
+        connector=dict(line=dict(color="#bbb", width=1)),
+    ))
+    fig.add_vline(x=base_value, line_dash="dot", line_color="#888",
+                  annotation_text=f"E[f(X)] = {base_value:,.2f}", annotation_position="bottom")
+    fig.add_vline(x=prediction, line_dash="dot", line_color="#2c3e50",
+                  annotation_text=f"f(x) = {prediction:,.2f}", annotation_position="top")
+    fig.update_layout(
+        title="SHAP Waterfall Plot - Feature Contributions",
+        xaxis_title="Model output",
+        plot_bgcolor="rgba(255,255,255,0.9)",
+        paper_bgcolor="rgba(255,255,255,0)",
+        font=dict(color="#2c3e50"),
+        height=120 + 32 * len(contributions),
+        margin=dict(l=20, r=20, t=60, b=40),
+        showlegend=False,
+    )
+    return fig
+
+
+def summary_figure(values, data, feature_names):
+    """
+    Beeswarm-style summary: one point per row and feature, coloured by feature value
+
+    Parameters:
+    values (numpy.ndarray): SHAP values, one row per explained sample
+    data (numpy.ndarray): Feature values with the same shape
+    feature_names (list): Feature names
+
+    Returns:
+    plotly.graph_objects.Figure: The summary chart
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    data = np.atleast_2d(np.asarray(data, dtype=float))
+    # Most important feature at the top
+    order = np.argsort(np.abs(values).mean(axis=0))
+
+    # Feature values scaled per feature to 0..1 for the colour scale, as shap does
+    low, high = data.min(axis=0), data.max(axis=0)
+    span = np.where(high > low, high - low, 1.0)
+    scaled = np.where(high > low, (data - low) / span, 0.5)
+
+    fig = go.Figure()
+    for rank, i in enumerate(order):
+        fig.add_trace(go.Scatter(
+            x=values[:, i],
+            y=np.full(len(values), rank),
+            mode="markers",
+            marker=dict(size=10, color=scaled[:, i], colorscale=[[0, DECREASE_COLOR], [1, INCREASE_COLOR]],
+                        cmin=0, cmax=1, showscale=rank == len(order) - 1,
+                        colorbar=dict(title="Feature value", tickvals=[0, 1], ticktext=["Low", "High"])),
+            customdata=data[:, i],
+            hovertemplate=f"{feature_names[i]} = %{{customdata}}<br>SHAP value: %{{x:+,.3f}}<extra></extra>",
+        ))
+    fig.add_vline(x=0, line_color="#888", line_width=1)
+    fig.update_layout(
+        title="SHAP Summary Plot",
+        xaxis_title="SHAP value (impact on model output)",
+        yaxis=dict(tickvals=list(range(len(order))), ticktext=[feature_names[i] for i in order]),
+        plot_bgcolor="rgba(255,255,255,0.9)",
+        paper_bgcolor="rgba(255,255,255,0)",
+        font=dict(color="#2c3e50"),
+        height=120 + 30 * len(order),
+        margin=dict(l=20, r=20, t=60, b=40),
+        showlegend=False,
+    )
+    return fig
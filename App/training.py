@@ -0,0 +1,331 @@
+"""
+Retrain the demand model as new months arrive
+
+The training rows are built from the columnar (Arrow) store with the same
+as-of lag features the app and the backtest use: lag_1, lag_3 and
+rolling_mean_3 from the three records before each one. The last months
+are held out as a time-based validation split. The candidate is scored on
+them next to the model currently served, then refitted on all months and
+registered as a new model version (model_store.register_model). It is
+promoted only if it is at least as accurate as the current model, unless
+forced. The app picks the promoted version up on the next rerun.
+
+Estimators:
+- hist: HistGradientBoostingRegressor. Bins the features once and uses all
+  cores, so it scales to the full national dataset on one machine.
+- gb: GradientBoostingRegressor, the estimator of the published model.
+  Single-threaded; use --max-rows to train it on a sample.
+
+Both are served by the app. The compiled inference backend
+(compiled_model) only flattens gb models; hist models are predicted with
+model.predict, and the Feature Importance tab shows permutation
+importances for them.
+
+With --warm-start the current model and encoder are kept and more trees
+are added on the new data. Rows with locations the current encoder does
+not know are left out. The base model has already seen the months it was
+trained on, so the candidate is validated only on later months.
+
+The data comes from the shared Arrow file; --refresh downloads the CSV
+again and rebuilds the file first, so new months are trained on.
+
+Usage:
+    python App/training.py --refresh --estimator hist --validation-months 6
+    python App/training.py --warm-start --extra-estimators 50
+    python App/training.py --list
+    python App/training.py --promote 20240701-120000-000000
+"""
+import copy
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import GradientBoostingRegressor, HistGradientBoostingRegressor
+from sklearn.preprocessing import OrdinalEncoder
+
+from backtest import accuracy_table, backtest_features
+from compiled_model import load_predictor
+from features import CATEGORICAL_FEATURES, FeaturePipeline
+
+ESTIMATORS = ["hist", "gb"]
+VALIDATION_MONTHS = 6
+# A candidate may be this much worse (relative WAPE) than the current model and still be promoted
+PROMOTION_TOLERANCE = 0.0
+
+DEFAULT_PARAMS = {
+    "hist": {"max_iter": 300, "learning_rate": 0.1, "max_leaf_nodes": 63, "min_samples_leaf": 50,
+             "l2_regularization": 1.0, "early_stopping": False, "random_state": 0},
+    "gb": {"n_estimators": 200, "learning_rate": 0.1, "max_depth": 5, "subsample": 0.8, "random_state": 0},
+}
+
+
+def fit_encoder(df):
+    """
+    Fit a category encoder on every location and commodity in the data
+
+    Unknown categories encode as -1 instead of raising, so locations that
+    appear after training can still be predicted.
+
+    Parameters:
+    df (pandas.DataFrame): The dataset
+
+    Returns:
+    OrdinalEncoder: The fitted encoder
+    """
+    series = df[CATEGORICAL_FEATURES].drop_duplicates()
+    encoder = OrdinalEncoder(handle_unknown="use_encoded_value", unknown_value=-1)
+    return encoder.fit(series)
+
+
+def new_estimator(estimator, params=None):
+    """
+    An unfitted estimator with the default parameters, overridden by params
+
+    Parameters:
+    estimator (str): "hist" or "gb"
+    params (dict): Parameter overrides
+
+    Returns:
+    object: The sklearn estimator
+    """
+    classes = {"hist": HistGradientBoostingRegressor, "gb": GradientBoostingRegressor}
+    if estimator not in classes:
+        raise ValueError(f"Unknown estimator: {estimator}")
+    return classes[estimator](**dict(DEFAULT_PARAMS[estimator], **(params or {})))
+
+
+def warm_start_estimator(model, extra_estimators):
+    """
+    Copy of a fitted model set up to add more trees on the next fit
+
+    Parameters:
+    model: Fitted GradientBoostingRegressor or HistGradientBoostingRegressor
+    extra_estimators (int): Trees (boosting iterations) to add
+
+    Returns:
+    object: The copy, with warm_start enabled
+    """
+    model = copy.deepcopy(model)
+    if isinstance(model, HistGradientBoostingRegressor):
+        return model.set_params(warm_start=True, max_iter=model.n_iter_ + extra_estimators)
+    if isinstance(model, GradientBoostingRegressor):
+        return model.set_params(warm_start=True, n_estimators=len(model.estimators_) + extra_estimators)
+    raise TypeError(f"Cannot warm start a {type(model).__name__}")
+
+
+def training_rows(df, pipeline, max_rows=None, seed=0):
+    """
+    Feature rows and targets for every record with three earlier values
+
+    Parameters:
+    df (pandas.DataFrame): The dataset
+    pipeline (FeaturePipeline): Feature pipeline of the encoder being trained
+    max_rows (int): Sample down to this many rows (None keeps all)
+    seed (int): Sampling seed
+
+    Returns:
+    tuple: (features DataFrame, results DataFrame with county_name, dataelement_name,
+        period and actual per row)
+    """
+    X, rows = backtest_features(df, pipeline, horizons=(1,))
+    if max_rows is not None and len(X) > max_rows:
+        keep = np.sort(np.random.default_rng(seed).choice(len(X), max_rows, replace=False))
+        X, rows = X.iloc[keep].reset_index(drop=True), rows.iloc[keep].reset_index(drop=True)
+    return X, rows.drop(columns="horizon")
+
+
+def time_split(periods, validation_months=VALIDATION_MONTHS):
+    """
+    Boolean mask of the validation rows: the last validation_months months
+
+    Parameters:
+    periods (pandas.Series): Period of each row
+    validation_months (int): Months held out
+
+    Returns:
+    numpy.ndarray: True for validation rows
+    """
+    cutoff = periods.max() - pd.DateOffset(months=validation_months)
+    return (periods > cutoff).to_numpy()
+
+
+def score(model, X, rows):
+    """Overall accuracy (n, MAE, MAPE, WAPE, Bias) of a model on feature rows"""
+    results = rows.assign(error=model.predict(X) - rows["actual"].to_numpy(), all="all")
+    return {k: float(v) for k, v in accuracy_table(results, ["all"]).iloc[0].drop("all").items()}
+
+
+def retrain(df, estimator="hist", params=None, validation_months=VALIDATION_MONTHS, warm_start=None,
+            extra_estimators=50, max_rows=None, current=None, base_cutoff=None, log=print):
+    """
+    Train a candidate model, validate it on the last months and refit it on all of them
+
+    Parameters:
+    df (pandas.DataFrame): The dataset
+    estimator (str): "hist" or "gb" (ignored when warm starting)
+    params (dict): Estimator parameter overrides
+    validation_months (int): Months held out for validation
+    warm_start (tuple): (model, encoder) to continue training instead of starting fresh
+    extra_estimators (int): Trees added when warm starting
+    max_rows (int): Train on a sample of this many rows
+    current (tuple): (model, encoder) currently served, scored on the same months for comparison
+    base_cutoff (str or Timestamp): Last month the warm_start model was trained on; only later
+        months are used for validation. If unknown, validation is marked in-sample.
+    log (callable): Progress messages
+
+    Returns:
+    tuple: (model, encoder, metadata dict)
+    """
+    started = time.perf_counter()
+    if warm_start is not None:
+        base_model, encoder = warm_start
+        make = lambda: warm_start_estimator(base_model, extra_estimators)
+        estimator = "hist" if isinstance(base_model, HistGradientBoostingRegressor) else "gb"
+    else:
+        encoder = fit_encoder(df)
+        make = lambda: new_estimator(estimator, params)
+    pipeline = FeaturePipeline(encoder, getattr(warm_start[0], "feature_names_in_", None) if warm_start else None)
+
+    X, rows = training_rows(df, pipeline, max_rows)
+    y = rows["actual"].to_numpy()
+    validation = time_split(rows["period"], validation_months)
+    in_sample = False
+    if warm_start is not None:
+        if base_cutoff is not None:
+            # Months the base model was trained on would score it (and the candidate) too well
+            validation = validation & (rows["period"] > pd.Timestamp(base_cutoff)).to_numpy()
+            if not validation.any():
+                raise ValueError(f"No months after the base model's training cutoff ({base_cutoff}) "
+                                 "to validate the warm-started model on")
+        else:
+            in_sample = True
+            log("The base model's training months are unknown, so the validation months may be "
+                "in-sample; the scores are biased in the candidate's favour")
+    if validation.all() or not validation.any():
+        raise ValueError(f"Not enough months to hold out {validation_months} for validation")
+    log(f"Built {len(X):,} training rows ({validation.sum():,} for validation) "
+        f"in {time.perf_counter() - started:.1f}s")
+
+    fit_started = time.perf_counter()
+    candidate = make().fit(X[~validation], y[~validation])
+    log(f"Fitted the candidate on months up to {rows['period'][~validation].max():%Y-%m} "
+        f"in {time.perf_counter() - fit_started:.1f}s")
+    metrics = {"candidate": score(candidate, X[validation], rows[validation])}
+
+    if current is not None:
+        current_model, current_encoder = current
+        current_pipeline = FeaturePipeline(current_encoder, getattr(current_model, "feature_names_in_", None))
+        # The same months, with features built through the current model's own encoder
+        current_X, current_rows = backtest_features(df, current_pipeline, horizons=(1,),
+                                                    start=rows["period"][validation].min())
+        if len(current_X):
+            metrics["current"] = score(current_model, current_X, current_rows)
+
+    for name, values in metrics.items():
+        log(f"  {name:<9} n={values['n']:,.0f} MAE={values['MAE']:,.2f} WAPE={values['WAPE']:.1f}% "
+            f"Bias={values['Bias']:+,.2f}")
+
+    fit_started = time.perf_counter()
+    model = make().fit(X, y)
+    log(f"Refitted on all {len(X):,} rows in {time.perf_counter() - fit_started:.1f}s")
+    # Logs a warning when the compiled inference backend cannot serve the model
+    compiled = load_predictor(model, "compiled") is not model
+
+    metadata = {
+        "estimator": estimator,
+        "params": {k: v for k, v in model.get_params().items() if np.isscalar(v) or v is None},
+        "warm_start": warm_start is not None,
+        "rows": int(len(X)),
+        "first_period": rows["period"].min(),
+        "last_period": rows["period"].max(),
+        "validation_months": validation_months,
+        "validation": metrics,
+        "validation_in_sample": in_sample,
+        "compiled": compiled,
+        "training_seconds": round(time.perf_counter() - started, 1),
+    }
+    return model, encoder, metadata
+
+
+def should_promote(metrics, tolerance=PROMOTION_TOLERANCE, in_sample=False):
+    """
+    Whether the candidate's validation WAPE is no worse than the current model's
+
+    A warm-started candidate validated on months its base model was trained
+    on (in_sample) looks better than it is, so it is never promoted
+    automatically; promote it by hand or with --force.
+
+    Parameters:
+    metrics (dict): The "validation" entry of the training metadata
+    tolerance (float): Allowed relative increase in WAPE
+    in_sample (bool): The "validation_in_sample" entry of the training metadata
+
+    Returns:
+    bool: True to promote
+    """
+    if in_sample:
+        return False
+    if "current" not in metrics or not np.isfinite(metrics["current"]["WAPE"]):
+        return True
+    return metrics["candidate"]["WAPE"] <= metrics["current"]["WAPE"] * (1 + tolerance)
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    import joblib
+
+    from data_store import prepare_shared_dataset, read_arrow_dataset
+    from model_store import (current_version, ensure_model_files, list_versions, promote_version,
+                             register_model, version_files)
+
+    parser = argparse.ArgumentParser(description="Retrain the demand model and register a new version")
+    parser.add_argument("--estimator", choices=ESTIMATORS, default="hist")
+    parser.add_argument("--params", type=json.loads, default=None,
+                        help='Estimator parameter overrides as JSON, e.g. \'{"max_iter": 500}\'')
+    parser.add_argument("--validation-months", type=int, default=VALIDATION_MONTHS)
+    parser.add_argument("--warm-start", action="store_true", help="Add trees to the current model")
+    parser.add_argument("--extra-estimators", type=int, default=50)
+    parser.add_argument("--max-rows", type=int, help="Train on a random sample of this many rows")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Download the data again and rebuild the shared Arrow file before training")
+    parser.add_argument("--force", action="store_true", help="Promote even if less accurate than the current model")
+    parser.add_argument("--no-promote", action="store_true", help="Register the version without serving it")
+    parser.add_argument("--list", action="store_true", help="List registered versions and exit")
+    parser.add_argument("--promote", metavar="VERSION",
+                        help='Serve a registered version and exit ("published" for the published model)')
+    args = parser.parse_args()
+
+    if args.list:
+        for entry in list_versions():
+            wape = entry.get("validation", {}).get("candidate", {}).get("WAPE", float("nan"))
+            print(f"{entry['version']}  {entry['estimator']:<4}  rows={entry['rows']:,}  "
+                  f"last={str(entry['last_period'])[:7]}  WAPE={wape:.1f}%")
+        raise SystemExit(0)
+    if args.promote:
+        promote_version(None if args.promote == "published" else args.promote)
+        print(f"Serving {args.promote}")
+        raise SystemExit(0)
+
+    model_path, encoder_path = ensure_model_files()
+    current = (joblib.load(model_path), joblib.load(encoder_path)) if model_path and encoder_path else None
+    if args.warm_start and current is None:
+        raise SystemExit("No current model to warm start from")
+    df = read_arrow_dataset(prepare_shared_dataset(refresh=args.refresh))
+
+    # Registered versions record their training months; the published model's are unknown
+    base_cutoff = None
+    if args.warm_start and current_version():
+        with open(version_files(current_version())[2], "r", encoding="utf-8") as f:
+            base_cutoff = json.load(f).get("last_period")
+
+    model, encoder, metadata = retrain(
+        df, args.estimator, args.params, args.validation_months,
+        warm_start=current if args.warm_start else None, extra_estimators=args.extra_estimators,
+        max_rows=args.max_rows, current=current, base_cutoff=base_cutoff,
+    )
+    promote = not args.no_promote and (
+        args.force or should_promote(metadata["validation"], in_sample=metadata["validation_in_sample"]))
+    version = register_model(model, encoder, metadata, promote=promote)
+    print(f"Registered version {version}" + (" and promoted it" if promote else " (not promoted)"))
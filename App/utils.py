@@ -1,34 +1,204 @@
+import numpy as np
 import pandas as pd
 
-def filter_data(df, county=None, sub_county=None, facility=None, commodities=None):
+# Categorical columns that get an inverted (value -> row positions) index
+INDEX_COLUMNS = ["county_name", "sub_county_name", "ward_name", "facility_name", "dataelement_name"]
+
+
+def build_location_index(df, columns=INDEX_COLUMNS):
     """
-    Filter the dataset based on selected location and commodities
-    
+    Build an inverted index over the categorical columns of the dataset
+
+    Parameters:
+    df (pandas.DataFrame): The dataset to index
+    columns (list): Categorical columns to index
+
+    Returns:
+    dict: Mapping of column -> {value: sorted numpy array of row positions}, plus "period"
+          -> output of build_period_index when the data is sorted by period
+    """
+    index = {}
+    for column in columns:
+        if column in df.columns:
+            # groupby().indices gives positional (not label) row numbers, already sorted
+            index[column] = df.groupby(column, sort=False, observed=True).indices
+    if "period" in df.columns:
+        period_index = build_period_index(df)
+        if period_index is not None:
+            index["period"] = period_index
+    return index
+
+
+def build_period_index(df):
+    """
+    Map each period to its block of rows in data sorted by period
+
+    Parameters:
+    df (pandas.DataFrame): The dataset, sorted by period with missing periods last
+
+    Returns:
+    dict or None: "periods" (sorted unique datetime64 values) and "offsets" (first row of each
+                  period, plus the end of the last block), or None if the data is not sorted
+    """
+    period = df["period"].to_numpy()
+    dated = len(period) - int(np.isnat(period).sum())
+    values = period[:dated]
+    if np.isnat(values).any() or (dated > 1 and (values[1:] < values[:-1]).any()):
+        return None
+    starts = np.flatnonzero(values[1:] != values[:-1]) + 1
+    offsets = np.concatenate([[0], starts, [dated]]) if dated else np.array([0])
+    return {"periods": values[offsets[:-1]], "offsets": offsets}
+
+
+def period_bounds(period_index, start=None, end=None):
+    """
+    Row range holding the periods from start to end (both inclusive)
+
+    Parameters:
+    period_index (dict): Output of build_period_index
+    start (Timestamp): First period (None for the earliest)
+    end (Timestamp): Last period (None for the latest)
+
+    Returns:
+    tuple: (first row, end row) to use as a slice
+    """
+    periods, offsets = period_index["periods"], period_index["offsets"]
+    lo = 0 if start is None else np.searchsorted(periods, np.datetime64(start, "ns"), side="left")
+    hi = len(periods) if end is None else np.searchsorted(periods, np.datetime64(end, "ns"), side="right")
+    return int(offsets[lo]), int(offsets[max(lo, hi)])
+
+
+def _intersect_sorted(small, large):
+    """Intersect two sorted position arrays in O(len(small) * log(len(large)))"""
+    if len(small) == 0 or len(large) == 0:
+        return small[:0]
+    pos = np.searchsorted(large, small)
+    pos[pos == len(large)] = 0
+    return small[large[pos] == small]
+
+
+def filter_rows(index, county=None, sub_county=None, ward=None, facility=None, commodities=None,
+                start=None, end=None):
+    """
+    Resolve a filter to row positions using the inverted index, without touching the data
+
+    A time range needs the period index (data sorted by period). It is a
+    block of rows, so on its own it resolves to a slice, and with location
+    filters it trims their sorted positions with two binary searches.
+
+    Parameters:
+    index (dict): Inverted index from build_location_index
+    county (str): County name filter
+    sub_county (str): Sub-county name filter
+    ward (str): Ward name filter
+    facility (str): Facility name filter
+    commodities (list or str): Commodity or list of commodities to include
+    start (Timestamp): First period to include
+    end (Timestamp): Last period to include
+
+    Returns:
+    numpy.ndarray, slice or None: Sorted row positions, a slice for a time range alone,
+                                  or None if no filter was applied
+    """
+    empty = np.array([], dtype=np.intp)
+    selections = []
+    for column, value in (("county_name", county), ("sub_county_name", sub_county),
+                          ("ward_name", ward), ("facility_name", facility)):
+        # A missing location (NaN) selects nothing, like an empty one
+        if value and not pd.isna(value):
+            selections.append(index[column].get(value, empty))
+
+    if commodities:
+        if isinstance(commodities, str):
+            commodities = [commodities]
+        parts = [index["dataelement_name"][c] for c in commodities if c in index["dataelement_name"]]
+        if len(parts) == 1:
+            selections.append(parts[0])
+        else:
+            selections.append(np.sort(np.concatenate(parts)) if parts else empty)
+
+    bounds = None
+    if start is not None or end is not None:
+        bounds = period_bounds(index["period"], start, end)
+
+    if not selections:
+        return slice(*bounds) if bounds else None
+
+    # Start from the most selective array so the cost follows the result size
+    selections.sort(key=len)
+    rows = selections[0]
+    for other in selections[1:]:
+        rows = _intersect_sorted(rows, other)
+    if bounds:
+        rows = rows[np.searchsorted(rows, bounds[0]):np.searchsorted(rows, bounds[1])]
+    return rows
+
+
+def filter_data(df, county=None, sub_county=None, facility=None, commodities=None, ward=None, index=None,
+                start=None, end=None):
+    """
+    Filter the dataset based on selected location, commodities and time range
+
+    The base frame is never copied: the filters are resolved to row positions
+    through the inverted index and only the matching rows are taken. A time
+    range alone is a slice of the period-sorted data.
+
     Parameters:
     df (pandas.DataFrame): The dataset to filter
     county (str): County name filter
     sub_county (str): Sub-county name filter
     facility (str): Facility name filter
     commodities (list): List of commodities to include
-    
+    ward (str): Ward name filter
+    index (dict): Precomputed index from build_location_index, built once per data version
+    start (Timestamp): First period to include
+    end (Timestamp): Last period to include
+
     Returns:
     pandas.DataFrame: Filtered dataframe
+
+    Raises:
+    ValueError: If no index is given
     """
-    filtered_df = df.copy()
-    
-    if county:
-        filtered_df = filtered_df[filtered_df["county_name"] == county]
-    
-    if sub_county:
-        filtered_df = filtered_df[filtered_df["sub_county_name"] == sub_county]
-        
-    if facility:
-        filtered_df = filtered_df[filtered_df["facility_name"] == facility]
-        
-    if commodities:
-        filtered_df = filtered_df[filtered_df["dataelement_name"].isin(commodities)]
-        
-    return filtered_df
+    if index is None:
+        # Building the index is a pass over the whole table, which the index exists to avoid
+        raise ValueError("filter_data needs the location index of df (utils.build_location_index)")
+
+    ranged = start is not None or end is not None
+    if ranged and "period" not in index:
+        # Data not sorted by period: fall back to a mask on the location-filtered rows
+        filtered = filter_data(df, county, sub_county, facility, commodities, ward, index)
+        period = filtered["period"]
+        keep = period.notna()
+        if start is not None:
+            keep &= period >= start
+        if end is not None:
+            keep &= period <= end
+        return filtered[keep]
+
+    rows = filter_rows(index, county=county, sub_county=sub_county, ward=ward,
+                       facility=facility, commodities=commodities, start=start, end=end)
+    if rows is None:
+        return df
+    if isinstance(rows, slice):
+        return df.iloc[rows]
+    return df.take(rows)
+
+
+def period_range(df, index=None):
+    """
+    Sorted unique periods of the dataset, for time range selectors
+
+    Parameters:
+    df (pandas.DataFrame): The dataset
+    index (dict): Precomputed index from build_location_index
+
+    Returns:
+    pandas.DatetimeIndex: The periods
+    """
+    if index is not None and "period" in index:
+        return pd.DatetimeIndex(index["period"]["periods"])
+    return pd.DatetimeIndex(np.sort(df["period"].dropna().unique()))
 
 
 def calculate_lag_features(df, period_col="period", value_col="value", n_lags=12):
@@ -66,4 +236,88 @@ def calculate_lag_features(df, period_col="period", value_col="value", n_lags=12
         "lag_1": lag_1,
         "lag_3": lag_3,
         "rolling_mean_3": rolling_mean_3
-    }
\ No newline at end of file
+    }
+
+
+# GeoJSON COUNTY_NAM spellings that differ from the dataset's county names
+GEOJSON_COUNTY_FIXES = {
+    "ELEGEYO-MARAKWET": "ELGEYO MARAKWET",
+    "MURANG'A": "MURANGA",
+    "THARAKA - NITHI": "THARAKA NITHI",
+}
+
+
+def county_key(county_names):
+    """
+    Upper-case county names without the " County" suffix, as used to match the Kenya GeoJSON
+
+    Parameters:
+    county_names (pandas.Series): County names from the dataset
+
+    Returns:
+    pandas.Series: The keys
+    """
+    return county_names.astype(str).str.replace(" County", "", case=False).str.upper()
+
+
+def geojson_county_key(feature):
+    """Key of a Kenya GeoJSON feature, comparable with county_key"""
+    name = (feature["properties"].get("COUNTY_NAM") or "").upper()
+    return GEOJSON_COUNTY_FIXES.get(name, name)
+
+
+# Columns identifying one facility x commodity series, in encoder order
+SERIES_COLUMNS = ["county_name", "sub_county_name", "ward_name", "facility_name", "dataelement_name"]
+
+
+def series_options(series, column, **selected):
+    """
+    Sorted values of one location column among the series matching the selection so far
+
+    Parameters:
+    series (pandas.DataFrame): One row per series, e.g. from features.supported_series
+    column (str): Column to list, e.g. "facility_name"
+    selected: Values already chosen, by column name (e.g. county_name="Nairobi County")
+
+    Returns:
+    list: The options
+    """
+    mask = np.ones(len(series), dtype=bool)
+    for name, value in selected.items():
+        if not pd.isna(value):
+            mask &= (series[name] == value).to_numpy()
+    # Series with a missing location are kept, but NaN is not an option (and cannot be sorted with names)
+    return sorted(series.loc[mask, column].dropna().unique())
+
+
+def build_series_lag_index(df):
+    """
+    Latest lag features and location of every facility x commodity series
+
+    Uses the same rules as calculate_lag_features (last, third-last and the
+    mean of the last three values), computed for all series in one pass.
+
+    Parameters:
+    df (pandas.DataFrame): The dataset
+
+    Returns:
+    pandas.DataFrame: One row per series, indexed by (facility_name, dataelement_name),
+                      with the location columns, lag_1, lag_3, rolling_mean_3 and last_period
+    """
+    data = df.sort_values(SERIES_COLUMNS + ["period"], kind="stable")
+    # dropna=False keeps series with a missing location name (e.g. no ward) as series of their own
+    grouped = data.groupby(SERIES_COLUMNS, sort=False, observed=True, dropna=False)
+    from_end = grouped.cumcount(ascending=False).to_numpy()
+    values = data["value"].to_numpy()
+
+    last = data.loc[from_end == 0, SERIES_COLUMNS + ["period"]].rename(columns={"period": "last_period"})
+    last["lag_1"] = values[from_end == 0]
+    counts = grouped["value"].size().to_numpy()
+    has_three = counts >= 3
+    third = np.zeros(len(last))
+    third[has_three] = values[from_end == 2]
+    last["lag_3"] = third
+    window = np.where(from_end < 3, values, 0.0)
+    sums = pd.Series(window).groupby(grouped.ngroup().to_numpy(), sort=True).sum().to_numpy()
+    last["rolling_mean_3"] = np.where(has_three, sums / 3, 0.0)
+    return last.set_index(["facility_name", "dataelement_name"], drop=False).sort_index()
@@ -78,13 +78,86 @@
 
 import streamlit as st
 import plotly.express as px
+from utils import filter_data, period_range
+from widgets import time_range_slider
+from instrumentation import instrumented, span
+from memo import data_version, memo_cache
 
-def show_visualizations_page(df):
+# Selections whose options, series and figures are kept per process
+MAX_CACHED_SELECTIONS = 128
+
+def time_series_figure(filtered_df, facility):
+    """Line chart of a facility's total dispensed units per period"""
+    with span("visualizations.time_series"):
+        time_series = filtered_df.groupby("period")["value"].sum().reset_index()
+    fig = px.line(
+        time_series, x="period", y="value", markers=True,
+        title=f"Dispensed Units Over Time ({facility})",
+        labels={"value": "Dispensed Units", "period": "Period"}
+    )
+    
+    # Enhance chart styling
+    fig.update_layout(
+        plot_bgcolor="rgba(255,255,255,0.9)",
+        paper_bgcolor="rgba(255,255,255,0)",
+        font=dict(color="#2c3e50"),
+        title_font=dict(size=20, color="#2c3e50"),
+        xaxis=dict(showgrid=True, gridcolor="#eee"),
+        yaxis=dict(showgrid=True, gridcolor="#eee"),
+        margin=dict(l=20, r=20, t=60, b=20),
+    )
+    
+    # Enhance line style
+    fig.update_traces(
+        line=dict(width=3, color="#4CAF50"),
+        marker=dict(size=8, color="#4CAF50")
+    )
+    return fig
+
+def commodity_trend_figure(filtered_df, commodities):
+    """Line chart of the selected commodities' dispensed units per period"""
+    with span("visualizations.commodity_trend"):
+        commodity_df = filtered_df[filtered_df["dataelement_name"].isin(commodities)]
+        commodity_trend = commodity_df.groupby(["period", "dataelement_name"], observed=True)["value"].sum().reset_index()
+
+    fig = px.line(
+        commodity_trend, x="period", y="value", color="dataelement_name",
+        markers=True,
+        labels={"value": "Dispensed Units", "period": "Period", "dataelement_name": "Commodity"}
+    )
+    
+    # Enhance chart styling
+    fig.update_layout(
+        plot_bgcolor="rgba(255,255,255,0.9)",
+        paper_bgcolor="rgba(255,255,255,0)",
+        font=dict(color="#2c3e50"),
+        xaxis=dict(showgrid=True, gridcolor="#eee"),
+        yaxis=dict(showgrid=True, gridcolor="#eee"),
+        legend_title_font=dict(size=14),
+        legend=dict(
+            bgcolor="rgba(255,255,255,0.8)",
+            bordercolor="#dddddd",
+            borderwidth=1,
+            orientation="h"
+        ),
+        margin=dict(l=20, r=20, t=20, b=20),
+    )
+    
+    # Enhance line style
+    fig.update_traces(
+        line=dict(width=2.5),
+        marker=dict(size=6)
+    )
+    return fig
+
+@instrumented("page.visualizations")
+def show_visualizations_page(df, index=None):
     """
     Display the visualizations page with interactive charts and filters
     
     Parameters:
     df (pandas.DataFrame): The dataset to visualize
+    index (dict): Precomputed location index from utils.build_location_index
     """
     # Apply custom header with gradient background
     st.markdown("""
@@ -109,23 +182,35 @@ def show_visualizations_page(df):
         <div style="background-color: white; padding: 2px; border-radius: 10px; box-shadow: 0 4px 12px rgba(0,0,0,0.1); margin-bottom: 5px;">
         """, unsafe_allow_html=True)
         
+        # Options, series and figures of a selection are computed once per process
+        cache = memo_cache("visualizations", max_entries=MAX_CACHED_SELECTIONS)
+        version = data_version(df)
+        
         # Tab Filters for County, Sub-County, Facility
         tab1, tab2, tab3 = st.tabs(["County", "Sub-County", "Facility"])
 
         with tab1:
-            selected_county = st.selectbox("Select County", df["county_name"].unique())
-
-        filtered_df = df[df["county_name"] == selected_county]
+            selected_county = st.selectbox("Select County", cache.get_or_compute(
+                ("counties", version), lambda: df["county_name"].unique()))
 
         with tab2:
-            selected_sub_county = st.selectbox("Select Sub-County", filtered_df["sub_county_name"].unique())
-
-        filtered_df = filtered_df[filtered_df["sub_county_name"] == selected_sub_county]
+            selected_sub_county = st.selectbox("Select Sub-County", cache.get_or_compute(
+                ("sub_counties", version, selected_county),
+                lambda: filter_data(df, county=selected_county, index=index)["sub_county_name"].unique()))
 
         with tab3:
-            selected_facility = st.selectbox("Select Facility", filtered_df["facility_name"].unique())
+            selected_facility = st.selectbox("Select Facility", cache.get_or_compute(
+                ("facilities", version, selected_county, selected_sub_county),
+                lambda: filter_data(df, county=selected_county, sub_county=selected_sub_county,
+                                    index=index)["facility_name"].unique()))
+
+        start, end = time_range_slider(period_range(df, index), key="viz_time_range")
 
-        filtered_df = filtered_df[filtered_df["facility_name"] == selected_facility]
+        selection = (version, selected_county, selected_sub_county, selected_facility, start, end)
+        filtered_df = cache.get_or_compute(
+            ("rows",) + selection,
+            lambda: filter_data(df, county=selected_county, sub_county=selected_sub_county,
+                                facility=selected_facility, index=index, start=start, end=end))
         
         st.markdown("</div>", unsafe_allow_html=True)  # Close the card container
 
@@ -136,32 +221,12 @@ def show_visualizations_page(df):
         """, unsafe_allow_html=True)
         
         # Visualizing Dispensed Units Over Time
-        time_series = filtered_df.groupby("period")["value"].sum().reset_index()
-        fig = px.line(
-            time_series, x="period", y="value", markers=True,
-            title=f"Dispensed Units Over Time ({selected_facility})",
-            labels={"value": "Dispensed Units", "period": "Period"}
-        )
-        
-        # Enhance chart styling
-        fig.update_layout(
-            plot_bgcolor="rgba(255,255,255,0.9)",
-            paper_bgcolor="rgba(255,255,255,0)",
-            font=dict(color="#2c3e50"),
-            title_font=dict(size=20, color="#2c3e50"),
-            xaxis=dict(showgrid=True, gridcolor="#eee"),
-            yaxis=dict(showgrid=True, gridcolor="#eee"),
-            margin=dict(l=20, r=20, t=60, b=20),
-        )
-        
-        # Enhance line style
-        fig.update_traces(
-            line=dict(width=3, color="#4CAF50"),
-            marker=dict(size=8, color="#4CAF50")
-        )
+        fig = cache.get_or_compute(("time_series",) + selection,
+                                   lambda: time_series_figure(filtered_df, selected_facility))
         
         # Make plotly chart use the full width
-        st.plotly_chart(fig, use_container_width=True)
+        with span("visualizations.plot"):
+            st.plotly_chart(fig, use_container_width=True)
         
         st.markdown("</div>", unsafe_allow_html=True)  # Close the card container
 
@@ -175,7 +240,8 @@ def show_visualizations_page(df):
         
         # Use columns to display checkboxes more efficiently
         checkbox_cols = st.columns(3)
-        unique_commodities = filtered_df["dataelement_name"].unique()
+        unique_commodities = cache.get_or_compute(("commodities",) + selection,
+                                                  lambda: filtered_df["dataelement_name"].unique())
         selected_commodities = []
         
         for i, commodity in enumerate(unique_commodities):
@@ -192,40 +258,12 @@ def show_visualizations_page(df):
             </div>
             """, unsafe_allow_html=True)
             
-            commodity_df = filtered_df[filtered_df["dataelement_name"].isin(selected_commodities)]
-            commodity_trend = commodity_df.groupby(["period", "dataelement_name"])["value"].sum().reset_index()
-
-            fig = px.line(
-                commodity_trend, x="period", y="value", color="dataelement_name",
-                markers=True,
-                labels={"value": "Dispensed Units", "period": "Period", "dataelement_name": "Commodity"}
-            )
-            
-            # Enhance chart styling
-            fig.update_layout(
-                plot_bgcolor="rgba(255,255,255,0.9)",
-                paper_bgcolor="rgba(255,255,255,0)",
-                font=dict(color="#2c3e50"),
-                xaxis=dict(showgrid=True, gridcolor="#eee"),
-                yaxis=dict(showgrid=True, gridcolor="#eee"),
-                legend_title_font=dict(size=14),
-                legend=dict(
-                    bgcolor="rgba(255,255,255,0.8)",
-                    bordercolor="#dddddd",
-                    borderwidth=1,
-                    orientation="h"
-                ),
-                margin=dict(l=20, r=20, t=20, b=20),
-            )
-            
-            # Enhance line style
-            fig.update_traces(
-                line=dict(width=2.5),
-                marker=dict(size=6)
-            )
+            fig = cache.get_or_compute(("commodity_trend",) + selection + (tuple(selected_commodities),),
+                                       lambda: commodity_trend_figure(filtered_df, selected_commodities))
             
             # Make plotly chart use the full width
-            st.plotly_chart(fig, use_container_width=True)
+            with span("visualizations.plot"):
+                st.plotly_chart(fig, use_container_width=True)
         else:
             st.markdown("""
             <div style="background-color: #fff3e0; padding: 2px; border-radius: 8px; margin: 5px 0; border-left: 4px solid #FF9800; text-align: center;">
@@ -247,7 +285,8 @@ def show_visualizations_page(df):
             if 'Unnamed: 0' in display_df.columns:
                 display_df = display_df.drop("Unnamed: 0", axis=1)
             display_df = display_df.reset_index(drop=True)
-            st.dataframe(display_df.sort_values("period"), use_container_width=True)
+            with span("visualizations.raw_data"):
+                st.dataframe(display_df.sort_values("period"), use_container_width=True)
             
         st.markdown("</div>", unsafe_allow_html=True)  # Close the card container
         
@@ -0,0 +1,238 @@
+"""
+Cache warm-up after a deploy
+
+Without a warm-up, the first sessions after a start pay for every cold
+cache: the data download and parse, the model download and load, the
+location index, the page imports, the map geometry, the home page
+aggregates, the inference pool with its SHAP explainers and the
+forecasts behind the briefs. warm_up()
+fills them in that order and reports how long each step took.
+
+Streamlit's caches live in the server process, so the warm-up has to run
+in it. The serve command starts the warm-up on a background thread and
+then runs the Streamlit server in the same process. A session that
+arrives before the warm-up finishes waits for the step in progress
+instead of starting it again (Streamlit computes each cached value once).
+
+Run without serve, the warm-up runs once in its own process and prints
+its timings. As a release step this checks that the data and the model
+can be fetched and loaded before the release goes live, and leaves the
+downloaded files on hosts whose disk the web process shares.
+
+Usage:
+    python App/warmup.py serve --server.port $PORT --server.address=0.0.0.0
+    python App/warmup.py --steps data model
+"""
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+MAIN_SCRIPT = os.path.join(APP_DIR, "main.py")
+
+logger = logging.getLogger("fp.warmup")
+
+
+def _data(state):
+    from data_store import load_data
+    from model_store import prefetch_model_files
+    # The model files download while the data loads, as on a normal first run
+    prefetch_model_files()
+    state["df"] = load_data()
+    return f"{len(state['df']):,} rows"
+
+
+def _model(state):
+    from model_store import load_feature_pipeline, load_model_artifacts, model_version
+    load_model_artifacts()
+    load_feature_pipeline()
+    return f"version {model_version()}"
+
+
+def _index(state):
+    from data_store import load_location_index, load_series_lags
+    from model_store import load_supported_series
+    state["index"] = load_location_index()
+    load_series_lags(state["df"])
+    series = load_supported_series(state["df"])
+    return f"{len(series):,} series"
+
+
+def _pages(state):
+    from routing import PAGES, load_page
+    for page in PAGES:
+        load_page(page)
+    return f"{len(PAGES)} pages"
+
+
+def _map(state):
+    from map import load_kenya_geojson
+    return f"{len(load_kenya_geojson()['features'])} counties"
+
+
+def _aggregates(state):
+    from home import overview_metrics
+    from map import county_values, map_commodities
+    df, index = state["df"], state["index"]
+    overview_metrics(df)
+    map_commodities(df)
+    # The map's default view: every commodity over the whole time range
+    return f"{len(county_values(df, index)):,} county totals"
+
+
+def _inference(state):
+    from batching import get_prediction_batcher
+    from inference import get_inference_service
+    workers = get_inference_service().warm_up()
+    get_prediction_batcher()
+    return f"{len(workers)} workers"
+
+
+def _reports(state):
+    from home import load_report_context
+    from model_store import model_version
+    from reports import KINDS, brief_names
+    # The Home page's briefs section forecasts every series on its first view
+    context = load_report_context(state["df"], model_version())
+    return f"{sum(len(brief_names(context, kind)) for kind in KINDS)} briefs"
+
+
+# Step name -> (function, whether later steps need it); each function returns a short summary
+STEPS = {
+    "data": (_data, True),
+    "model": (_model, True),
+    "index": (_index, True),
+    "pages": (_pages, False),
+    "map": (_map, False),
+    "aggregates": (_aggregates, False),
+    "inference": (_inference, False),
+    "reports": (_reports, False),
+}
+
+
+def warm_up(steps=None, progress=None):
+    """
+    Fill the process-wide caches ahead of the first session
+
+    Each step runs in a span, and the whole warm-up is emitted as one
+    timing record for the "warmup" page (see instrumentation). A failed
+    step is reported and skipped. If a step that later steps need fails,
+    the rest are skipped too.
+
+    Parameters:
+    steps (list): Names from STEPS to run, in STEPS order (default all); the
+        steps they depend on run as well
+    progress (callable): Called with each step's result as it finishes
+
+    Returns:
+    list: One dict per step: step, status ("ok", "failed" or "skipped"), seconds and detail
+    """
+    from instrumentation import begin_rerun, end_rerun, span
+
+    wanted = list(STEPS) if not steps else list(steps)
+    unknown = [name for name in wanted if name not in STEPS]
+    if unknown:
+        raise ValueError(f"Unknown warm-up steps: {', '.join(unknown)}")
+    # A step needs the data, model and index steps that come before it
+    last = max(list(STEPS).index(name) for name in wanted)
+    selected = [name for i, name in enumerate(STEPS) if name in wanted or (STEPS[name][1] and i < last)]
+
+    state = {}
+    results = []
+    blocked = None
+    begin_rerun()
+    try:
+        for name in selected:
+            function, required = STEPS[name]
+            start = time.perf_counter()
+            if blocked:
+                result = {"step": name, "status": "skipped", "seconds": 0.0, "detail": f"needs {blocked}"}
+            else:
+                try:
+                    with span(f"warmup.{name}"):
+                        detail = function(state)
+                    result = {"step": name, "status": "ok", "seconds": time.perf_counter() - start,
+                              "detail": detail}
+                except Exception as exc:
+                    # The traceback matters when the data or model cannot be loaded
+                    logger.warning("Warm-up step %s failed: %s", name, exc, exc_info=required)
+                    result = {"step": name, "status": "failed", "seconds": time.perf_counter() - start,
+                              "detail": f"{type(exc).__name__}: {exc}"}
+                    if required:
+                        blocked = name
+            results.append(result)
+            if progress is not None:
+                progress(result)
+    finally:
+        end_rerun("warmup")
+    return results
+
+
+def format_result(result):
+    """One line of the warm-up report"""
+    return f"warm-up {result['step']:<11} {result['status']:<7} {result['seconds']:7.2f}s  {result['detail']}"
+
+
+def start_warm_up(steps=None):
+    """
+    Run warm_up on a background thread, printing each step as it finishes
+
+    Parameters:
+    steps (list): Steps to run (default all)
+
+    Returns:
+    threading.Thread: The warm-up thread
+    """
+    def run():
+        start = time.perf_counter()
+        results = warm_up(steps, progress=lambda result: print(format_result(result), flush=True))
+        failed = sum(result["status"] != "ok" for result in results)
+        print(f"warm-up finished in {time.perf_counter() - start:.2f}s"
+              + (f" ({failed} steps not completed)" if failed else ""), flush=True)
+
+    thread = threading.Thread(target=run, name="warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def serve(streamlit_args, steps=None):
+    """
+    Start the warm-up, then run the Streamlit server in this process
+
+    Parameters:
+    streamlit_args (list): Options passed to `streamlit run`, e.g. ["--server.port", "8501"]
+    steps (list): Warm-up steps to run (default all)
+    """
+    from streamlit.web import cli
+
+    start_warm_up(steps)
+    sys.argv = ["streamlit", "run", MAIN_SCRIPT, *streamlit_args]
+    cli.main(prog_name="streamlit")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm the dashboard's caches and report the timings")
+    parser.add_argument("command", nargs="?", choices=["serve"],
+                        help="Warm up in the background and run the Streamlit server in this process")
+    parser.add_argument("--steps", nargs="+", choices=list(STEPS), help="Steps to run (default all)")
+    args, streamlit_args = parser.parse_known_args()
+
+    if args.command == "serve":
+        serve(streamlit_args, args.steps)
+        return
+    if streamlit_args:
+        parser.error(f"unrecognized arguments: {' '.join(streamlit_args)}")
+
+    start = time.perf_counter()
+    results = warm_up(args.steps, progress=lambda result: print(format_result(result), flush=True))
+    print(f"warm-up finished in {time.perf_counter() - start:.2f}s", flush=True)
+    # Fail a release step when the data or the model cannot be loaded
+    if any(result["status"] != "ok" and STEPS[result["step"]][1] for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
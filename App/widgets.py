@@ -0,0 +1,30 @@
+import streamlit as st
+
+
+def time_range_slider(periods, key, label="Time range", default=None):
+    """
+    Month range selector over the periods of the data
+
+    Parameters:
+    periods (pandas.DatetimeIndex): Sorted periods to choose from (utils.period_range)
+    key (str): Widget key
+    label (str): Widget label
+    default (tuple): Initial (start, end) periods; defaults to the full range
+
+    Returns:
+    tuple: (start, end) Timestamps, or (None, None) when the full range is selected so
+           callers can skip the filter
+    """
+    if len(periods) < 2:
+        return None, None
+    options = list(periods)
+    start, end = st.select_slider(
+        label,
+        options=options,
+        value=default or (options[0], options[-1]),
+        format_func=lambda period: period.strftime("%b %Y"),
+        key=key,
+    )
+    if start == options[0] and end == options[-1]:
+        return None, None
+    return start, end
@@ -0,0 +1,286 @@
+"""
+Headless benchmarks for the app's hot paths
+
+Times data loading (CSV parse and Arrow round trip), filtering, lag
+features, the series x month panel (build, memory-mapped load and
+windowed features), the map aggregation, single-row and batch prediction (sklearn
+and the compiled ensemble) and SHAP explanations on synthetic data, with
+no network access and no Streamlit session. Each run is appended to a
+JSON-lines history and compared with the previous run at the same scale;
+timings that got slower by more than the threshold are reported as
+regressions.
+
+Usage:
+    python benchmarks/run.py --rows 10000 100000 1000000
+    python benchmarks/run.py --rows 100000 --model Models/best_gb_model.pkl --encoder Models/encoder.pkl --fail-on-regression
+"""
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "App"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import synthetic  # noqa: E402
+from utils import build_location_index, calculate_lag_features, filter_data  # noqa: E402
+
+HISTORY_FILE = os.path.join(ROOT, "benchmarks", "results.jsonl")
+
+
+class Skip(Exception):
+    """Raised by a benchmark whose optional dependency is not installed"""
+
+
+def measure(func, repeat=5, min_time=0.2):
+    """
+    Time a callable, repeating short calls so each sample lasts at least min_time
+
+    Parameters:
+    func (callable): Zero-argument function to time
+    repeat (int): Number of samples
+    min_time (float): Minimum seconds per sample
+
+    Returns:
+    float: Best seconds per call
+    """
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    loops = max(1, int(min_time / elapsed)) if elapsed > 0 else 1000
+    best = elapsed
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        best = min(best, (time.perf_counter() - start) / loops)
+    return best
+
+
+def load_benchmarks(df, workdir):
+    from data_store import parse_csv_dataset, read_arrow_dataset, write_arrow_dataset
+
+    csv_path = os.path.join(workdir, "data.csv")
+    arrow_path = os.path.join(workdir, "data.arrow")
+    df.drop(columns=["year", "month", "quarter"]).to_csv(csv_path)
+    write_arrow_dataset(df, arrow_path)
+    return {
+        "load.parse_csv": lambda: parse_csv_dataset(csv_path),
+        "load.write_arrow": lambda: write_arrow_dataset(df, arrow_path),
+        "load.read_arrow": lambda: read_arrow_dataset(arrow_path),
+    }
+
+
+def filter_benchmarks(df, index, facility, commodity):
+    county = df["county_name"].iloc[0]
+    return {
+        "filter.build_index": lambda: build_location_index(df),
+        "filter.county": lambda: filter_data(df, county=county, index=index),
+        "filter.facility_commodity": lambda: filter_data(df, facility=facility, commodities=[commodity], index=index),
+        "filter.county_mask": lambda: df[df["county_name"] == county],
+    }
+
+
+def lag_benchmarks(df, index, facility, commodity):
+    from utils import build_series_lag_index
+
+    series = filter_data(df, facility=facility, commodities=[commodity], index=index)
+    return {
+        "lags.single_series": lambda: calculate_lag_features(series),
+        "lags.series_index": lambda: build_series_lag_index(df),
+    }
+
+
+def panel_benchmarks(df, workdir):
+    from panel import SeriesPanel
+
+    panel = SeriesPanel.from_frame(df)
+    path = panel.save(os.path.join(workdir, "panel"))
+    long_bytes = df.memory_usage(index=True, deep=True).sum()
+    print(f"{'panel.memory':<30} {panel.nbytes / 2**20:>9.1f} MB (long format {long_bytes / 2**20:,.1f} MB)")
+    mapped = SeriesPanel.load(path)
+    return {
+        "panel.build": lambda: SeriesPanel.from_frame(df),
+        "panel.load_mmap": lambda: SeriesPanel.load(path),
+        "panel.latest_lags": lambda: mapped.latest_lags(),
+        "panel.rolling_mean_12": lambda: mapped.rolling_mean(12),
+    }
+
+
+def map_benchmarks(df):
+    try:
+        from map import aggregate_county_values
+    except ImportError as exc:
+        raise Skip(exc)
+    return {"map.aggregate_counties": lambda: aggregate_county_values(df)}
+
+
+def model_benchmarks(df, model_path=None, encoder_path=None, batch_rows=10_000):
+    import joblib
+    from compiled_model import CompiledEnsemble
+    from features import CATEGORICAL_FEATURES, FeaturePipeline, MODEL_FEATURES, historical_feature_frame
+
+    if model_path:
+        model, encoder = joblib.load(model_path), joblib.load(encoder_path)
+        features = historical_feature_frame(df, FeaturePipeline(encoder, model.feature_names_in_))
+    else:
+        model, encoder, features = synthetic.fit_model(df)
+    columns = list(getattr(model, "feature_names_in_", MODEL_FEATURES))
+    pipeline = FeaturePipeline(encoder, columns)
+    batch = features[columns].iloc[:batch_rows]
+    single = batch.iloc[:1]
+    compiled = CompiledEnsemble(model)
+    compiled.predict(single)  # compile the kernel outside the timed region
+
+    row = df.iloc[0]
+    record = {c: row[c] for c in CATEGORICAL_FEATURES + ["month", "year"]}
+    record.update(lag_1=1.0, lag_3=1.0, rolling_mean_3=1.0)
+    benchmarks = {
+        "features.single_row": lambda: pipeline.frame(record),
+        "predict.single.sklearn": lambda: model.predict(single),
+        "predict.single.compiled": lambda: compiled.predict(single),
+        "predict.batch.sklearn": lambda: model.predict(batch),
+        "predict.batch.compiled": lambda: compiled.predict(batch),
+    }
+    try:
+        import shap
+    except ImportError:
+        print("explain                        skipped (shap is not installed)")
+        return benchmarks
+    explainer = shap.Explainer(model)
+    benchmarks["explain.single"] = lambda: explainer(single)
+    benchmarks["explain.batch_100"] = lambda: explainer(batch.iloc[:100])
+    return benchmarks
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_scale(rows, args):
+    """
+    Run every benchmark group at one dataset size
+
+    Parameters:
+    rows (int): Target number of synthetic rows
+    args (argparse.Namespace): Command line options
+
+    Returns:
+    dict: Benchmark name -> best seconds per call
+    """
+    df = synthetic.generate(rows, seed=args.seed)
+    print(f"\n== {len(df):,} rows ==")
+    results = {}
+
+    def run_group(name, factory):
+        if args.only and not any(name.startswith(prefix) for prefix in args.only):
+            return
+        try:
+            benchmarks = factory()
+        except Skip as exc:
+            print(f"{name:<30} skipped ({exc})")
+            return
+        for bench_name, func in benchmarks.items():
+            seconds = measure(func, repeat=args.repeat)
+            results[bench_name] = seconds
+            print(f"{bench_name:<30} {seconds * 1000:>12.3f} ms")
+
+    index = build_location_index(df)
+    facility = df["facility_name"].iloc[len(df) // 2]
+    commodity = df["dataelement_name"].iloc[0]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        run_group("load", lambda: load_benchmarks(df, workdir))
+    run_group("filter", lambda: filter_benchmarks(df, index, facility, commodity))
+    run_group("lags", lambda: lag_benchmarks(df, index, facility, commodity))
+    with tempfile.TemporaryDirectory() as workdir:
+        run_group("panel", lambda: panel_benchmarks(df, workdir))
+    run_group("map", lambda: map_benchmarks(df))
+    run_group("model", lambda: model_benchmarks(df, args.model, args.encoder))
+    return results
+
+
+def compare(previous, current, threshold):
+    """
+    Find benchmarks that got slower than the previous run
+
+    Parameters:
+    previous (dict): Earlier results (name -> seconds)
+    current (dict): New results (name -> seconds)
+    threshold (float): Allowed relative slowdown, e.g. 0.2 for 20%
+
+    Returns:
+    list: (name, previous seconds, current seconds) for each regression
+    """
+    return [
+        (name, previous[name], seconds)
+        for name, seconds in current.items()
+        if name in previous and seconds > previous[name] * (1 + threshold)
+    ]
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000], help="Synthetic dataset sizes")
+    parser.add_argument("--only", nargs="+", help="Benchmark groups to run (load, filter, lags, map, model)")
+    parser.add_argument("--model", help="Fitted model file to use instead of training one on synthetic data")
+    parser.add_argument("--encoder", help="Fitted encoder file to use with --model")
+    parser.add_argument("--repeat", type=int, default=5, help="Samples per benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--history", default=HISTORY_FILE, help="JSON-lines file the results are appended to")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative slowdown reported as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit non-zero on any regression")
+    args = parser.parse_args(argv)
+    if args.model and not args.encoder:
+        parser.error("--model needs --encoder")
+
+    history = load_history(args.history)
+    regressions = []
+    for rows in args.rows:
+        results = run_scale(rows, args)
+        previous = next((run["results"] for run in reversed(history) if run["rows"] == rows), None)
+        if previous:
+            for name, before, after in compare(previous, results, args.threshold):
+                regressions.append((rows, name, before, after))
+        record = {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "rows": rows,
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "results": results,
+        }
+        with open(args.history, "a") as f:
+            f.write(json.dumps(record) + "\n")
+        history.append(record)
+
+    if regressions:
+        print("\nRegressions:")
+        for rows, name, before, after in regressions:
+            print(f"  {name} @ {rows:,} rows: {before * 1000:.3f} ms -> {after * 1000:.3f} ms "
+                  f"(+{(after / before - 1) * 100:.0f}%)")
+        if args.fail_on_regression:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
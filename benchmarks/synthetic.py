@@ -0,0 +1,114 @@
+"""
+Synthetic dataset shaped like the historical distribution data
+
+County -> sub-county -> ward -> facility hierarchy, crossed with
+commodities and consecutive monthly periods, with the same columns the
+app derives in data_store.parse_csv_dataset. Everything is generated
+with vectorised NumPy, so 50M rows take seconds rather than minutes.
+"""
+import numpy as np
+import pandas as pd
+
+COMMODITIES = [
+    "Combined Oral Contraceptives", "Progestin Only Pills", "Emergency Contraceptive Pills",
+    "Injectables (DMPA-IM)", "Injectables (DMPA-SC)", "Implants (1-Rod)", "Implants (2-Rod)",
+    "IUCD (Copper T)", "Male Condoms", "Female Condoms", "Cycle Beads",
+]
+
+
+def generate(rows=100_000, counties=47, sub_counties=6, wards=4, commodities=8,
+             months=48, start="2020-01-01", seed=0, categorical=False):
+    """
+    Generate a synthetic long-format panel
+
+    The number of facilities is chosen so the panel has roughly `rows` rows
+    (facilities x commodities x months).
+
+    Parameters:
+    rows (int): Target number of rows
+    counties (int): Number of counties
+    sub_counties (int): Sub-counties per county
+    wards (int): Wards per sub-county
+    commodities (int): Commodities reported by every facility
+    months (int): Consecutive monthly periods
+    start (str): First period
+    seed (int): Random seed
+    categorical (bool): Return location columns as pandas categories (as in shared mode)
+
+    Returns:
+    pandas.DataFrame: Synthetic dataset
+    """
+    rng = np.random.default_rng(seed)
+    commodities = min(commodities, len(COMMODITIES))
+    n_facilities = max(1, rows // (commodities * months))
+    n_wards = counties * sub_counties * wards
+
+    # Facilities spread over wards; each ward belongs to one sub-county and county
+    facility_ward = np.sort(rng.integers(0, n_wards, n_facilities))
+    ward_sub = facility_ward // wards
+    sub_county = ward_sub // sub_counties
+
+    n_series = n_facilities * commodities
+    series_facility = np.repeat(np.arange(n_facilities), commodities)
+    series_commodity = np.tile(np.arange(commodities), n_facilities)
+
+    facility = np.repeat(series_facility, months)
+    commodity = np.repeat(series_commodity, months)
+    month_offset = np.tile(np.arange(months), n_series)
+
+    # Per-series level with seasonality and noise; some zero months (stock-outs / no reports)
+    level = rng.gamma(2.0, 40.0, n_series)
+    season = 1 + 0.2 * np.sin(2 * np.pi * (month_offset % 12) / 12)
+    value = np.repeat(level, months) * season * rng.lognormal(0, 0.3, len(facility))
+    value[rng.random(len(value)) < 0.03] = 0
+    value = np.round(value)
+
+    periods = pd.date_range(start, periods=months, freq="MS")
+
+    def labels(prefix, codes, n):
+        names = np.array([f"{prefix} {i}" for i in range(n)], dtype=object)
+        if categorical:
+            return pd.Categorical.from_codes(codes, names)
+        return names[codes]
+
+    df = pd.DataFrame({
+        "county_name": labels("County", sub_county[facility], counties),
+        "sub_county_name": labels("Sub County", ward_sub[facility], counties * sub_counties),
+        "ward_name": labels("Ward", facility_ward[facility], n_wards),
+        "facility_name": labels("Facility", facility, n_facilities),
+        "dataelement_name": (pd.Categorical.from_codes(commodity, COMMODITIES[:commodities]) if categorical
+                             else np.array(COMMODITIES[:commodities], dtype=object)[commodity]),
+        "period": periods[month_offset],
+        "value": value,
+    })
+    df["year"] = df["period"].dt.year
+    df["month"] = df["period"].dt.month
+    df["quarter"] = df["period"].dt.to_period("Q").astype(str)
+    return df
+
+
+def fit_model(df, n_estimators=100, max_depth=3, max_rows=50_000, seed=0):
+    """
+    Train a GradientBoosting model and encoder on synthetic data, standing in for the real artifacts
+
+    Parameters:
+    df (pandas.DataFrame): Synthetic dataset
+    n_estimators (int): Boosting stages
+    max_depth (int): Tree depth
+    max_rows (int): Training rows sampled from the feature frame
+    seed (int): Random seed
+
+    Returns:
+    tuple: (model, encoder, feature frame)
+    """
+    from sklearn.ensemble import GradientBoostingRegressor
+    from sklearn.preprocessing import OrdinalEncoder
+    from features import FeaturePipeline, MODEL_FEATURES, historical_feature_frame
+    from utils import SERIES_COLUMNS
+
+    encoder = OrdinalEncoder().fit(df[SERIES_COLUMNS].astype(object))
+    features = historical_feature_frame(df, FeaturePipeline(encoder))
+    sample = features.sample(min(max_rows, len(features)), random_state=seed)
+    model = GradientBoostingRegressor(n_estimators=n_estimators, max_depth=max_depth, random_state=seed)
+    model.fit(sample[MODEL_FEATURES], sample["value"])
+    return model, encoder, features
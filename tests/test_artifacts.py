@@ -0,0 +1,148 @@
+import hashlib
+import http.server
+import os
+import threading
+
+import pytest
+
+from artifacts import FetchError, artifact, fetch_all, fetch_artifact, fetch_file, read_metadata
+
+BODY = b"period,value\n" + b"2024-01-01,12\n" * 5000
+FAST = {"retries": 2, "backoff": 0.0, "timeout": (2, 2)}
+
+
+class StandIn(http.server.ThreadingHTTPServer):
+    """Local HTTP server answering each GET with the next scripted response"""
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        # Each entry: (status, body, declared Content-Length or None); the last one repeats
+        self.responses = [(200, BODY, None)]
+        self.requests = 0
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/data.csv"
+
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        status, body, length = server.responses[min(server.requests, len(server.responses) - 1)]
+        server.requests += 1
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body) if length is None else length))
+        self.end_headers()
+        self.wfile.write(body)
+        # A short body only reads as truncated if the connection closes
+        self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = StandIn()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def leftovers(path):
+    folder = os.path.dirname(path)
+    return [name for name in os.listdir(folder) if name.endswith((".part", ".tmp"))]
+
+
+def test_downloads_and_records_metadata(server, tmp_path):
+    path = str(tmp_path / "data.csv")
+    meta = fetch_file(server.url, path, **FAST)
+    with open(path, "rb") as f:
+        assert f.read() == BODY
+    assert meta["sha256"] == hashlib.sha256(BODY).hexdigest()
+    assert read_metadata(path)["size"] == len(BODY)
+
+
+def test_retries_after_server_error(server, tmp_path):
+    server.responses = [(503, b"busy", None), (500, b"oops", None), (200, BODY, None)]
+    path = str(tmp_path / "data.csv")
+    fetch_file(server.url, path, **FAST)
+    assert server.requests == 3
+    with open(path, "rb") as f:
+        assert f.read() == BODY
+
+
+def test_client_errors_are_not_retried(server, tmp_path):
+    server.responses = [(404, b"missing", None)]
+    path = str(tmp_path / "data.csv")
+    with pytest.raises(FetchError, match="HTTP 404"):
+        fetch_file(server.url, path, **FAST)
+    assert server.requests == 1
+    assert not os.path.exists(path)
+
+
+def test_truncated_body_is_not_published(server, tmp_path):
+    server.responses = [(200, BODY[:1000], len(BODY))]
+    path = str(tmp_path / "data.csv")
+    with pytest.raises(FetchError):
+        fetch_file(server.url, path, **FAST)
+    assert server.requests == FAST["retries"] + 1
+    assert not os.path.exists(path)
+    assert leftovers(path) == []
+
+
+def test_truncated_body_keeps_previous_copy(server, tmp_path):
+    path = str(tmp_path / "data.csv")
+    fetch_file(server.url, path, **FAST)
+    server.responses = [(200, b"period,value\n", len(BODY))]
+    with pytest.raises(FetchError):
+        fetch_file(server.url, path, **FAST)
+    with open(path, "rb") as f:
+        assert f.read() == BODY
+
+
+def test_checksum_mismatch_is_rejected(server, tmp_path):
+    path = str(tmp_path / "data.csv")
+    with pytest.raises(FetchError, match="checksum mismatch"):
+        fetch_file(server.url, path, sha256="0" * 64, **FAST)
+    assert server.requests == FAST["retries"] + 1
+    assert not os.path.exists(path)
+    assert leftovers(path) == []
+
+
+def test_falls_back_to_last_good_copy_when_server_is_down(server, tmp_path):
+    path = str(tmp_path / "data.csv")
+    item = artifact("data", server.url, path)
+    assert fetch_artifact(item, refresh=True, **FAST)["source"] == "download"
+
+    server.shutdown()
+    server.server_close()
+    result = fetch_artifact(item, refresh=True, **FAST)
+    assert result["source"] == "fallback"
+    assert result["path"] == path
+    assert result["error"]
+
+
+def test_no_usable_copy_when_server_is_down(server, tmp_path):
+    url = server.url
+    server.shutdown()
+    server.server_close()
+    result = fetch_artifact(artifact("data", url, str(tmp_path / "data.csv")), **FAST)
+    assert result["path"] is None
+    assert result["error"]
+
+
+def test_local_copy_is_used_without_refresh(server, tmp_path):
+    item = artifact("data", server.url, str(tmp_path / "data.csv"))
+    fetch_artifact(item, **FAST)
+    assert fetch_artifact(item, **FAST)["source"] == "local"
+    assert server.requests == 1
+
+
+def test_fetch_all_downloads_concurrently(server, tmp_path):
+    items = [artifact(name, server.url, str(tmp_path / f"{name}.bin")) for name in ("model", "encoder", "data")]
+    results = fetch_all(items, **FAST)
+    assert {name: result["source"] for name, result in results.items()} == dict.fromkeys(
+        ["model", "encoder", "data"], "download")
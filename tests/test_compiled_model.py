@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import GradientBoostingRegressor, HistGradientBoostingRegressor
+
+import compiled_model
+from compiled_model import CompiledEnsemble, load_predictor, probe_rows
+
+
+def synthetic_features(n_rows=2000, seed=0):
+    """Encoded locations, calendar and lag features shaped like the app's"""
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame({
+        "county_name": rng.integers(0, 47, n_rows).astype(float),
+        "dataelement_name": rng.integers(0, 12, n_rows).astype(float),
+        "year": rng.integers(2019, 2025, n_rows).astype(float),
+        "month": rng.integers(1, 13, n_rows).astype(float),
+        "lag_1": rng.gamma(2.0, 50.0, n_rows),
+        "lag_3": rng.gamma(2.0, 50.0, n_rows),
+    })
+    X["rolling_mean_3"] = (X["lag_1"] + X["lag_3"] + rng.gamma(2.0, 50.0, n_rows)) / 3
+    y = 0.6 * X["lag_1"] + 0.3 * X["rolling_mean_3"] + 5 * X["month"] + rng.normal(0, 10, n_rows)
+    return X, y.to_numpy()
+
+
+@pytest.fixture(scope="module")
+def fitted():
+    X, y = synthetic_features()
+    model = GradientBoostingRegressor(n_estimators=40, max_depth=4, subsample=0.8, random_state=0).fit(X, y)
+    return model, X
+
+
+@pytest.fixture(params=["numba", "numpy"])
+def backend(request, monkeypatch):
+    if request.param == "numba":
+        pytest.importorskip("numba")
+    else:
+        # The NumPy path is what runs when numba is not installed
+        monkeypatch.setattr(compiled_model, "_predict_kernel", lambda: None)
+    return request.param
+
+
+def test_predict_matches_sklearn(fitted, backend):
+    model, X = fitted
+    compiled = CompiledEnsemble(model)
+    np.testing.assert_allclose(compiled.predict(X), model.predict(X), rtol=0, atol=1e-9)
+
+
+def test_predict_matches_sklearn_on_threshold_probes(fitted, backend):
+    model, _ = fitted
+    compiled = CompiledEnsemble(model)
+    X = probe_rows(compiled, n_rows=1000)
+    np.testing.assert_allclose(compiled.predict(X), model.predict(X), rtol=0, atol=1e-9)
+
+
+def test_predict_reorders_dataframe_columns(fitted, backend):
+    model, X = fitted
+    shuffled = X[list(reversed(X.columns))]
+    np.testing.assert_allclose(CompiledEnsemble(model).predict(shuffled), model.predict(X), rtol=0, atol=1e-9)
+
+
+def test_numpy_path_spans_several_blocks(fitted, monkeypatch):
+    model, X = fitted
+    monkeypatch.setattr(compiled_model, "_predict_kernel", lambda: None)
+    monkeypatch.setattr(compiled_model, "BLOCK_ROWS", 300)
+    np.testing.assert_allclose(CompiledEnsemble(model).predict(X), model.predict(X), rtol=0, atol=1e-9)
+
+
+def test_load_predictor_compiles_supported_model(fitted):
+    model, _ = fitted
+    assert isinstance(load_predictor(model, "compiled"), CompiledEnsemble)
+    assert load_predictor(model, "sklearn") is model
+
+
+def test_load_predictor_falls_back_for_hist_gradient_boosting():
+    X, y = synthetic_features(500)
+    model = HistGradientBoostingRegressor(max_iter=20, random_state=0).fit(X, y)
+    with pytest.raises(AttributeError):
+        CompiledEnsemble(model)
+    assert load_predictor(model, "compiled") is model
@@ -0,0 +1,48 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from memo import VERSION_ATTR, content_hash, data_version, stamp_data_version
+
+
+def dataset():
+    return pd.DataFrame({
+        "facility_name": ["A", "A", "B", "B"],
+        "period": pd.to_datetime(["2024-01-01", "2024-02-01", "2024-01-01", "2024-02-01"]),
+        "value": [10.0, 20.0, 30.0, 40.0],
+    })
+
+
+def test_corrections_that_keep_the_total_change_the_version():
+    df = dataset()
+    moved = df.copy()
+    # Ten units moved from one facility to the other: same shape, periods and total
+    moved["value"] = [20.0, 20.0, 20.0, 40.0]
+    assert moved["value"].sum() == df["value"].sum()
+    assert data_version(moved) != data_version(df)
+
+
+def test_copies_of_the_same_data_share_a_version():
+    df = dataset()
+    assert data_version(df.copy()) == data_version(df) == content_hash(df)
+
+
+def test_stamped_version_is_not_inherited_by_filtered_frames():
+    df = stamp_data_version(dataset(), "loaded")
+    subset = df[df["facility_name"] == "A"]
+    assert VERSION_ATTR in subset.attrs
+    assert data_version(df.copy()) == "loaded"
+    assert data_version(subset) == content_hash(subset)
+
+
+def test_arrow_file_keeps_the_version(tmp_path):
+    pytest.importorskip("pyarrow")
+    from data_store import read_arrow_dataset, write_arrow_dataset
+
+    df = stamp_data_version(dataset().assign(county_name="Nairobi County"))
+    path = write_arrow_dataset(df, os.path.join(tmp_path, "data.arrow"))
+    loaded = read_arrow_dataset(path)
+    assert data_version(loaded) == data_version(df)
+    np.testing.assert_array_equal(loaded["value"], df["value"])
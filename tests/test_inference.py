@@ -0,0 +1,107 @@
+import threading
+from concurrent.futures import CancelledError, wait
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import GradientBoostingRegressor
+
+from inference import PRIORITY_BATCH, InferenceService
+
+
+@pytest.fixture(scope="module")
+def model_path(tmp_path_factory):
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame({"lag_1": rng.uniform(0, 100, 200), "month": rng.integers(1, 13, 200).astype(float)})
+    model = GradientBoostingRegressor(n_estimators=5, random_state=0).fit(X, 2 * X["lag_1"])
+    path = tmp_path_factory.mktemp("model") / "model.pkl"
+    joblib.dump(model, path)
+    return str(path), X
+
+
+def test_predict(model_path):
+    path, X = model_path
+    service = InferenceService(path, max_workers=1)
+    try:
+        assert len(service.submit("predict", X.head(3)).result(timeout=60)) == 3
+    finally:
+        service.shutdown()
+
+
+def test_shutdown_resolves_queued_jobs(model_path):
+    path, X = model_path
+    service = InferenceService(path, max_workers=1)
+    # Keeps the only worker busy while more jobs queue up behind it
+    busy = service.submit("warm", 2.0, priority=PRIORITY_BATCH)
+    queued = [service.submit("predict", X.head(1)) for _ in range(5)]
+    service.shutdown()
+    done, pending = wait(queued, timeout=30)
+    assert not pending
+    assert all(future.cancelled() or isinstance(future.exception(), (CancelledError, RuntimeError))
+               for future in done)
+    wait([busy], timeout=30)
+    with pytest.raises(RuntimeError):
+        service.submit("predict", X.head(1))
+
+
+def test_dispatcher_survives_pool_submit_errors(model_path, monkeypatch):
+    path, X = model_path
+    service = InferenceService(path, max_workers=1)
+    try:
+        submit = service._pool.submit
+        calls = []
+
+        def flaky_submit(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 1:
+                raise RuntimeError("pool broken")
+            return submit(*args, **kwargs)
+
+        monkeypatch.setattr(service._pool, "submit", flaky_submit)
+        failed = service.submit("predict", X.head(1))
+        with pytest.raises(RuntimeError, match="pool broken"):
+            failed.result(timeout=30)
+        # The dispatcher is still running and its slot was released
+        assert len(service.submit("predict", X.head(2)).result(timeout=60)) == 2
+    finally:
+        service.shutdown()
+
+
+def test_jobs_dequeued_during_shutdown_fail_instead_of_hanging(model_path, monkeypatch):
+    path, X = model_path
+    service = InferenceService(path, max_workers=1)
+    second_queued = threading.Event()
+
+    def submit_after_shutdown(*args, **kwargs):
+        # shutdown() lands between the dispatcher taking the first job and handing it to the pool
+        second_queued.wait(10)
+        service.shutdown()
+        raise RuntimeError("cannot schedule new futures after shutdown")
+
+    monkeypatch.setattr(service._pool, "submit", submit_after_shutdown)
+    first = service.submit("predict", X.head(1))
+    second = service.submit("predict", X.head(1))
+    second_queued.set()
+    done, pending = wait([first, second], timeout=30)
+    assert not pending
+    assert isinstance(first.exception(), RuntimeError)
+    assert second.cancelled()
+
+
+def test_dispatcher_survives_cancelled_queued_jobs(model_path):
+    path, X = model_path
+    service = InferenceService(path, max_workers=1)
+    try:
+        # Keeps the only worker busy so the keyed jobs are still queued when they are cancelled
+        busy = service.submit("warm", 1.0, priority=PRIORITY_BATCH)
+        superseded = service.submit("predict", X.head(1), key="tab")
+        latest = service.submit("predict", X.head(2), key="tab")
+        cancelled = service.submit("predict", X.head(3), key="other")
+        service.cancel("other")
+        assert superseded.cancelled() and cancelled.cancelled()
+        assert len(latest.result(timeout=60)) == 2
+        assert len(service.submit("predict", X.head(4)).result(timeout=60)) == 4
+        wait([busy], timeout=30)
+    finally:
+        service.shutdown()
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+from panel import SeriesPanel, lag, rolling_mean
+from utils import SERIES_COLUMNS, build_series_lag_index
+
+
+def dataset():
+    """Three series over six months; F2 skips two months and F3 has no ward"""
+    rows = []
+    periods = pd.date_range("2024-01-01", periods=6, freq="MS")
+    for facility, ward, skip in [("F1", "Ward A", []), ("F2", "Ward A", [1, 4]), ("F3", None, [])]:
+        for i, period in enumerate(periods):
+            if i not in skip:
+                rows.append({"county_name": "C", "sub_county_name": "S", "ward_name": ward,
+                             "facility_name": facility, "dataelement_name": "Pills", "period": period,
+                             "value": float(10 * (i + 1) + len(facility))})
+    return pd.DataFrame(rows)
+
+
+def test_panel_holds_every_series_and_month():
+    df = dataset()
+    panel = SeriesPanel.from_frame(df)
+    assert panel.values.shape == (3, 6)
+    assert panel.values.dtype == np.float32
+    assert np.isnan(panel.values).sum() == 2
+    assert panel.series["ward_name"].isna().sum() == 1
+    assert panel.periods[0] == pd.Timestamp("2024-01-01")
+
+
+def test_latest_lags_match_the_lag_index():
+    df = dataset()
+    panel = SeriesPanel.from_frame(df)
+    lags = build_series_lag_index(df)
+    latest = pd.concat([panel.series.astype(object), panel.latest_lags()], axis=1)
+    merged = latest.merge(lags.reset_index(drop=True), on=SERIES_COLUMNS, suffixes=("", "_index"),
+                          how="outer")
+    assert len(merged) == 3
+    for column in ["lag_1", "lag_3", "rolling_mean_3"]:
+        np.testing.assert_allclose(merged[column], merged[f"{column}_index"], rtol=1e-6)
+
+
+def test_saved_panel_is_memory_mapped_read_only(tmp_path):
+    panel = SeriesPanel.from_frame(dataset(), version="v1")
+    loaded = SeriesPanel.load(panel.save(str(tmp_path / "panel")))
+    assert isinstance(loaded.values, np.memmap)
+    assert not loaded.values.flags.writeable
+    np.testing.assert_array_equal(loaded.values, panel.values)
+    assert loaded.version == "v1"
+    pd.testing.assert_frame_equal(loaded.series.astype(object), panel.series.astype(object))
+
+
+def test_window_functions():
+    values = np.array([[1.0, np.nan, 3.0, 4.0, 5.0]], dtype=np.float32)
+    np.testing.assert_array_equal(lag(values, 2), [[np.nan, np.nan, 1.0, np.nan, 3.0]])
+    expected = pd.Series(values[0]).rolling(3, min_periods=1).mean().to_numpy()
+    np.testing.assert_allclose(rolling_mean(values, 3)[0], expected, rtol=1e-6)
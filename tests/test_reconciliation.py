@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from reconciliation import Hierarchy, reconcile, upper_base_forecasts
+
+
+def series(ward_missing=False):
+    """Four facilities of one commodity in two counties; the last has no ward when ward_missing"""
+    return pd.DataFrame({
+        "county_name": ["C1", "C1", "C1", "C2"],
+        "sub_county_name": ["S1", "S1", "S2", "S3"],
+        "ward_name": ["W1", "W1", "W2", None if ward_missing else "W3"],
+        "facility_name": ["F1", "F2", "F3", "F4"],
+        "dataelement_name": ["Pills"] * 4,
+    })
+
+
+def test_summing_matrix():
+    hierarchy = Hierarchy(series())
+    # national, 2 counties, 3 sub-counties, 3 wards, 4 facilities
+    assert len(hierarchy) == 1 + 2 + 3 + 3 + 4
+    totals = hierarchy.aggregate(np.array([1.0, 2.0, 3.0, 4.0]))
+    assert totals[0] == 10.0
+    assert list(totals[1:3]) == [6.0, 4.0]
+
+
+def test_missing_ward_is_a_node_of_its_own():
+    hierarchy = Hierarchy(series(ward_missing=True))
+    assert len(hierarchy) == 1 + 2 + 3 + 3 + 4
+    totals = hierarchy.aggregate(np.array([1.0, 2.0, 3.0, 4.0]))
+    wards = hierarchy.nodes["level"] == "ward"
+    missing = wards & hierarchy.nodes["ward_name"].isna()
+    assert missing.sum() == 1
+    assert totals[missing.to_numpy()][0] == 4.0
+    assert totals[0] == 10.0
+
+
+@pytest.mark.parametrize("method", ["bottom_up", "mint"])
+def test_reconciled_forecasts_are_coherent(method):
+    hierarchy = Hierarchy(series(ward_missing=True))
+    base = np.random.default_rng(0).uniform(1, 10, len(hierarchy))
+    reconciled = reconcile(hierarchy, base, method)
+    bottom = reconciled[hierarchy.bottom_start:]
+    np.testing.assert_allclose(reconciled, hierarchy.aggregate(bottom), rtol=1e-8)
+
+
+def test_upper_base_forecasts_with_missing_ward():
+    bottom = series(ward_missing=True)
+    periods = pd.date_range("2023-01-01", periods=18, freq="MS")
+    df = bottom.merge(pd.DataFrame({"period": periods}), how="cross")
+    df["value"] = 10.0
+    hierarchy = Hierarchy(bottom)
+    base = upper_base_forecasts(df, hierarchy, 2024, 7)
+    # Every node's history is complete: the forecast is its monthly total
+    np.testing.assert_allclose(base, hierarchy.aggregate(np.full(4, 10.0)))
@@ -0,0 +1,135 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import (SERIES_COLUMNS, build_location_index, build_series_lag_index, filter_data, filter_rows,
+                   series_options)
+
+
+def dataset():
+    """Two facilities with five months each; F2 has no ward"""
+    rows = []
+    for facility, ward, scale in [("F1", "Ward A", 1.0), ("F2", None, 10.0)]:
+        for i, period in enumerate(pd.date_range("2024-01-01", periods=5, freq="MS")):
+            rows.append({"county_name": "C", "sub_county_name": "S", "ward_name": ward, "facility_name": facility,
+                         "dataelement_name": "Pills", "period": period, "value": scale * (i + 1)})
+    return pd.DataFrame(rows)
+
+
+def test_lag_index_values():
+    lags = build_series_lag_index(dataset())
+    f1 = lags.loc[("F1", "Pills")]
+    assert (f1["lag_1"], f1["lag_3"], f1["rolling_mean_3"]) == (5.0, 3.0, 4.0)
+    assert f1["last_period"] == pd.Timestamp("2024-05-01")
+
+
+def test_lag_index_keeps_series_with_missing_location():
+    lags = build_series_lag_index(dataset())
+    assert len(lags) == 2
+    f2 = lags.loc[("F2", "Pills")]
+    assert pd.isna(f2["ward_name"])
+    assert (f2["lag_1"], f2["lag_3"], f2["rolling_mean_3"]) == (50.0, 30.0, 40.0)
+
+
+def test_lag_index_with_categorical_columns():
+    df = dataset().astype({c: "category" for c in SERIES_COLUMNS})
+    lags = build_series_lag_index(df)
+    assert len(lags) == 2
+    np.testing.assert_array_equal(lags["lag_1"].to_numpy(), [5.0, 50.0])
+
+
+def panel():
+    """Eight facilities over two counties, two commodities and six months, sorted by period"""
+    rows = []
+    for period in pd.date_range("2024-01-01", periods=6, freq="MS"):
+        for i in range(8):
+            for commodity in ["Pills", "Syrup"]:
+                rows.append({"county_name": f"C{i % 2}", "sub_county_name": f"S{i % 4}", "ward_name": f"W{i}",
+                             "facility_name": f"F{i}", "dataelement_name": commodity, "period": period,
+                             "value": float(i)})
+    return pd.DataFrame(rows)
+
+
+def mask_filter(df, county=None, sub_county=None, facility=None, commodities=None, ward=None, start=None, end=None):
+    """The boolean-mask filter that the index replaces"""
+    keep = pd.Series(True, index=df.index)
+    for column, value in (("county_name", county), ("sub_county_name", sub_county),
+                          ("ward_name", ward), ("facility_name", facility)):
+        if value:
+            keep &= df[column] == value
+    if commodities:
+        keep &= df["dataelement_name"].isin([commodities] if isinstance(commodities, str) else commodities)
+    if start is not None:
+        keep &= df["period"] >= start
+    if end is not None:
+        keep &= df["period"] <= end
+    return df[keep]
+
+
+FILTERS = {
+    "county": [None, "C1"],
+    "sub_county": [None, "S3"],
+    "ward": [None, "W3"],
+    "facility": [None, "F3"],
+    "commodities": [None, "Syrup", ["Pills", "Syrup"]],
+    "start": [None, pd.Timestamp("2024-03-01")],
+    "end": [None, pd.Timestamp("2024-04-01")],
+}
+
+
+@pytest.mark.parametrize("shuffled", [False, True])
+def test_filter_data_matches_boolean_mask(shuffled):
+    df = panel()
+    if shuffled:
+        # Not sorted by period: time ranges fall back to a mask
+        df = df.sample(frac=1, random_state=0).reset_index(drop=True)
+    index = build_location_index(df)
+    assert ("period" in index) != shuffled
+    for values in itertools.product(*FILTERS.values()):
+        selection = dict(zip(FILTERS, values))
+        pd.testing.assert_frame_equal(filter_data(df, index=index, **selection), mask_filter(df, **selection))
+
+
+def test_filter_data_empty_match():
+    df = panel()
+    index = build_location_index(df)
+    assert filter_data(df, county="C0", facility="F3", index=index).empty
+    assert filter_data(df, facility="Nowhere", index=index).empty
+    assert filter_data(df, commodities=["Nothing"], index=index).empty
+    assert filter_data(df, facility="F3", start=pd.Timestamp("2030-01-01"), index=index).empty
+    assert list(filter_data(df, county="C0", facility="F3", index=index).columns) == list(df.columns)
+
+
+def test_filter_rows_period_slicing():
+    df = panel()
+    index = build_location_index(df)
+    assert filter_rows(index) is None
+    # A time range alone is the block of rows of those months
+    rows = filter_rows(index, start=pd.Timestamp("2024-02-01"), end=pd.Timestamp("2024-03-01"))
+    assert rows == slice(16, 48)
+    assert filter_rows(index, start=pd.Timestamp("2024-02-15"), end=pd.Timestamp("2024-02-20")) == slice(32, 32)
+    # With a location filter the sorted positions are trimmed to the same block
+    rows = filter_rows(index, facility="F1", start=pd.Timestamp("2024-02-01"), end=pd.Timestamp("2024-03-01"))
+    np.testing.assert_array_equal(rows, [18, 19, 34, 35])
+
+
+def test_filter_data_needs_the_index():
+    with pytest.raises(ValueError):
+        filter_data(panel(), county="C1")
+
+
+def test_filters_with_missing_location():
+    df = dataset()
+    index = build_location_index(df)
+    f2 = df.index[df["facility_name"] == "F2"].to_numpy()
+    # NaN is not a selection, so the series is found through its other columns
+    np.testing.assert_array_equal(filter_rows(index, sub_county="S", ward=np.nan, facility="F2"), f2)
+    pd.testing.assert_frame_equal(filter_data(df, ward=np.nan, facility="F2", index=index), df.loc[f2])
+    np.testing.assert_array_equal(filter_rows(index, ward="Ward A"), df.index[df["ward_name"] == "Ward A"])
+
+    series = df[SERIES_COLUMNS].drop_duplicates()
+    assert series_options(series, "ward_name") == ["Ward A"]
+    assert series_options(series, "facility_name", sub_county_name="S") == ["F1", "F2"]
+    assert series_options(series, "facility_name", ward_name=np.nan) == ["F1", "F2"]